@@ -0,0 +1,29 @@
+"""
+Rebuild the packaged figure metadata index from ``figures.csv``.
+
+Run it after every change to ``src/openfaba/data/figures.csv`` and commit
+both files together:
+
+    python scripts/build_figure_index.py
+"""
+
+import argparse
+from pathlib import Path
+
+from openfaba.figures import FIGURES_CSV, FIGURES_INDEX, build_figure_index
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "src" / "openfaba" / "data"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--csv", type=Path, default=DATA_DIR / FIGURES_CSV)
+    parser.add_argument("--output", type=Path, default=DATA_DIR / FIGURES_INDEX)
+    args = parser.parse_args()
+
+    count = build_figure_index(args.csv, args.output)
+    print(f"Indexed {count} figures into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,7 @@ __version__ = "0.3.0-beta0"
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+
+from openfaba.library import FigureInfo, Library, TrackInfo, VerificationIssue  # noqa: E402
+
+__all__ = ["FigureInfo", "Library", "TrackInfo", "VerificationIssue"]
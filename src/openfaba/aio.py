@@ -0,0 +1,299 @@
+import asyncio
+import contextlib
+import functools
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from types import TracebackType
+from typing import AsyncIterator, Callable, Sequence
+
+from openfaba.archive import Mp3Source
+from openfaba.codec import DEFAULT_DEVICE
+from openfaba.iopolicy import IoPolicy
+from openfaba.media import (
+    deobfuscate_figure_mki_files,
+    deobfuscate_mki_library,
+    obfuscate_figure_mp3_files,
+    obfuscate_mp3_library,
+    stream_figure_mki_files,
+)
+from openfaba.writer import SyncPolicy
+
+_END = object()
+
+
+class AsyncConverter:
+    """
+    Run openFABA conversions from asyncio code without blocking the event loop.
+
+    Every conversion runs on ``executor``, or on a thread pool owned by the
+    converter when none is given. At most ``max_concurrency`` of them run at
+    the same time, later calls wait for a free slot, which gives an upload
+    service natural backpressure. Errors are raised as the same
+    ``OpenFabaError`` subclasses as the blocking functions of ``openfaba.media``.
+
+    Cancelling a call stops waiting for it, but a conversion that already
+    started keeps running on its worker until it completes.
+    """
+
+    def __init__(self, executor: Executor | None = None, max_concurrency: int = 4) -> None:
+        self.max_concurrency = max_concurrency
+        self._executor = executor
+        self._owns_executor = executor is None
+        # Semaphores belong to an event loop, a converter may serve several in turn
+        self._semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    async def __aenter__(self) -> "AsyncConverter":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the thread pool owned by the converter, if any"""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def obfuscate_figure(
+        self,
+        figure_id: str,
+        source_mp3_files: Sequence[Mp3Source],
+        faba_library: Path,
+        append: bool = False,
+        sync: SyncPolicy = SyncPolicy.FIGURE,
+        device: str = DEFAULT_DEVICE,
+        checksum: bool = False,
+        verify: bool = False,
+        mirrors: Sequence[Path] = (),
+        prefetch: int = 0,
+    ) -> None:
+        """Async version of ``openfaba.media.obfuscate_figure_mp3_files``"""
+        await self._run(
+            obfuscate_figure_mp3_files,
+            figure_id,
+            source_mp3_files,
+            faba_library,
+            append=append,
+            sync=sync,
+            device=device,
+            checksum=checksum,
+            verify=verify,
+            mirrors=mirrors,
+            prefetch=prefetch,
+        )
+
+    async def obfuscate_library(
+        self,
+        faba_library_mp3: Path,
+        faba_library: Path,
+        default_figure_id: str = "0000",
+        resume: bool = False,
+        keep_going: bool = False,
+        quarantine: Path | None = None,
+        sync: SyncPolicy = SyncPolicy.FIGURE,
+        io_policy: IoPolicy = IoPolicy.CACHED,
+        device: str = DEFAULT_DEVICE,
+        checksum: bool = False,
+        verify: bool = False,
+        mirrors: Sequence[Path] = (),
+        prefetch: int = 0,
+    ) -> int:
+        """Async version of ``openfaba.media.obfuscate_mp3_library``"""
+        return await self._run(
+            obfuscate_mp3_library,
+            faba_library_mp3,
+            faba_library,
+            default_figure_id,
+            resume=resume,
+            keep_going=keep_going,
+            quarantine=quarantine,
+            sync=sync,
+            io_policy=io_policy,
+            device=device,
+            checksum=checksum,
+            verify=verify,
+            mirrors=mirrors,
+            prefetch=prefetch,
+        )
+
+    async def deobfuscate_figure(
+        self,
+        figure_id: str,
+        faba_library: Path,
+        output_folder: Path,
+        device: str = DEFAULT_DEVICE,
+    ) -> int:
+        """Async version of ``openfaba.media.deobfuscate_figure_mki_files``"""
+        return await self._run(
+            deobfuscate_figure_mki_files, figure_id, faba_library, output_folder, device
+        )
+
+    async def deobfuscate_library(
+        self,
+        faba_library: Path,
+        faba_library_mp3: Path,
+        resume: bool = False,
+        keep_going: bool = False,
+        quarantine: Path | None = None,
+        io_policy: IoPolicy = IoPolicy.CACHED,
+        device: str = DEFAULT_DEVICE,
+    ) -> int:
+        """Async version of ``openfaba.media.deobfuscate_mki_library``"""
+        return await self._run(
+            deobfuscate_mki_library,
+            faba_library,
+            faba_library_mp3,
+            resume=resume,
+            keep_going=keep_going,
+            quarantine=quarantine,
+            io_policy=io_policy,
+            device=device,
+        )
+
+    async def decode_stream(
+        self,
+        figure_id: str,
+        faba_library: Path,
+        track: int | None = None,
+        device: str = DEFAULT_DEVICE,
+    ) -> AsyncIterator[bytes]:
+        """
+        Async version of ``openfaba.media.stream_figure_mki_files``.
+
+        Chunks are read and decoded one at a time, only when the consumer asks
+        for the next one, so a slow client never makes data pile up in memory.
+        """
+        chunks = await self._run(stream_figure_mki_files, figure_id, faba_library, track, device)
+        try:
+            while (chunk := await self._run(next, chunks, _END)) is not _END:
+                assert isinstance(chunk, bytes)
+                yield chunk
+        finally:
+            # A chunk still being decoded after a cancellation will finish first
+            with contextlib.suppress(ValueError):
+                chunks.close()
+
+    async def _run[T](self, function: Callable[..., T], *args: object, **kwargs: object) -> T:
+        loop = asyncio.get_running_loop()
+        if (semaphore := self._semaphores.get(loop)) is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_concurrency, thread_name_prefix="openfaba-async"
+            )
+
+        async with semaphore:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(function, *args, **kwargs)
+            )
+
+
+@functools.cache
+def default_converter() -> AsyncConverter:
+    """Return the converter shared by the module-level async functions"""
+    return AsyncConverter()
+
+
+async def aobfuscate_figure(
+    figure_id: str,
+    source_mp3_files: Sequence[Mp3Source],
+    faba_library: Path,
+    append: bool = False,
+    sync: SyncPolicy = SyncPolicy.FIGURE,
+    device: str = DEFAULT_DEVICE,
+    checksum: bool = False,
+    verify: bool = False,
+    mirrors: Sequence[Path] = (),
+    prefetch: int = 0,
+) -> None:
+    """Obfuscate the MP3 files of a figure on the default converter"""
+    await default_converter().obfuscate_figure(
+        figure_id,
+        source_mp3_files,
+        faba_library,
+        append=append,
+        sync=sync,
+        device=device,
+        checksum=checksum,
+        verify=verify,
+        mirrors=mirrors,
+        prefetch=prefetch,
+    )
+
+
+async def aobfuscate_library(
+    faba_library_mp3: Path,
+    faba_library: Path,
+    default_figure_id: str = "0000",
+    resume: bool = False,
+    keep_going: bool = False,
+    quarantine: Path | None = None,
+    sync: SyncPolicy = SyncPolicy.FIGURE,
+    io_policy: IoPolicy = IoPolicy.CACHED,
+    device: str = DEFAULT_DEVICE,
+    checksum: bool = False,
+    verify: bool = False,
+    mirrors: Sequence[Path] = (),
+    prefetch: int = 0,
+) -> int:
+    """Obfuscate an MP3 library on the default converter"""
+    return await default_converter().obfuscate_library(
+        faba_library_mp3,
+        faba_library,
+        default_figure_id,
+        resume=resume,
+        keep_going=keep_going,
+        quarantine=quarantine,
+        sync=sync,
+        io_policy=io_policy,
+        device=device,
+        checksum=checksum,
+        verify=verify,
+        mirrors=mirrors,
+        prefetch=prefetch,
+    )
+
+
+async def adeobfuscate_figure(
+    figure_id: str, faba_library: Path, output_folder: Path, device: str = DEFAULT_DEVICE
+) -> int:
+    """Deobfuscate the MKI files of a figure on the default converter"""
+    return await default_converter().deobfuscate_figure(
+        figure_id, faba_library, output_folder, device
+    )
+
+
+async def adeobfuscate_library(
+    faba_library: Path,
+    faba_library_mp3: Path,
+    resume: bool = False,
+    keep_going: bool = False,
+    quarantine: Path | None = None,
+    io_policy: IoPolicy = IoPolicy.CACHED,
+    device: str = DEFAULT_DEVICE,
+) -> int:
+    """Deobfuscate a Faba library on the default converter"""
+    return await default_converter().deobfuscate_library(
+        faba_library,
+        faba_library_mp3,
+        resume=resume,
+        keep_going=keep_going,
+        quarantine=quarantine,
+        io_policy=io_policy,
+        device=device,
+    )
+
+
+def adecode_stream(
+    figure_id: str, faba_library: Path, track: int | None = None, device: str = DEFAULT_DEVICE
+) -> AsyncIterator[bytes]:
+    """Stream the decoded MP3 bytes of a figure on the default converter"""
+    return default_converter().decode_stream(figure_id, faba_library, track, device)
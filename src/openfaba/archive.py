@@ -0,0 +1,336 @@
+import os
+import tarfile
+import threading
+import zipfile
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from queue import Full, Queue
+from typing import IO, Generator, Iterable, Iterator
+
+from openfaba.exceptions import SourceReadError
+from openfaba.iopolicy import IoPolicy, advise_sequential, drop_cached_pages
+from openfaba.memory import MemoryBudget, memory_budget
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+@dataclass(frozen=True, order=True)
+class ArchiveMember:
+    """An MP3 file stored inside a ZIP or TAR archive.
+
+    Exposes ``name``, ``parent`` and ``suffix`` like a ``Path`` so archive members
+    can flow through the same figure-grouping logic as regular files. The members
+    of an uncompressed TAR know the ``offset`` of their data, so that they can be
+    read without scanning the archive.
+    """
+
+    archive: Path
+    member: str
+    size: int = field(default=0, compare=False)
+    offset: int | None = field(default=None, compare=False)
+
+    def __str__(self) -> str:
+        return f"{self.archive}/{self.member}"
+
+    @property
+    def name(self) -> str:
+        return PurePosixPath(self.member).name
+
+    @property
+    def parent(self) -> PurePosixPath:
+        return PurePosixPath(self.member).parent
+
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.member).suffix
+
+
+Mp3Source = Path | ArchiveMember
+
+
+class UnreadableSource(BytesIO):
+    """Stream yielded for a source file that could not be opened: reading it raises ``error``"""
+
+    def __init__(self, error: SourceReadError) -> None:
+        super().__init__()
+        self.error = error
+
+    def read(self, size: int | None = -1) -> bytes:
+        raise self.error
+
+
+def is_archive(path: Path) -> bool:
+    """Return True if ``path`` is a file with a supported archive extension"""
+    return path.is_file() and path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def list_archive_mp3_members(archive: Path) -> list[ArchiveMember]:
+    """List the MP3 members of an archive without extracting them"""
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            files: list[tuple[str, int, int | None]] = [
+                (info.filename, info.file_size, None) for info in zf.infolist() if not info.is_dir()
+            ]
+    else:
+        files = _list_tar_files(archive)
+
+    return sorted(
+        ArchiveMember(archive, name, size, offset)
+        for name, size, offset in files
+        if PurePosixPath(name).suffix.lower() == ".mp3"
+    )
+
+
+def _list_tar_files(archive: Path) -> list[tuple[str, int, int | None]]:
+    try:
+        # An uncompressed TAR is indexed by seeking from header to header, skipping the data
+        with tarfile.open(archive, mode="r:") as tf:
+            return [(info.name, info.size, info.offset_data) for info in tf if info.isfile()]
+    except tarfile.ReadError:
+        # Streaming mode reads a compressed archive once, front to back
+        with tarfile.open(archive, mode="r|*") as tf:
+            return [(info.name, info.size, None) for info in tf if info.isfile()]
+
+
+def source_size(source: Mp3Source) -> int:
+    """Return the size of an MP3 file, as listed in its archive for archive members"""
+    return source.size if isinstance(source, ArchiveMember) else source.stat().st_size
+
+
+def iter_mp3_source_streams(
+    sources: Iterable[Mp3Source], io_policy: IoPolicy = IoPolicy.CACHED
+) -> Generator[tuple[Mp3Source, IO[bytes]]]:
+    """
+    Yield an open binary stream for every source MP3.
+
+    Regular files are yielded first, in the given order. Archive members are
+    deferred until after them and yielded one archive at a time: ZIP members
+    in the given order, TAR members in the order they are stored in their
+    archive so that every archive is read in a single sequential pass, which
+    matters for compressed TAR files where seeking backwards means
+    decompressing again from the start. Each stream is
+    only valid until the next item is requested, and unless ``io_policy`` is
+    ``IoPolicy.CACHED`` the pages of a regular file are dropped from the page
+    cache at that point. A file that can't be opened is yielded with an
+    ``UnreadableSource``, so that the caller can skip it like any other
+    failed source.
+    """
+    members_by_archive: defaultdict[Path, dict[str, ArchiveMember]] = defaultdict(dict)
+    for source in sources:
+        if isinstance(source, ArchiveMember):
+            members_by_archive[source.archive][source.member] = source
+            continue
+        try:
+            stream = source.open("rb")
+        except OSError as exc:
+            error = SourceReadError(f"Cannot open the source file: {exc.strerror or exc}")
+            yield source, UnreadableSource(error)
+        else:
+            with stream:
+                if io_policy is not IoPolicy.CACHED:
+                    advise_sequential(stream)
+                yield source, stream
+                if io_policy is not IoPolicy.CACHED:
+                    drop_cached_pages(stream.fileno())
+
+    for archive, members in members_by_archive.items():
+        yield from _iter_archive_member_streams(archive, members)
+
+
+def prefetch_mp3_source_streams(
+    sources: Iterable[Mp3Source],
+    depth: int,
+    max_size: int,
+    io_policy: IoPolicy = IoPolicy.CACHED,
+    budget: MemoryBudget | None = None,
+) -> Generator[tuple[Mp3Source, IO[bytes]]]:
+    """
+    Yield the same streams as ``iter_mp3_source_streams``, read ahead on background threads.
+
+    While the caller processes a source, the next ``depth`` ones are read whole
+    into memory, which keeps the CPU busy when every read waits on a network
+    share or a slow USB stick. Regular files are read by ``depth`` threads at
+    once; the members of an archive by one thread, in the order they are
+    stored. Sources larger than ``max_size`` bytes are not held in memory but
+    opened when their turn comes, so at most ``depth * max_size`` bytes are
+    buffered ahead. Every buffer is reserved from ``budget``, the memory budget
+    of the process by default, before it is read and until the caller is done
+    with it; a source whose buffer doesn't fit is opened when its turn comes too.
+    """
+    budget = budget if budget is not None else memory_budget()
+    members_by_archive: defaultdict[Path, dict[str, ArchiveMember]] = defaultdict(dict)
+    pool = ThreadPoolExecutor(depth, thread_name_prefix="prefetch")
+    ahead: deque[tuple[Path, Future[bytes | None]]] = deque()
+    try:
+        for source in sources:
+            if isinstance(source, ArchiveMember):
+                members_by_archive[source.archive][source.member] = source
+                continue
+            ahead.append(
+                (source, pool.submit(_read_small_file, source, max_size, io_policy, budget))
+            )
+            if len(ahead) > depth:
+                yield from _prefetched_file_stream(*ahead.popleft(), io_policy, budget)
+        while ahead:
+            yield from _prefetched_file_stream(*ahead.popleft(), io_policy, budget)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        # Buffers read for a caller that stopped early
+        for _, data in ahead:
+            if not data.cancelled() and not data.exception() and (content := data.result()):
+                budget.release(len(content))
+
+    for archive, members in members_by_archive.items():
+        yield from _prefetch_archive_member_streams(archive, members, depth, max_size, budget)
+
+
+def _read_small_file(
+    path: Path, max_size: int, io_policy: IoPolicy, budget: MemoryBudget
+) -> bytes | None:
+    # A file that can't be read ahead is opened again in turn, which reports the error
+    try:
+        stream = path.open("rb")
+    except OSError:
+        return None
+    with stream:
+        size = os.fstat(stream.fileno()).st_size
+        if size > max_size or not budget.try_reserve(size):
+            return None
+        try:
+            if io_policy is not IoPolicy.CACHED:
+                advise_sequential(stream)
+            data = stream.read()
+            if io_policy is not IoPolicy.CACHED:
+                drop_cached_pages(stream.fileno())
+        except BaseException:
+            budget.release(size)
+            raise
+    # A file that changed size since fstat holds what was actually read
+    budget.release(size - len(data))
+    return data
+
+
+def _prefetched_file_stream(
+    path: Path, data: Future[bytes | None], io_policy: IoPolicy, budget: MemoryBudget
+) -> Iterator[tuple[Mp3Source, IO[bytes]]]:
+    if (content := data.result()) is None:
+        yield from iter_mp3_source_streams([path], io_policy)
+        return
+    try:
+        yield path, BytesIO(content)
+    finally:
+        budget.release(len(content))
+
+
+def _prefetch_archive_member_streams(
+    archive: Path,
+    members: dict[str, ArchiveMember],
+    depth: int,
+    max_size: int,
+    budget: MemoryBudget,
+) -> Iterator[tuple[ArchiveMember, IO[bytes]]]:
+    # Members read ahead, or a large one lent as the live stream of the archive
+    ready: Queue[tuple[ArchiveMember, IO[bytes], bool] | Exception | None] = Queue(depth)
+    # Set by the consumer once done with a lent stream, and when it stops early
+    returned, stopped = threading.Event(), threading.Event()
+
+    def put(item: tuple[ArchiveMember, IO[bytes], bool] | Exception | None) -> bool:
+        while not stopped.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            with closing(_iter_archive_member_streams(archive, members)) as streams:
+                for member, stream in streams:
+                    if member.size <= max_size and budget.try_reserve(member.size):
+                        if not put((member, _read_reserved(stream, member.size, budget), False)):
+                            budget.release(member.size)
+                            return
+                        continue
+                    # Too large to hold: the stream is only valid until the next member
+                    returned.clear()
+                    if not put((member, stream, True)):
+                        return
+                    returned.wait()
+                    if stopped.is_set():
+                        return
+            put(None)
+        except Exception as exc:
+            # Raised again in the consumer, where the member would have been read
+            put(exc)
+
+    producer = threading.Thread(target=produce, name=f"prefetch-{archive.name}", daemon=True)
+    producer.start()
+    try:
+        while (item := ready.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            member, stream, lent = item
+            try:
+                yield member, stream
+            finally:
+                if not lent:
+                    budget.release(member.size)
+            if lent:
+                returned.set()
+    finally:
+        stopped.set()
+        returned.set()
+        producer.join()
+        # Buffers read for a consumer that stopped early
+        while not ready.empty():
+            if isinstance(item := ready.get(), tuple) and not item[2]:
+                budget.release(item[0].size)
+
+
+def _read_reserved(stream: IO[bytes], size: int, budget: MemoryBudget) -> IO[bytes]:
+    # Read a member whose ``size`` bytes are reserved, giving them back if reading fails
+    try:
+        return BytesIO(stream.read(size))
+    except BaseException:
+        budget.release(size)
+        raise
+
+
+def _iter_archive_member_streams(
+    archive: Path, members: dict[str, ArchiveMember]
+) -> Generator[tuple[ArchiveMember, IO[bytes]]]:
+    if zipfile.is_zipfile(archive):
+        # The central directory gives random access to every member
+        with zipfile.ZipFile(archive) as zf:
+            for member in members:
+                with zf.open(member) as stream:
+                    yield ArchiveMember(archive, member, zf.getinfo(member).file_size), stream
+        return
+
+    if all(source.offset is not None for source in members.values()):
+        yield from _iter_indexed_tar_member_streams(archive, members.values())
+        return
+
+    with tarfile.open(archive, mode="r|*") as tf:
+        for tar_info in tf:
+            if tar_info.name in members and (extracted := tf.extractfile(tar_info)) is not None:
+                with extracted:
+                    yield ArchiveMember(archive, tar_info.name, tar_info.size), extracted
+
+
+def _iter_indexed_tar_member_streams(
+    archive: Path, members: Iterable[ArchiveMember]
+) -> Iterator[tuple[ArchiveMember, IO[bytes]]]:
+    # Every member is read straight from its offset, in the order they are stored
+    with tarfile.open(archive, mode="r:") as tf:
+        for source in sorted(members, key=lambda source: source.offset or 0):
+            tar_info = tarfile.TarInfo(source.member)
+            tar_info.size, tar_info.offset_data = source.size, source.offset or 0
+            if (extracted := tf.extractfile(tar_info)) is not None:
+                with extracted:
+                    yield source, extracted
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import shutil
+import struct
+from collections.abc import Iterator
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import BinaryIO
+
+from openfaba.codec import DEFAULT_DEVICE, get_device
+from openfaba.discovery import list_figure_mki_files
+from openfaba.exceptions import BundleError, FigureExistsError, TrackNotFoundError
+from openfaba.iopolicy import advise_sequential
+from openfaba.writer import BLOCK_SIZE, OutputWriter, SyncPolicy
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_SUFFIX = ".fabapack"
+BUNDLE_MAGIC = b"FABAPACK"
+BUNDLE_VERSION = 1
+
+# Magic, format version and size of the JSON index that follows the header
+_HEADER = struct.Struct("<8sII")
+# Payloads start on a block boundary, so they are read in aligned blocks
+PAYLOAD_ALIGNMENT = 4096
+
+
+@dataclass(frozen=True)
+class BundleTrack:
+    """A track stored in a bundle, with the offset of its payload in the payload area"""
+
+    name: str
+    offset: int
+    size: int
+    sha256: str
+
+
+@dataclass(frozen=True)
+class BundleIndex:
+    """
+    The index at the start of a ``.fabapack`` bundle.
+
+    A bundle is a fixed header, this index as JSON, padding up to
+    ``PAYLOAD_ALIGNMENT`` and the track files back to back. Every byte needed
+    to place a track is known once the index is read, so a bundle can be
+    installed in a single pass from a pipe, or a track read by seeking to it.
+    """
+
+    figure_id: str
+    device: str
+    tracks: tuple[BundleTrack, ...]
+
+    @cached_property
+    def header(self) -> bytes:
+        """The bundle header followed by this index"""
+        index = {
+            "figure_id": self.figure_id,
+            "device": self.device,
+            "tracks": [
+                {"name": t.name, "offset": t.offset, "size": t.size, "sha256": t.sha256}
+                for t in self.tracks
+            ],
+        }
+        data = json.dumps(index, separators=(",", ":")).encode()
+        return _HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(data)) + data
+
+    @property
+    def payload_offset(self) -> int:
+        """Position of the first payload in the bundle file"""
+        return _align(len(self.header))
+
+    @property
+    def size(self) -> int:
+        """Size of the whole bundle file"""
+        return self.payload_offset + sum(track.size for track in self.tracks)
+
+    def track(self, number: int) -> BundleTrack:
+        """Return a track by number, raising TrackNotFoundError if it is not in the bundle"""
+        name = get_device(self.device).track_file(number).upper()
+        for track in self.tracks:
+            if track.name.upper() == name:
+                return track
+        raise TrackNotFoundError(f"Track {number} is not in the bundle of figure {self.figure_id}.")
+
+
+class FigureBundle:
+    """A bundle file opened for random access to its tracks"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as bundle:
+            self.index = read_bundle_index(bundle)
+
+    def read_track(self, number: int) -> bytes:
+        """Return the MKI data of one track, reading nothing but its payload"""
+        track = self.index.track(number)
+        with self.path.open("rb") as bundle:
+            bundle.seek(self.index.payload_offset + track.offset)
+            data = _read_exactly(bundle, track.size)
+        if hashlib.sha256(data).hexdigest() != track.sha256:
+            raise BundleError(f"{track.name} does not match its checksum in {self.path}")
+        return data
+
+
+def build_bundle_index(
+    figure_id: str, faba_library: Path, device: str = DEFAULT_DEVICE
+) -> BundleIndex:
+    """Hash the tracks of a figure and lay them out in a bundle index"""
+    figure_folder = get_device(device).figure_folder(figure_id)
+    mki_files = list_figure_mki_files(faba_library / figure_folder, device)
+    if not mki_files:
+        raise TrackNotFoundError(f"No MKI files found for figure {figure_folder}.")
+
+    tracks = []
+    offset = 0
+    for mki_file in mki_files:
+        with mki_file.path.open("rb") as infile:
+            sha256 = hashlib.file_digest(infile, "sha256").hexdigest()
+        tracks.append(BundleTrack(mki_file.path.name, offset, mki_file.stat.st_size, sha256))
+        offset += mki_file.stat.st_size
+    return BundleIndex(figure_id, device, tuple(tracks))
+
+
+def iter_bundle_chunks(
+    index: BundleIndex, faba_library: Path, chunk_size: int = BLOCK_SIZE
+) -> Iterator[bytes]:
+    """Yield the bytes of the bundle described by ``index``, from its header to the last track"""
+    yield index.header + bytes(index.payload_offset - len(index.header))
+
+    figure_path = faba_library / get_device(index.device).figure_folder(index.figure_id)
+    for track in index.tracks:
+        with (figure_path / track.name).open("rb") as infile:
+            advise_sequential(infile)
+            remaining = track.size
+            while remaining:
+                if not (chunk := infile.read(min(chunk_size, remaining))):
+                    raise BundleError(f"{track.name} changed while it was being packed")
+                remaining -= len(chunk)
+                yield chunk
+
+
+def read_bundle_index(bundle: BinaryIO) -> BundleIndex:
+    """Read the index of a bundle, leaving the stream at the end of the index"""
+    magic, version, index_size = _HEADER.unpack(_read_exactly(bundle, _HEADER.size))
+    if magic != BUNDLE_MAGIC:
+        raise BundleError("Not a figure bundle")
+    if version != BUNDLE_VERSION:
+        raise BundleError(f"Unsupported bundle version {version}")
+    try:
+        index = json.loads(_read_exactly(bundle, index_size))
+        tracks = tuple(
+            BundleTrack(t["name"], t["offset"], t["size"], t["sha256"]) for t in index["tracks"]
+        )
+        bundle_index = BundleIndex(index["figure_id"], index["device"], tracks)
+        profile = get_device(bundle_index.device)
+    except (ValueError, KeyError, TypeError) as exc:
+        raise BundleError(f"Malformed bundle index: {exc}") from exc
+
+    if not profile.figure_pattern.fullmatch(profile.figure_folder(bundle_index.figure_id)):
+        raise BundleError(f"Malformed bundle index: invalid figure ID {bundle_index.figure_id!r}")
+    for track in tracks:
+        # Names become paths in the library, so nothing but track names is accepted
+        stem = track.name[: -len(profile.track_suffix)]
+        if not (
+            track.name.upper().endswith(profile.track_suffix.upper())
+            and profile.track_pattern.fullmatch(stem)
+        ):
+            raise BundleError(f"Malformed bundle index: invalid track name {track.name!r}")
+    return bundle_index
+
+
+def unpack_figure(
+    bundle: BinaryIO, faba_library: Path, sync: SyncPolicy = SyncPolicy.FIGURE
+) -> BundleIndex:
+    """
+    Install the figure of a bundle into a Faba library in one sequential pass.
+
+    The bundle is only read forward, in large blocks, so it can come from a
+    pipe. Every track is written through an ``OutputWriter`` as a single
+    preallocated file and checked against its SHA-256 before it is renamed
+    into place. When a track does not match, BundleError is raised and, as
+    for any other failure, the tracks already written are removed again, so
+    that a bad bundle installs nothing and can be retried.
+    """
+    advise_sequential(bundle)
+    index = read_bundle_index(bundle)
+    position = len(index.header)
+    figure_path = faba_library / get_device(index.device).figure_folder(index.figure_id)
+    if figure_path.exists() and (not figure_path.is_dir() or any(figure_path.iterdir())):
+        raise FigureExistsError(f"Figure {figure_path.name} already exists in the library.")
+    figure_path.mkdir(parents=True, exist_ok=True)
+
+    try:
+        with OutputWriter(sync) as writer:
+            for track in sorted(index.tracks, key=lambda t: t.offset):
+                start = index.payload_offset + track.offset
+                if start < position:
+                    raise BundleError(
+                        f"Malformed bundle index: {track.name} overlaps another track"
+                    )
+                _read_exactly(bundle, start - position)
+                with writer.open(figure_path / track.name, track.size) as outfile:
+                    remaining = track.size
+                    while remaining:
+                        chunk = _read_exactly(bundle, min(writer.block_size, remaining))
+                        outfile.write(chunk)
+                        remaining -= len(chunk)
+                    if outfile.digest.sha256 != track.sha256:
+                        raise BundleError(f"{track.name} does not match its checksum in the bundle")
+                position = start + track.size
+    except BaseException:
+        # The writer renamed the tracks completed before the failure, the figure was empty
+        shutil.rmtree(figure_path, ignore_errors=True)
+        raise
+    logger.info("Installed %d tracks into %s", len(index.tracks), figure_path)
+    return index
+
+
+def _read_exactly(stream: BinaryIO, size: int) -> bytes:
+    # Pipes return short reads, keep reading until the whole block arrived
+    data = stream.read(size)
+    while len(data) < size:
+        if not (chunk := stream.read(size - len(data))):
+            raise BundleError("The bundle is truncated")
+        data += chunk
+    return data
+
+
+def _align(position: int) -> int:
+    return -(-position // PAYLOAD_ALIGNMENT) * PAYLOAD_ALIGNMENT
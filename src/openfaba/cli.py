@@ -1,33 +1,186 @@
+import json
 import logging
+import os
+import secrets
 import shutil
+import sys
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Iterator
 
 import typer
 from typer import Typer
 
+from openfaba.bundle import BUNDLE_SUFFIX, build_bundle_index, iter_bundle_chunks, unpack_figure
+from openfaba.codec import DEFAULT_DEVICE, CodecEngine, device_names, get_device, set_engine
+from openfaba.diff import diff_mki_libraries, format_library_diff
+from openfaba.exceptions import BatchConversionError, OpenFabaError
+from openfaba.figures import FigureMetadata, default_figure_index
 from openfaba.io import collect_all_mp3_files_in_folder
+from openfaba.iopolicy import IoPolicy
+from openfaba.library import Library
 from openfaba.media import (
-    deobfuscate_figure_mki_files,
+    deobfuscate_figures,
     deobfuscate_mki_library,
     obfuscate_figure_mp3_files,
     obfuscate_mp3_library,
+    stream_figure_mki_files,
 )
+from openfaba.memory import set_max_memory
+from openfaba.planner import format_library_plan, plan_obfuscation
+from openfaba.selftest import run_selftest
+from openfaba.server import serve
+from openfaba.watch import watch_mp3_library
+from openfaba.workqueue import (
+    DEFAULT_LEASE,
+    DEFAULT_MAX_ATTEMPTS,
+    TaskKind,
+    WorkQueue,
+    enqueue_deobfuscation,
+    enqueue_obfuscation,
+    run_worker,
+    wait_for_queue,
+)
+from openfaba.writer import SyncPolicy, atomic_writer
 
 logger = logging.getLogger(__name__)
 app = Typer(help="Create/Manage FABA figures and libraries")
 
 
+def parse_size(value: str) -> int:
+    """Parse a size in bytes with an optional K, M or G suffix (powers of 1024)"""
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    number, unit = value.strip().upper().removesuffix("B"), 1
+    if number[-1:] in units:
+        number, unit = number[:-1], units[number[-1]]
+    if not number.isdigit() or int(number) == 0:
+        raise typer.BadParameter(f"{value!r} is not a size such as 512M or 2G")
+    return int(number) * unit
+
+
+@app.callback()
+def main(
+    max_memory: int | None = typer.Option(
+        None,
+        "--max-memory",
+        parser=parse_size,
+        metavar="SIZE",
+        help="Memory all conversions may buffer together, e.g. 512M or 2G",
+    ),
+    engine: CodecEngine = typer.Option(
+        CodecEngine.AUTO, "--engine", help="Codec engine, see `openfaba selftest`"
+    ),
+) -> None:
+    """Create/Manage FABA figures and libraries"""
+    set_max_memory(max_memory)
+    set_engine(engine)
+
+
 def normalize_figure_id(figure_id: str) -> str | None:
     return f"{int(figure_id):04d}" if (figure_id.isdigit() and len(figure_id) <= 4) else None
 
 
+def expand_figure_ids(values: list[str]) -> list[str] | None:
+    """Normalize figure IDs and ``first-last`` ranges, keeping their order without repeats"""
+    figure_ids: dict[str, None] = {}
+    for value in values:
+        first, _, last = value.strip().partition("-")
+        start, end = normalize_figure_id(first), normalize_figure_id(last or first)
+        if start is None or end is None or start > end:
+            return None
+        figure_ids.update((f"{number:04d}", None) for number in range(int(start), int(end) + 1))
+    return list(figure_ids)
+
+
+def read_figure_file(path: Path) -> list[str]:
+    """Read figure IDs or ranges, one per line, skipping blank lines and ``#`` comments"""
+    lines = (line.partition("#")[0].strip() for line in path.read_text().splitlines())
+    return [line for line in lines if line]
+
+
+def validate_device(device: str) -> str:
+    try:
+        get_device(device)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    return device
+
+
+def checksum_option() -> Any:
+    return typer.Option(
+        False, "--checksum", help="Store source and output SHA-256 in a manifest per figure"
+    )
+
+
+def verify_option() -> Any:
+    return typer.Option(
+        False,
+        "--verify",
+        help="Read every figure back once written and check it (implies --checksum)",
+    )
+
+
+def prefetch_option() -> Any:
+    return typer.Option(
+        0,
+        "--prefetch",
+        min=0,
+        help="Source files read ahead while converting, for network shares or slow drives",
+    )
+
+
+def device_option() -> Any:
+    return typer.Option(
+        DEFAULT_DEVICE,
+        "--device",
+        callback=validate_device,
+        help=f"Device profile of the FABA library ({', '.join(device_names())})",
+    )
+
+
+@contextmanager
+def exit_on_error(err: bool = False) -> Iterator[None]:
+    """Print openFABA errors, listing every failure of a batch, and exit with code 1"""
+    try:
+        yield
+    except BatchConversionError as exc:
+        typer.echo(f"Converted {exc.converted} files. {len(exc.failures)} files failed:", err=err)
+        for failure in exc.failures:
+            typer.echo(f"  {failure.source}: {failure.reason}", err=err)
+        raise typer.Exit(code=1) from exc
+    except OpenFabaError as exc:
+        typer.echo(f"Error: {exc}", err=err)
+        raise typer.Exit(code=1) from exc
+
+
 @app.command()
 def insert(
     figure_id: str = typer.Option(..., "--figure-id", "-f", help="Figure ID (4 digits)"),
-    source: Path = typer.Option(..., "--source", "-s", exists=True, file_okay=False, dir_okay=True),
-    faba_library: Path = typer.Option(
-        ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
+    source: Path = typer.Option(
+        ...,
+        "--source",
+        "-s",
+        exists=True,
+        file_okay=True,
+        dir_okay=True,
+        help="Folder or ZIP/TAR archive with MP3 files",
+    ),
+    faba_libraries: list[Path] = typer.Option(
+        ...,
+        "--faba-library",
+        "-b",
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+        help="Target FABA library. Repeat it to write several SD cards at once",
+    ),
+    sync: SyncPolicy = typer.Option(
+        SyncPolicy.FIGURE, "--sync", help="When to flush written files to the device"
     ),
+    checksum: bool = checksum_option(),
+    verify: bool = verify_option(),
+    prefetch: int = prefetch_option(),
+    device: str = device_option(),
 ) -> None:
     """Create a new FABA figure from a folder of MP3 files. Fails if figure exists."""
 
@@ -35,30 +188,58 @@ def insert(
         typer.echo("figure-id must be a 4-digit number")
         raise typer.Exit(code=1)
 
-    figure_path = faba_library / f"K{fid}"
-    if figure_path.exists():
+    for faba_library in faba_libraries:
+        figure_path = faba_library / get_device(device).figure_folder(fid)
+        if not figure_path.exists():
+            continue
         if not figure_path.is_dir():
-            typer.echo(f"Error: Path for Figure K{fid} already exists as a file.")
+            typer.echo(f"Error: Path for Figure {figure_path.name} already exists as a file.")
             raise typer.Exit(code=1)
         elif len(list(figure_path.iterdir())) != 0:
-            typer.echo(f"Error: Figure K{fid} already exists as a not empty folder.")
+            typer.echo(f"Error: Figure {figure_path.name} already exists as a not empty folder.")
             raise typer.Exit(code=1)
 
     if not (mp3_files := collect_all_mp3_files_in_folder(source)):
         typer.echo("No MP3 files found in the source folder.")
         raise typer.Exit(code=1)
 
-    obfuscate_figure_mp3_files(fid, mp3_files, faba_library)
-    typer.echo(f"Inserted figure K{fid}. Added {len(mp3_files)} tracks.")
+    with exit_on_error():
+        obfuscate_figure_mp3_files(
+            fid,
+            mp3_files,
+            faba_libraries[0],
+            sync=sync,
+            device=device,
+            checksum=checksum,
+            verify=verify,
+            prefetch=prefetch,
+            mirrors=faba_libraries[1:],
+        )
+    typer.echo(f"Inserted figure {figure_path.name}. Added {len(mp3_files)} tracks.")
 
 
 @app.command()
 def extend(
     figure_id: str = typer.Option(..., "--figure-id", "-f", help="Figure ID (4 digits)"),
-    source: Path = typer.Option(..., "--source", "-s", exists=True, file_okay=False, dir_okay=True),
+    source: Path = typer.Option(
+        ...,
+        "--source",
+        "-s",
+        exists=True,
+        file_okay=True,
+        dir_okay=True,
+        help="Folder or ZIP/TAR archive with MP3 files",
+    ),
     faba_library: Path = typer.Option(
         ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
     ),
+    sync: SyncPolicy = typer.Option(
+        SyncPolicy.FIGURE, "--sync", help="When to flush written files to the device"
+    ),
+    checksum: bool = checksum_option(),
+    verify: bool = verify_option(),
+    prefetch: int = prefetch_option(),
+    device: str = device_option(),
 ) -> None:
     """Append MP3 files to an existing figure. Does not overwrite existing tracks."""
 
@@ -66,27 +247,59 @@ def extend(
         typer.echo("figure-id must be a 4-digit number")
         raise typer.Exit(code=1)
 
-    figure_path = faba_library / f"K{fid}"
+    figure_path = faba_library / get_device(device).figure_folder(fid)
     if not figure_path.exists():
-        typer.echo(f"Error: Figure K{fid} does not exist in the library.")
+        typer.echo(f"Error: Figure {figure_path.name} does not exist in the library.")
         raise typer.Exit(code=1)
 
     if not (mp3_files := collect_all_mp3_files_in_folder(source)):
         typer.echo("No MP3 files found in the source folder.")
         raise typer.Exit(code=1)
 
-    obfuscate_figure_mp3_files(fid, mp3_files, faba_library, append=True)
+    with exit_on_error():
+        obfuscate_figure_mp3_files(
+            fid,
+            mp3_files,
+            faba_library,
+            append=True,
+            sync=sync,
+            device=device,
+            checksum=checksum,
+            verify=verify,
+            prefetch=prefetch,
+        )
 
-    typer.echo(f"Extended figure K{fid}. Appended {len(mp3_files)} tracks.")
+    typer.echo(f"Extended figure {figure_path.name}. Appended {len(mp3_files)} tracks.")
 
 
 @app.command()
 def replace(
     figure_id: str = typer.Option(..., "--figure-id", "-f", help="Figure ID (4 digits)"),
-    source: Path = typer.Option(..., "--source", "-s", exists=True, file_okay=False, dir_okay=True),
-    faba_library: Path = typer.Option(
-        ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
+    source: Path = typer.Option(
+        ...,
+        "--source",
+        "-s",
+        exists=True,
+        file_okay=True,
+        dir_okay=True,
+        help="Folder or ZIP/TAR archive with MP3 files",
+    ),
+    faba_libraries: list[Path] = typer.Option(
+        ...,
+        "--faba-library",
+        "-b",
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+        help="Target FABA library. Repeat it to write several SD cards at once",
     ),
+    sync: SyncPolicy = typer.Option(
+        SyncPolicy.FIGURE, "--sync", help="When to flush written files to the device"
+    ),
+    checksum: bool = checksum_option(),
+    verify: bool = verify_option(),
+    prefetch: int = prefetch_option(),
+    device: str = device_option(),
 ) -> None:
     """Delete an existing figure and recreate it from MP3 files."""
 
@@ -94,8 +307,10 @@ def replace(
         typer.echo("figure-id must be a 4-digit number")
         raise typer.Exit(code=1)
 
-    figure_path = faba_library / f"K{fid}"
-    if figure_path.exists():
+    for faba_library in faba_libraries:
+        figure_path = faba_library / get_device(device).figure_folder(fid)
+        if not figure_path.exists():
+            continue
         try:
             shutil.rmtree(figure_path)
         except Exception as exc:
@@ -106,44 +321,221 @@ def replace(
         typer.echo("No MP3 files found in the source folder.")
         raise typer.Exit(code=1)
 
-    obfuscate_figure_mp3_files(fid, mp3_files, faba_library)
-    typer.echo(f"Replaced figure K{fid}. Created with {len(mp3_files)} tracks.")
+    with exit_on_error():
+        obfuscate_figure_mp3_files(
+            fid,
+            mp3_files,
+            faba_libraries[0],
+            sync=sync,
+            device=device,
+            checksum=checksum,
+            verify=verify,
+            prefetch=prefetch,
+            mirrors=faba_libraries[1:],
+        )
+    typer.echo(f"Replaced figure {figure_path.name}. Created with {len(mp3_files)} tracks.")
 
 
 @app.command()
 def extract(
-    figure_id: str = typer.Option(..., "--figure-id", "-f", help="Figure ID (4 digits)"),
+    figure_ids: list[str] = typer.Option(
+        [], "--figure-id", "-f", help="Figure ID (4 digits) or range such as 0100-0199. Repeatable"
+    ),
+    figure_file: Path | None = typer.Option(
+        None,
+        "--figure-file",
+        exists=True,
+        dir_okay=False,
+        help="File with one figure ID or range per line",
+    ),
     faba_library: Path = typer.Option(
         ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
     ),
     output: Path = typer.Option(..., "--output", "-o", file_okay=False, dir_okay=True),
+    workers: int = typer.Option(4, "--workers", "-w", min=1, help="Figures extracted at once"),
+    device: str = device_option(),
 ) -> None:
-    """Extract a single figure from a FABA library into MP3 files."""
-
-    if not (fid := normalize_figure_id(figure_id)):
+    """Extract one or more figures from a FABA library into MP3 files."""
+    if figure_file is not None:
+        figure_ids = [*figure_ids, *read_figure_file(figure_file)]
+    if not figure_ids:
+        typer.echo("Give at least one --figure-id or a --figure-file")
+        raise typer.Exit(code=1)
+    if (fids := expand_figure_ids(figure_ids)) is None:
         typer.echo("figure-id must be a 4-digit number")
         raise typer.Exit(code=1)
     output.mkdir(parents=True, exist_ok=True)
 
-    converted = deobfuscate_figure_mki_files(fid, faba_library, output)
-    if converted == 0:
-        typer.echo(f"No MKI files found for figure K{fid}.")
+    with exit_on_error():
+        converted = deobfuscate_figures(fids, faba_library, output, workers, device)
+    profile = get_device(device)
+    empty = [profile.figure_folder(fid) for fid, count in converted.items() if count == 0]
+    if len(fids) == 1:
+        if empty:
+            typer.echo(f"No MKI files found for figure {empty[0]}.")
+            raise typer.Exit(code=1)
+        typer.echo(
+            f"Extracted figure {profile.figure_folder(fids[0])}. Converted "
+            f"{converted[fids[0]]} files."
+        )
+        return
+
+    typer.echo(
+        f"Extracted {len(fids) - len(empty)} figures. Converted {sum(converted.values())} files."
+    )
+    if empty:
+        typer.echo(f"No MKI files found for {len(empty)} figures: {', '.join(empty)}")
+    if len(empty) == len(fids):
         raise typer.Exit(code=1)
 
-    typer.echo(f"Extracted figure K{fid}. Converted {converted} files.")
+
+@app.command(name="cat")
+def cat(
+    figure_id: str = typer.Option(..., "--figure-id", "-f", help="Figure ID (4 digits)"),
+    faba_library: Path = typer.Option(
+        ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
+    ),
+    track: int | None = typer.Option(
+        None, "--track", "-t", min=1, help="Track number. Streams all tracks when omitted"
+    ),
+    device: str = device_option(),
+) -> None:
+    """Stream the decoded MP3 audio of a figure to stdout, e.g. to pipe it into a player."""
+
+    if not (fid := normalize_figure_id(figure_id)):
+        typer.echo("figure-id must be a 4-digit number", err=True)
+        raise typer.Exit(code=1)
+
+    with exit_on_error(err=True):
+        chunks = stream_figure_mki_files(fid, faba_library, track, device)
+
+    stdout = typer.get_binary_stream("stdout")
+    try:
+        for chunk in chunks:
+            stdout.write(chunk)
+            stdout.flush()
+    except BrokenPipeError:
+        # The player exited early; silence the error Python would print at shutdown
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
 
 
 @app.command()
-def obfuscate(
-    mp3_library: Path = typer.Option(
-        ..., "--mp3-library", "-m", exists=True, file_okay=False, dir_okay=True
+def pack(
+    figure_id: str = typer.Option(..., "--figure-id", "-f", help="Figure ID (4 digits)"),
+    faba_library: Path = typer.Option(
+        ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
+    ),
+    output: Path = typer.Option(
+        ..., "--output", "-o", dir_okay=False, help=f"{BUNDLE_SUFFIX} file, or - for stdout"
+    ),
+    device: str = device_option(),
+) -> None:
+    """Pack the tracks of a figure into a single bundle file, e.g. to copy it over ssh."""
+
+    to_stdout = str(output) == "-"
+    if not (fid := normalize_figure_id(figure_id)):
+        typer.echo("figure-id must be a 4-digit number", err=to_stdout)
+        raise typer.Exit(code=1)
+
+    with exit_on_error(err=to_stdout):
+        index = build_bundle_index(fid, faba_library, device)
+        chunks = iter_bundle_chunks(index, faba_library)
+        if to_stdout:
+            stdout = typer.get_binary_stream("stdout")
+            for chunk in chunks:
+                stdout.write(chunk)
+            stdout.flush()
+        else:
+            with atomic_writer(output, index.size) as outfile:
+                for chunk in chunks:
+                    outfile.write(chunk)
+    typer.echo(f"Packed {len(index.tracks)} tracks into {output}.", err=to_stdout)
+
+
+@app.command()
+def unpack(
+    bundle: Path = typer.Argument(
+        ..., dir_okay=False, help=f"{BUNDLE_SUFFIX} file to install, or - for stdin"
     ),
     faba_library: Path = typer.Option(
         ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
     ),
+    sync: SyncPolicy = typer.Option(
+        SyncPolicy.FIGURE, "--sync", help="When to flush written files to the device"
+    ),
+) -> None:
+    """Install a figure from a bundle file made by pack."""
+
+    with exit_on_error():
+        if str(bundle) == "-":
+            index = unpack_figure(typer.get_binary_stream("stdin"), faba_library, sync)
+        else:
+            with bundle.open("rb") as infile:
+                index = unpack_figure(infile, faba_library, sync)
+    figure_folder = get_device(index.device).figure_folder(index.figure_id)
+    typer.echo(f"Installed figure {figure_folder}. Added {len(index.tracks)} tracks.")
+
+
+@app.command()
+def obfuscate(
+    mp3_library: Path = typer.Option(
+        ...,
+        "--mp3-library",
+        "-m",
+        exists=True,
+        file_okay=True,
+        dir_okay=True,
+        help="Folder or ZIP/TAR archive with MP3 files",
+    ),
+    faba_libraries: list[Path] = typer.Option(
+        ...,
+        "--faba-library",
+        "-b",
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+        help="Target FABA library. Repeat it to write several SD cards at once",
+    ),
+    resume: bool = typer.Option(
+        False, "--resume", help="Skip files completed by an interrupted previous run"
+    ),
+    keep_going: bool = typer.Option(
+        False, "--keep-going", "-k", help="Skip files that fail instead of stopping"
+    ),
+    quarantine: Path | None = typer.Option(
+        None, "--quarantine", file_okay=False, dir_okay=True, help="Copy failed files here"
+    ),
+    sync: SyncPolicy = typer.Option(
+        SyncPolicy.FIGURE, "--sync", help="When to flush written files to the device"
+    ),
+    io_policy: IoPolicy = typer.Option(
+        IoPolicy.CACHED, "--io-policy", help="How to use the page cache during the run"
+    ),
+    checksum: bool = checksum_option(),
+    verify: bool = verify_option(),
+    prefetch: int = prefetch_option(),
+    device: str = device_option(),
 ) -> None:
     """Obfuscate an entire MP3 library into a FABA MKI library."""
-    converted = obfuscate_mp3_library(mp3_library, faba_library)
+    if resume and len(faba_libraries) > 1:
+        typer.echo("Error: --resume works with a single --faba-library.")
+        raise typer.Exit(code=1)
+
+    with exit_on_error():
+        converted = obfuscate_mp3_library(
+            mp3_library,
+            faba_libraries[0],
+            resume=resume,
+            keep_going=keep_going,
+            quarantine=quarantine,
+            sync=sync,
+            io_policy=io_policy,
+            device=device,
+            checksum=checksum,
+            verify=verify,
+            prefetch=prefetch,
+            mirrors=faba_libraries[1:],
+        )
     if converted == 0:
         typer.echo("No MP3 files found in the source library.")
         raise typer.Exit(code=1)
@@ -151,19 +543,297 @@ def obfuscate(
     typer.echo(f"Obfuscated library. Converted {converted} files.")
 
 
+@app.command()
+def plan(
+    mp3_library: Path = typer.Option(
+        ...,
+        "--mp3-library",
+        "-m",
+        exists=True,
+        file_okay=True,
+        dir_okay=True,
+        help="Folder or ZIP/TAR archive with MP3 files",
+    ),
+    faba_library: Path = typer.Option(
+        ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
+    ),
+    calibrate: bool = typer.Option(
+        True,
+        "--calibrate/--no-calibrate",
+        help="Time the codec and the card to estimate the runtime",
+    ),
+    device: str = device_option(),
+) -> None:
+    """Check that an MP3 library fits a FABA library before obfuscating. Exits 1 if not."""
+    with exit_on_error():
+        library_plan = plan_obfuscation(
+            mp3_library, faba_library, device=device, calibrate=calibrate
+        )
+    if not library_plan.tracks and not library_plan.issues:
+        typer.echo("No MP3 files found in the source library.")
+        raise typer.Exit(code=1)
+
+    typer.echo(format_library_plan(library_plan))
+    if not library_plan:
+        raise typer.Exit(code=1)
+
+
 @app.command()
 def deobfuscate(
     faba_library: Path = typer.Option(
         ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
     ),
     mp3_library: Path = typer.Option(..., "--mp3-library", "-m", file_okay=False, dir_okay=True),
+    resume: bool = typer.Option(
+        False, "--resume", help="Skip files completed by an interrupted previous run"
+    ),
+    keep_going: bool = typer.Option(
+        False, "--keep-going", "-k", help="Skip files that fail instead of stopping"
+    ),
+    quarantine: Path | None = typer.Option(
+        None, "--quarantine", file_okay=False, dir_okay=True, help="Copy failed files here"
+    ),
+    io_policy: IoPolicy = typer.Option(
+        IoPolicy.CACHED, "--io-policy", help="How to use the page cache during the run"
+    ),
+    device: str = device_option(),
 ) -> None:
     """Deobfuscate an entire FABA MKI library back into MP3 files."""
     mp3_library.mkdir(parents=True, exist_ok=True)
 
-    converted = deobfuscate_mki_library(faba_library, mp3_library)
+    with exit_on_error():
+        converted = deobfuscate_mki_library(
+            faba_library,
+            mp3_library,
+            resume=resume,
+            keep_going=keep_going,
+            quarantine=quarantine,
+            io_policy=io_policy,
+            device=device,
+        )
     if converted == 0:
         typer.echo("No MKI files found in the FABA library.")
         raise typer.Exit(code=1)
 
     typer.echo(f"Deobfuscated library. Converted {converted} files.")
+
+
+@app.command()
+def watch(
+    mp3_library: Path = typer.Option(
+        ..., "--mp3-library", "-m", exists=True, file_okay=False, dir_okay=True
+    ),
+    faba_library: Path = typer.Option(
+        ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
+    ),
+    debounce: float = typer.Option(
+        2.0, "--debounce", min=0.05, help="Seconds of quiet before reconverting a figure"
+    ),
+    workers: int = typer.Option(2, "--workers", "-w", min=1, help="Concurrent figure conversions"),
+    poll_interval: float = typer.Option(
+        1.0, "--poll-interval", min=0.05, help="Seconds between rescans when polling"
+    ),
+    polling: bool = typer.Option(False, "--polling", help="Poll even if inotify is available"),
+    device: str = device_option(),
+) -> None:
+    """Watch an MP3 library and reconvert the figures whose files change."""
+    typer.echo(f"Watching {mp3_library}. Press Ctrl+C to stop.")
+    try:
+        watch_mp3_library(
+            mp3_library,
+            faba_library,
+            debounce=debounce,
+            workers=workers,
+            poll_interval=poll_interval,
+            use_inotify=not polling,
+            device=device,
+        )
+    except KeyboardInterrupt:
+        typer.echo("Stopped watching.")
+
+
+@app.command()
+def coordinator(
+    kind: TaskKind = typer.Argument(..., help="Convert MP3 into MKI files, or back"),
+    queue_path: Path = typer.Option(
+        ..., "--queue", "-q", dir_okay=False, help="Queue database on a filesystem shared by all"
+    ),
+    mp3_library: Path = typer.Option(..., "--mp3-library", "-m"),
+    faba_library: Path = typer.Option(..., "--faba-library", "-b", file_okay=False),
+    lease: float = typer.Option(
+        DEFAULT_LEASE, "--lease", min=1.0, help="Seconds before a silent worker's task is retried"
+    ),
+    max_attempts: int = typer.Option(
+        DEFAULT_MAX_ATTEMPTS, "--max-attempts", min=1, help="Tries per file before it fails"
+    ),
+    wait: bool = typer.Option(True, "--wait/--no-wait", help="Wait for the workers to finish"),
+    poll_interval: float = typer.Option(
+        5.0, "--poll-interval", min=0.05, help="Seconds between progress reports"
+    ),
+    device: str = device_option(),
+) -> None:
+    """Queue the conversion of a library for workers on several machines."""
+    source = mp3_library if kind is TaskKind.OBFUSCATE else faba_library
+    if not queue_path.exists() and not source.exists():
+        typer.echo(f"Error: {source} does not exist.")
+        raise typer.Exit(code=1)
+
+    with exit_on_error():
+        if queue_path.exists():
+            queue = WorkQueue(queue_path)
+            typer.echo(f"Resuming {queue_path}.")
+        else:
+            queue = WorkQueue.create(queue_path, lease, max_attempts)
+            if kind is TaskKind.OBFUSCATE:
+                faba_library.mkdir(parents=True, exist_ok=True)
+                queued = enqueue_obfuscation(queue, mp3_library, faba_library, device=device)
+            else:
+                queued = enqueue_deobfuscation(queue, faba_library, mp3_library, device)
+            typer.echo(f"Queued {queued} files in {queue_path}.")
+    if not wait:
+        return
+
+    reported = None
+    for status in wait_for_queue(queue, poll_interval):
+        if status != reported:
+            typer.echo(
+                f"{status.done} done, {status.leased} converting, "
+                f"{status.pending} pending, {status.failed} failed"
+            )
+            reported = status
+    if failures := queue.failures():
+        typer.echo(f"{len(failures)} files failed:")
+        for failure in failures:
+            typer.echo(f"  {failure.source}: {failure.reason}")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def worker(
+    queue_path: Path = typer.Option(
+        ..., "--queue", "-q", dir_okay=False, help="Queue database created by the coordinator"
+    ),
+    name: str | None = typer.Option(None, "--name", help="Worker name, defaults to host:pid"),
+    poll_interval: float = typer.Option(
+        1.0, "--poll-interval", min=0.05, help="Seconds between claims while others finish"
+    ),
+) -> None:
+    """Convert files queued by a coordinator until none are left."""
+    with exit_on_error():
+        converted = run_worker(WorkQueue(queue_path), name, poll_interval)
+    typer.echo(f"Queue finished. Converted {converted} files.")
+
+
+@app.command(name="convert-server")
+def convert_server(
+    host: str = typer.Option("127.0.0.1", "--host", help="Address to listen on"),
+    port: int = typer.Option(8080, "--port", "-p", min=0, max=65535),
+    workers: int = typer.Option(2, "--workers", "-w", min=1, help="Concurrent conversions"),
+    max_queue: int = typer.Option(
+        16, "--max-queue", min=0, help="Requests waiting for a worker before answering 503"
+    ),
+    max_upload_mb: int = typer.Option(512, "--max-upload-mb", min=1, help="Largest upload"),
+    device: str = device_option(),
+) -> None:
+    """Serve an HTTP API that converts uploaded MP3 files into a FABA figure."""
+    typer.echo(f"Serving on http://{host}:{port}. Press Ctrl+C to stop.")
+    try:
+        serve(host, port, workers, max_queue, max_upload_mb * 1024 * 1024, device)
+    except KeyboardInterrupt:
+        typer.echo("Stopped serving.")
+
+
+@app.command()
+def diff(
+    library_a: Path = typer.Argument(..., exists=True, file_okay=False, dir_okay=True),
+    library_b: Path = typer.Argument(..., exists=True, file_okay=False, dir_okay=True),
+    as_json: bool = typer.Option(False, "--json", help="Print the differences as JSON"),
+    workers: int = typer.Option(4, "--workers", "-w", min=1, help="Files hashed concurrently"),
+    device: str = device_option(),
+) -> None:
+    """Compare two FABA MKI libraries. Exits with code 1 if they differ."""
+    library_diff = diff_mki_libraries(library_a, library_b, workers=workers, device=device)
+
+    if as_json:
+        typer.echo(json.dumps(library_diff.to_dict(), indent=2))
+    else:
+        typer.echo(format_library_diff(library_diff))
+
+    if library_diff:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def details(
+    query: str = typer.Argument(..., help="Figure ID, or the beginning of an ID or a name"),
+    limit: int = typer.Option(20, "--limit", "-n", min=1, help="Most matches to list"),
+    device: str = device_option(),
+) -> None:
+    """Show what is known about a figure, or list the figures matching a search."""
+    index = default_figure_index()
+    if (fid := normalize_figure_id(query)) and (figure := index.get(fid)):
+        typer.echo(f"{get_device(device).figure_folder(figure.figure_id)}  {figure.name}")
+        for label, value in (
+            ("Language", figure.language),
+            ("Tracks", figure.tracks),
+            ("Source", figure.source_url),
+            ("Notes", figure.notes),
+        ):
+            if value:
+                typer.echo(f"  {label + ':':<10}{value}")
+        return
+
+    if not (matches := index.search(query, limit)):
+        typer.echo(f"No figures found for {query!r}.")
+        raise typer.Exit(code=1)
+    for figure in matches:
+        typer.echo(_describe(figure, device))
+
+
+@app.command()
+def selftest(
+    rounds: int = typer.Option(100, "--rounds", min=0, help="Random buffers per engine"),
+    seed: int | None = typer.Option(None, "--seed", help="Repeat the buffers of a previous run"),
+    device: str = device_option(),
+) -> None:
+    """Check that every codec engine gives the same bytes as the reference engine."""
+    seed = seed if seed is not None else secrets.randbelow(2**32)
+    typer.echo(f"Seed: {seed}")
+    reports = run_selftest(seed, rounds, device)
+    for report in reports:
+        outcome = "OK" if report.passed else f"{len(report.mismatches)} mismatches"
+        typer.echo(f"{report.engine}: {report.checks} checks, {outcome}")
+        for mismatch in report.mismatches:
+            typer.echo(f"  {mismatch}")
+    if not all(report.passed for report in reports):
+        raise typer.Exit(code=1)
+
+
+@app.command(name="ls")
+def list_figures(
+    faba_library: Path = typer.Option(
+        ..., "--faba-library", "-b", exists=True, file_okay=False, dir_okay=True
+    ),
+    device: str = device_option(),
+) -> None:
+    """List the figures of a FABA library with their tracks, size and known name."""
+    with Library(faba_library, device=device) as library:
+        figures = library.figures()
+    metadata = default_figure_index().annotate(figure.figure_id for figure in figures)
+
+    for figure in figures:
+        known = metadata.get(figure.figure_id)
+        typer.echo(
+            f"{figure.path.name}  {len(figure.tracks):3d} tracks  "
+            f"{figure.size / 1_000_000:8.1f} MB  {_title(known) if known else '-'}"
+        )
+    typer.echo(f"{len(figures)} figures.")
+
+
+def _describe(figure: FigureMetadata, device: str) -> str:
+    return f"{get_device(device).figure_folder(figure.figure_id)}  {_title(figure)}"
+
+
+def _title(figure: FigureMetadata) -> str:
+    language = f" ({figure.language})" if figure.language else ""
+    return f"{figure.name}{language}"
@@ -0,0 +1,197 @@
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass
+from enum import StrEnum
+from functools import cache, cached_property
+from typing import Callable
+
+from openfaba.consts import BYTE_HIGH_NIBBLE, BYTE_LOW_NIBBLE_EVEN, BYTE_LOW_NIBBLE_ODD
+
+DEFAULT_DEVICE = "faba"
+
+
+@dataclass(frozen=True)
+class DeviceProfile:
+    """
+    A family of devices: the byte transform of its audio files and its library layout.
+
+    The transform is defined one byte at a time by ``encode_byte(byte, phase)``
+    where ``phase`` is the position of the byte in the file modulo ``period``.
+    It must be a bijection for every phase, so that files can be decoded and
+    keep their length. A library holds one folder per figure named
+    ``<figure_prefix><4-digit ID>`` with tracks named
+    ``<track_prefix><2-digit number><track_suffix>``, at most ``max_tracks`` of
+    them per figure.
+    """
+
+    name: str
+    encode_byte: Callable[[int, int], int]
+    period: int = 4
+    figure_prefix: str = "K"
+    track_prefix: str = "CP"
+    track_suffix: str = ".MKI"
+    max_tracks: int = 99
+
+    def figure_folder(self, figure_id: str) -> str:
+        return f"{self.figure_prefix}{figure_id}"
+
+    def track_file(self, number: int) -> str:
+        return f"{self.track_prefix}{number:02d}{self.track_suffix}"
+
+    def track_title(self, figure_id: str, number: int) -> str:
+        """Title tag the device expects for a track (e.g. ``K0104CP01``)"""
+        return f"{self.figure_folder(figure_id)}{self.track_prefix}{number:02d}"
+
+    @cached_property
+    def figure_pattern(self) -> re.Pattern[str]:
+        return re.compile(rf"{re.escape(self.figure_prefix)}\d{{4}}")
+
+    @cached_property
+    def source_figure_pattern(self) -> re.Pattern[str]:
+        """Matches the end of a source folder named like a figure, capturing its ID"""
+        return re.compile(rf"{re.escape(self.figure_prefix)}(\d{{4}})$")
+
+    @cached_property
+    def track_pattern(self) -> re.Pattern[str]:
+        """Matches track file stems, capturing the track number"""
+        return re.compile(rf"{re.escape(self.track_prefix)}(\d{{2,}})", re.IGNORECASE)
+
+
+class CodecEngine(StrEnum):
+    """How bytes are translated. Every engine must give the output of ``REFERENCE``"""
+
+    # Lookup tables, with large files split across processes
+    AUTO = "auto"
+    # One byte at a time, straight from the ``encode_byte`` of the profile
+    REFERENCE = "reference"
+    # Lookup tables only
+    TABLE = "table"
+    # Lookup tables, with every file split across processes
+    PARALLEL = "parallel"
+
+
+_engine = CodecEngine.AUTO
+
+
+def get_engine() -> CodecEngine:
+    return _engine
+
+
+def set_engine(engine: CodecEngine) -> None:
+    """Choose the codec engine used by every conversion of the process"""
+    global _engine
+    _engine = engine
+
+
+class Codec:
+    """
+    The transform of a device profile compiled into 256-byte lookup tables.
+
+    There is one encoding and one decoding table per phase, and every phase
+    of a chunk is translated in one ``bytes.translate`` call over a strided
+    slice, instead of looping over the bytes in Python.
+    """
+
+    def __init__(self, profile: DeviceProfile) -> None:
+        self.profile = profile
+        self.encode_tables: list[bytes] = []
+        self.decode_tables: list[bytes] = []
+        for phase in range(profile.period):
+            table = bytes(profile.encode_byte(byte, phase) for byte in range(256))
+            if len(set(table)) != 256:
+                raise ValueError(f"The {profile.name} transform is not reversible at {phase=}")
+            inverse = bytearray(256)
+            for byte, encoded in enumerate(table):
+                inverse[encoded] = byte
+            self.encode_tables.append(table)
+            self.decode_tables.append(bytes(inverse))
+
+    def encode(self, data: bytes, offset: int = 0) -> bytes:
+        """Encode ``data`` found at byte ``offset`` of a file"""
+        if _engine is CodecEngine.REFERENCE:
+            return reference_translate(self.profile, data, offset)
+        return self._translate(data, offset, self.encode_tables)
+
+    def decode(self, data: bytes, offset: int = 0) -> bytes:
+        """Decode ``data`` found at byte ``offset`` of a file"""
+        if _engine is CodecEngine.REFERENCE:
+            return reference_translate(self.profile, data, offset, decode=True)
+        return self._translate(data, offset, self.decode_tables)
+
+    def _translate(self, data: bytes, offset: int, tables: list[bytes]) -> bytes:
+        return translate(data, offset, tables)
+
+
+def translate(data: bytes, offset: int, tables: Sequence[bytes]) -> bytes:
+    """Translate ``data`` found at byte ``offset`` of a file with one table per phase"""
+    period = len(tables)
+    output = bytearray(len(data))
+    for phase, table in enumerate(tables):
+        start = (phase - offset) % period
+        output[start::period] = data[start::period].translate(table)
+    return bytes(output)
+
+
+def reference_translate(
+    profile: DeviceProfile, data: bytes, offset: int = 0, decode: bool = False
+) -> bytes:
+    """
+    Translate ``data`` found at byte ``offset`` of a file one byte at a time.
+
+    This is the reference every faster engine is checked against, so it is
+    kept as plain as possible and must not be optimized: each byte goes
+    through ``profile.encode_byte`` (or its inverse) with its own phase.
+    """
+    output = bytearray()
+    for position, byte in enumerate(data, start=offset):
+        phase = position % profile.period
+        if decode:
+            output.append(_reference_inverse(profile)[phase][byte])
+        else:
+            output.append(profile.encode_byte(byte, phase))
+    return bytes(output)
+
+
+@cache
+def _reference_inverse(profile: DeviceProfile) -> list[dict[int, int]]:
+    return [
+        {profile.encode_byte(byte, phase): byte for byte in range(256)}
+        for phase in range(profile.period)
+    ]
+
+
+_DEVICES: dict[str, DeviceProfile] = {}
+
+
+def register_device(profile: DeviceProfile) -> None:
+    """Make a device profile available to every command, replacing any with its name"""
+    _DEVICES[profile.name] = profile
+    get_codec.cache_clear()
+
+
+def get_device(name: str = DEFAULT_DEVICE) -> DeviceProfile:
+    """Return a registered device profile, raising ValueError for unknown names"""
+    try:
+        return _DEVICES[name]
+    except KeyError:
+        raise ValueError(f"Unknown device {name!r}, choose from: {', '.join(_DEVICES)}") from None
+
+
+def device_names() -> list[str]:
+    return sorted(_DEVICES)
+
+
+@cache
+def get_codec(name: str = DEFAULT_DEVICE) -> Codec:
+    """Return the compiled codec of a device, built once and shared afterwards"""
+    return Codec(get_device(name))
+
+
+def _faba_encode_byte(byte: int, phase: int) -> int:
+    encoded = BYTE_HIGH_NIBBLE[phase][byte % 32]
+    if byte % 2 == 0:
+        return encoded + BYTE_LOW_NIBBLE_EVEN[phase][byte // 32]
+    return encoded + BYTE_LOW_NIBBLE_ODD[phase][byte // 32]
+
+
+register_device(DeviceProfile("faba", _faba_encode_byte))
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PurePosixPath
+
+from openfaba.codec import DEFAULT_DEVICE
+from openfaba.discovery import iter_mki_files
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LibraryDiff:
+    """Figures and tracks (as library-relative paths) that differ between two libraries"""
+
+    added_figures: list[str] = field(default_factory=list)
+    removed_figures: list[str] = field(default_factory=list)
+    changed_figures: list[str] = field(default_factory=list)
+    added_tracks: list[str] = field(default_factory=list)
+    removed_tracks: list[str] = field(default_factory=list)
+    changed_tracks: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added_tracks or self.removed_tracks or self.changed_tracks)
+
+    def to_dict(self) -> dict[str, list[str]]:
+        return asdict(self)
+
+
+def hash_file(path: Path) -> str:
+    """Return the SHA-256 of a file, read in chunks"""
+    with path.open("rb") as infile:
+        return hashlib.file_digest(infile, "sha256").hexdigest()
+
+
+def diff_mki_libraries(
+    library_a: Path, library_b: Path, workers: int = 4, device: str = DEFAULT_DEVICE
+) -> LibraryDiff:
+    """
+    Compare two Faba MKI libraries track by track.
+
+    Tracks are matched by their path inside the library. Tracks with different
+    sizes are changed without reading them; only tracks with equal sizes are
+    hashed, in parallel on ``workers`` threads.
+
+    Parameters
+    ----------
+    library_a:
+        Reference Faba library root directory (e.g. a golden master).
+    library_b:
+        Faba library root directory compared against ``library_a``.
+    workers:
+        Number of files hashed concurrently.
+    device:
+        Name of the device profile giving the layout of both libraries.
+
+    Returns
+    -------
+    LibraryDiff
+        What ``library_b`` adds, removes or changes with respect to ``library_a``.
+    """
+    tracks_a = _index_library(library_a, device)
+    tracks_b = _index_library(library_b, device)
+
+    diff = LibraryDiff()
+    diff.added_tracks = sorted(tracks_b.keys() - tracks_a.keys())
+    diff.removed_tracks = sorted(tracks_a.keys() - tracks_b.keys())
+
+    common = sorted(tracks_a.keys() & tracks_b.keys())
+    candidates = []
+    for track in common:
+        if tracks_a[track][1] != tracks_b[track][1]:
+            diff.changed_tracks.append(track)
+        else:
+            candidates.append(track)
+
+    logger.info("Hashing %d tracks with equal sizes", len(candidates))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes_a = pool.map(hash_file, (tracks_a[track][0] for track in candidates))
+        hashes_b = pool.map(hash_file, (tracks_b[track][0] for track in candidates))
+        for track, hash_a, hash_b in zip(candidates, hashes_a, hashes_b, strict=True):
+            if hash_a != hash_b:
+                diff.changed_tracks.append(track)
+    diff.changed_tracks.sort()
+
+    figures_a = {_figure_of(track) for track in tracks_a}
+    figures_b = {_figure_of(track) for track in tracks_b}
+    diff.added_figures = sorted(figures_b - figures_a)
+    diff.removed_figures = sorted(figures_a - figures_b)
+    diff.changed_figures = sorted(
+        {_figure_of(t) for t in diff.added_tracks + diff.removed_tracks + diff.changed_tracks}
+        & figures_a
+        & figures_b
+    )
+    return diff
+
+
+def format_library_diff(diff: LibraryDiff) -> str:
+    """Render a diff as one ``+``/``-``/``~`` line per track followed by a summary"""
+    lines = [f"+ {track}" for track in diff.added_tracks]
+    lines += [f"- {track}" for track in diff.removed_tracks]
+    lines += [f"~ {track}" for track in diff.changed_tracks]
+    lines.sort(key=lambda line: line[2:])
+    lines.append(
+        f"Figures: {len(diff.added_figures)} added, {len(diff.removed_figures)} removed, "
+        f"{len(diff.changed_figures)} changed. "
+        f"Tracks: {len(diff.added_tracks)} added, {len(diff.removed_tracks)} removed, "
+        f"{len(diff.changed_tracks)} changed."
+    )
+    return "\n".join(lines)
+
+
+def _index_library(faba_library: Path, device: str) -> dict[str, tuple[Path, int]]:
+    return {
+        found.path.relative_to(faba_library).as_posix(): (found.path, found.size)
+        for found in iter_mki_files(faba_library, device)
+    }
+
+
+def _figure_of(track: str) -> str:
+    return PurePosixPath(track).parent.name
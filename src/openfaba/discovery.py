@@ -0,0 +1,126 @@
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+from openfaba.codec import DEFAULT_DEVICE, get_device
+
+FIGURE_FOLDER_PATTERN = re.compile(r"K\d{4}")
+
+
+@dataclass(frozen=True)
+class DiscoveredFile:
+    """A file found during discovery, along with the stat result read while scanning"""
+
+    path: Path
+    stat: os.stat_result
+
+    @property
+    def size(self) -> int:
+        return self.stat.st_size
+
+    @property
+    def mtime_ns(self) -> int:
+        return self.stat.st_mtime_ns
+
+
+def iter_files(
+    root: Path,
+    suffix: str,
+    figures_only: bool = False,
+    on_directory: Callable[[Path], None] | None = None,
+    figure_pattern: re.Pattern[str] = FIGURE_FOLDER_PATTERN,
+) -> Iterator[DiscoveredFile]:
+    """
+    Yield the files below ``root`` whose suffix matches, case-insensitively.
+
+    The tree is walked depth-first with ``os.scandir`` and every directory is
+    sorted by name, so files come out in the same order as sorting all their
+    paths, while the first ones are yielded before the walk is finished.
+    Hidden directories (``.Trashes``, ``.Spotlight-V100``...) are skipped.
+
+    Parameters
+    ----------
+    root:
+        Directory to walk.
+    suffix:
+        File extension to match, including the dot (e.g. ``".mp3"``).
+    figures_only:
+        Only yield files stored directly in ``K####`` folders and do not walk
+        into any other subtree, which is the layout of a Faba library.
+    on_directory:
+        Called with every directory that is walked, ``root`` included.
+    figure_pattern:
+        Names of the figure folders for ``figures_only``, ``K####`` by default.
+    """
+    suffix = suffix.lower()
+    if on_directory is not None:
+        on_directory(root)
+
+    in_figure = figure_pattern.fullmatch(root.name) is not None
+    for entry in _sorted_entries(root):
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name.startswith("."):
+                continue
+            if figures_only and (in_figure or not figure_pattern.fullmatch(entry.name)):
+                continue
+            yield from iter_files(
+                Path(entry.path), suffix, figures_only, on_directory, figure_pattern
+            )
+        elif (
+            entry.name.lower().endswith(suffix)
+            and (in_figure or not figures_only)
+            and _is_file(entry)
+        ):
+            yield DiscoveredFile(Path(entry.path), entry.stat())
+
+
+def iter_mp3_files(
+    root: Path, on_directory: Callable[[Path], None] | None = None
+) -> Iterator[DiscoveredFile]:
+    """Yield every MP3 file below ``root`` in sorted path order"""
+    return iter_files(root, ".mp3", on_directory=on_directory)
+
+
+def iter_mki_files(faba_library: Path, device: str = DEFAULT_DEVICE) -> Iterator[DiscoveredFile]:
+    """Yield the MKI files of every ``K####`` figure folder of a Faba library, in order"""
+    profile = get_device(device)
+    return iter_files(
+        faba_library, profile.track_suffix, figures_only=True, figure_pattern=profile.figure_pattern
+    )
+
+
+def list_figure_folders(faba_library: Path, device: str = DEFAULT_DEVICE) -> set[str]:
+    """Return the names of the figure folders at the root of a Faba library, in one scan"""
+    pattern = get_device(device).figure_pattern
+    return {
+        entry.name
+        for entry in _sorted_entries(faba_library)
+        if pattern.fullmatch(entry.name) and entry.is_dir()
+    }
+
+
+def list_figure_mki_files(figure_path: Path, device: str = DEFAULT_DEVICE) -> list[DiscoveredFile]:
+    """Return the MKI files stored directly in a figure folder, sorted by name"""
+    suffix = get_device(device).track_suffix.lower()
+    return [
+        DiscoveredFile(Path(entry.path), entry.stat())
+        for entry in _sorted_entries(figure_path)
+        if entry.name.lower().endswith(suffix) and _is_file(entry)
+    ]
+
+
+def _sorted_entries(directory: Path) -> list[os.DirEntry[str]]:
+    try:
+        with os.scandir(directory) as scan:
+            return sorted(scan, key=lambda entry: entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _is_file(entry: os.DirEntry[str]) -> bool:
+    try:
+        return entry.is_file()
+    except OSError:
+        return False
@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+
+
+class OpenFabaError(Exception):
+    """Base class for the errors raised by openFABA"""
+
+
+class TaggingError(OpenFabaError):
+    """The tags of an MP3 file could not be read or rewritten"""
+
+
+class ConversionError(OpenFabaError):
+    """A file could not be converted to or from the MKI format"""
+
+
+class SourceReadError(ConversionError):
+    """A source file could not be opened, e.g. because it vanished or is not readable"""
+
+
+class TrackNotFoundError(OpenFabaError):
+    """The requested figure or track does not exist in the Faba library"""
+
+
+class FigureExistsError(OpenFabaError):
+    """A figure that should be created already exists in the Faba library"""
+
+
+class VerificationError(OpenFabaError):
+    """A file read back from the device does not match the checksum of what was written"""
+
+
+class BundleError(OpenFabaError):
+    """A figure bundle is malformed, truncated or does not match its checksums"""
+
+
+class WorkQueueError(OpenFabaError):
+    """A work queue shared by several machines is missing or cannot be created"""
+
+
+@dataclass(frozen=True)
+class ConversionFailure:
+    """A source file that was skipped by a batch conversion"""
+
+    source: str
+    reason: str
+
+
+class TargetWriteError(OpenFabaError):
+    """Some of the Faba libraries written at once by a fan-out conversion failed"""
+
+    def __init__(self, targets: int, failures: list[ConversionFailure]) -> None:
+        details = "; ".join(f"{failure.source}: {failure.reason}" for failure in failures)
+        super().__init__(f"Writing failed for {len(failures)} of {targets} libraries: {details}")
+        self.targets = targets
+        self.failures = failures
+
+
+class BatchConversionError(OpenFabaError):
+    """Some files of a batch conversion run with ``keep_going`` failed"""
+
+    def __init__(self, converted: int, failures: list[ConversionFailure]) -> None:
+        super().__init__(f"{len(failures)} files failed, {converted} converted")
+        self.converted = converted
+        self.failures = failures
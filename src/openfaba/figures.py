@@ -0,0 +1,174 @@
+import csv
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass
+from functools import cache
+from importlib.resources import files
+from pathlib import Path
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+FIGURES_CSV = "figures.csv"
+FIGURES_INDEX = "figures.db"
+CSV_FIELDS = ("figure_id", "name", "language", "tracks", "source_url", "notes")
+
+# Sorts after every character, so [prefix, prefix + _PREFIX_END) is a prefix range
+_PREFIX_END = "\U0010ffff"
+
+
+@dataclass(frozen=True)
+class FigureMetadata:
+    """What is known about a figure: its name, language, number of tracks and source"""
+
+    figure_id: str
+    name: str
+    language: str = ""
+    tracks: int | None = None
+    source_url: str = ""
+    notes: str = ""
+
+
+class FigureIndex:
+    """
+    Read-only lookups in a figure metadata index built by ``build_figure_index``.
+
+    Figures are stored in a SQLite B-tree by ID, with a second index on their
+    case-folded names, so a lookup by ID or by ID/name prefix reads a handful
+    of pages instead of the whole table. Every query opens the read-only
+    database file and closes it once answered, so an index can be shared by
+    threads and never leaves a connection open.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def get(self, figure_id: str) -> FigureMetadata | None:
+        """Return the metadata of one figure, or None when it is not indexed"""
+        row = self._query(
+            "SELECT figure_id, name, language, tracks, source_url, notes FROM figures "
+            "WHERE figure_id = ?",
+            (figure_id,),
+        )
+        return row[0] if row else None
+
+    def search(self, query: str, limit: int = 20) -> list[FigureMetadata]:
+        """Return the figures whose ID or name starts with ``query``, IDs first"""
+        if not (prefix := query.strip()):
+            return []
+        by_id = self._query(
+            "SELECT figure_id, name, language, tracks, source_url, notes FROM figures "
+            "WHERE figure_id >= ? AND figure_id < ? ORDER BY figure_id LIMIT ?",
+            (prefix, prefix + _PREFIX_END, limit),
+        )
+        by_name = self._query(
+            "SELECT figure_id, name, language, tracks, source_url, notes FROM figures "
+            "WHERE name_key >= ? AND name_key < ? ORDER BY name_key, figure_id LIMIT ?",
+            (prefix.casefold(), prefix.casefold() + _PREFIX_END, limit),
+        )
+        found = {figure.figure_id: figure for figure in [*by_id, *by_name]}
+        return list(found.values())[:limit]
+
+    def annotate(self, figure_ids: Iterable[str]) -> dict[str, FigureMetadata]:
+        """Look up many figures in a single query, skipping the unknown ones"""
+        rows = self._query(
+            "SELECT figure_id, name, language, tracks, source_url, notes FROM figures "
+            "WHERE figure_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(figure_ids)),),
+        )
+        return {figure.figure_id: figure for figure in rows}
+
+    def all(self) -> list[FigureMetadata]:
+        """Return every indexed figure, sorted by ID"""
+        return self._query(
+            "SELECT figure_id, name, language, tracks, source_url, notes FROM figures "
+            "ORDER BY figure_id",
+            (),
+        )
+
+    def _query(self, sql: str, parameters: tuple[object, ...]) -> list[FigureMetadata]:
+        uri = f"{self.path.resolve().as_uri()}?mode=ro&immutable=1"
+        with closing(sqlite3.connect(uri, uri=True)) as connection:
+            return [
+                FigureMetadata(figure_id, name, language, tracks, source_url, notes)
+                for figure_id, name, language, tracks, source_url, notes in connection.execute(
+                    sql, parameters
+                )
+            ]
+
+
+def read_figures_csv(csv_path: Path) -> list[FigureMetadata]:
+    """Parse a ``figures.csv`` file, raising ValueError for malformed rows"""
+    figures: dict[str, FigureMetadata] = {}
+    with csv_path.open(newline="", encoding="utf-8") as csv_file:
+        reader = csv.DictReader(csv_file)
+        if tuple(reader.fieldnames or ()) != CSV_FIELDS:
+            raise ValueError(f"{csv_path}: the columns must be {', '.join(CSV_FIELDS)}")
+        for line, row in enumerate(reader, start=2):
+            figure_id = row["figure_id"].strip()
+            if not (figure_id.isdigit() and len(figure_id) == 4):
+                raise ValueError(f"{csv_path}:{line}: figure_id must have 4 digits")
+            if figure_id in figures:
+                raise ValueError(f"{csv_path}:{line}: figure {figure_id} is listed twice")
+            tracks = row["tracks"].strip()
+            figures[figure_id] = FigureMetadata(
+                figure_id,
+                row["name"].strip(),
+                row["language"].strip(),
+                int(tracks) if tracks else None,
+                row["source_url"].strip(),
+                row["notes"].strip(),
+            )
+    return sorted(figures.values(), key=lambda figure: figure.figure_id)
+
+
+def build_figure_index(csv_path: Path, index_path: Path) -> int:
+    """Compile ``figures.csv`` into the SQLite index read by ``FigureIndex``"""
+    figures = read_figures_csv(csv_path)
+    index_path.unlink(missing_ok=True)
+    with closing(sqlite3.connect(index_path)) as connection, connection:
+        connection.executescript(
+            """
+            PRAGMA page_size = 4096;
+            CREATE TABLE figures (
+                figure_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                language TEXT NOT NULL,
+                tracks INTEGER,
+                source_url TEXT NOT NULL,
+                notes TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX figures_by_name ON figures (name_key, figure_id);
+            """
+        )
+        connection.executemany(
+            "INSERT INTO figures VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    f.figure_id,
+                    f.name,
+                    f.name.casefold(),
+                    f.language,
+                    f.tracks,
+                    f.source_url,
+                    f.notes,
+                )
+                for f in figures
+            ),
+        )
+    logger.info("Indexed %d figures into %s", len(figures), index_path)
+    return len(figures)
+
+
+def packaged_data(name: str) -> Path:
+    """Return the path of a data file shipped with openFABA"""
+    return Path(str(files("openfaba").joinpath("data", name)))
+
+
+@cache
+def default_figure_index() -> FigureIndex:
+    """Return the figure index shipped with openFABA, shared by every caller"""
+    return FigureIndex(packaged_data(FIGURES_INDEX))
@@ -1,94 +1,244 @@
+import hashlib
 import logging
-import sys
+from dataclasses import replace
+from io import BytesIO
 from pathlib import Path
+from typing import IO, Iterator
 
-from mutagen.id3 import ID3, TIT2  # type:ignore [attr-defined]
-from mutagen.mp3 import MP3
-
-from openfaba.consts import BYTE_HIGH_NIBBLE, BYTE_LOW_NIBBLE_EVEN, BYTE_LOW_NIBBLE_ODD
-from openfaba.utils import allow_invalid_synchsafe_in_mutagen
+from openfaba.archive import Mp3Source, is_archive, list_archive_mp3_members
+from openfaba.codec import DEFAULT_DEVICE, get_codec
+from openfaba.discovery import iter_mp3_files
+from openfaba.exceptions import ConversionError, TaggingError
+from openfaba.iopolicy import IoPolicy, advise_sequential, drop_cached_pages
+from openfaba.parallel import parallel_workers, translate_in_parallel
+from openfaba.tags import ID3_HEADER_SIZE, read_title, retitle_layout, set_title
+from openfaba.writer import OutputDigest, OutputWriter
 
 logger = logging.getLogger(__name__)
 
+# Files are transformed and streamed in chunks of this many bytes
+CHUNK_SIZE = 64 * 1024
+
 
-def clear_tags_and_set_title(mp3_file: Path, new_title: str) -> None:
-    """Remove all MP3 tags and set a single title tag"""
+def clear_tags_and_set_title(mp3_file: Path | IO[bytes], new_title: str) -> None:
+    """Remove all MP3 tags and set a single title tag, raising TaggingError on failure"""
     try:
         _clear_tags_and_set_title(mp3_file, new_title)
-        logger.info(f"Title updated for {mp3_file}")
+        logger.info(f"Title updated to {new_title}")
     except Exception as e:
-        logger.error(f"Error processing {mp3_file}: {e}")
-        sys.exit(1)
-
+        raise TaggingError(f"Error setting title {new_title}: {e}") from e
+
+
+def convert_mp3_to_mki(
+    mp3_file: Path | IO[bytes],
+    mki_file: Path,
+    writer: OutputWriter | None = None,
+    device: str = DEFAULT_DEVICE,
+    hash_source: bool = False,
+) -> OutputDigest:
+    """
+    Apply custom byte transformation to an mp3 file or an open binary stream.
+
+    With ``hash_source`` the SHA-256 of the MP3 bytes is computed chunk by chunk
+    as they are encoded, and returned along with the digest of the output.
+    """
+    try:
+        digest = _convert_mp3_to_mki(
+            mp3_file, mki_file, writer or OutputWriter(), device, hash_source
+        )
+        logger.info(f"Conversion complete. Output file: {mki_file}")
+        return digest
+    except IOError as e:
+        raise ConversionError(f"Error processing {mki_file}: {e}") from e
+
+
+def stream_mp3_to_mki(
+    mp3_stream: IO[bytes],
+    mki_file: Path,
+    new_title: str,
+    writer: OutputWriter | None = None,
+    device: str = DEFAULT_DEVICE,
+    hash_source: bool = False,
+) -> OutputDigest:
+    """
+    Retitle and encode a seekable MP3 stream without loading it in memory.
+
+    The output is the same as ``clear_tags_and_set_title`` followed by
+    ``convert_mp3_to_mki``: the ID3 tags are parsed from the stream, the new
+    tag is built on its own, and the audio between the old tags is encoded
+    chunk by chunk. Raises TaggingError if the stream is not a valid MP3.
+    """
+    try:
+        new_tag, start, end = retitle_layout(mp3_stream, new_title)
+    except Exception as e:
+        raise TaggingError(f"Error setting title {new_title}: {e}") from e
 
-def convert_mp3_to_mki(mp3_file: Path, mki_file: Path) -> None:
-    """Apply custom byte transformation to an mp3 file"""
     try:
-        _convert_mp3_to_mki(mp3_file, mki_file)
+        digest = _stream_mp3_to_mki(
+            mp3_stream, new_tag, start, end, mki_file, writer or OutputWriter(), device, hash_source
+        )
         logger.info(f"Conversion complete. Output file: {mki_file}")
+        return digest
     except IOError as e:
-        logger.error(f"Error processing {mp3_file}: {e}")
-        sys.exit(1)
+        raise ConversionError(f"Error processing {mki_file}: {e}") from e
 
 
-def convert_mki_to_mp3(mki_file: Path, mp3_file: Path) -> None:
+def convert_mki_to_mp3(
+    mki_file: Path,
+    mp3_file: Path,
+    writer: OutputWriter | None = None,
+    device: str = DEFAULT_DEVICE,
+) -> OutputDigest:
     """Reverse the custom byte transformation to restore the original mp3 file"""
     try:
-        _convert_mki_to_mp3(mki_file, mp3_file)
+        digest = _convert_mki_to_mp3(mki_file, mp3_file, writer or OutputWriter(), device)
         logger.info(f"Conversion complete. Output file: {mp3_file}")
+        return digest
     except IOError as e:
-        logger.error(f"Error processing {mki_file}: {e}")
-        sys.exit(1)
-
-
-def collect_all_mp3_files_in_folder(source: Path) -> list[Path]:
-    return sorted(p for p in source.rglob("*.mp3") if p.is_file())
-
-
-def _clear_tags_and_set_title(mp3_file: Path, new_title: str) -> None:
-    with allow_invalid_synchsafe_in_mutagen():
-        tags = MP3(mp3_file, ID3=ID3)
-        # If title already matches, skip to preserve exact original bytes
-        if "TIT2" in tags and len(tags) == 1 and str(tags["TIT2"].text[0]) == new_title:
-            return
-
-        # Ensure we write the title as UTF-16 (Encoding 1) and as a list of text
-        tags.delete()
-        tags["TIT2"] = TIT2(encoding=1, text=[new_title])
-        tags.save(v2_version=3, padding=lambda x: 0)
-
-
-def _convert_mp3_to_mki(mp3_file: Path, mki_file: Path) -> None:
-    with mp3_file.open("rb") as infile, mki_file.open("wb") as outfile:
-        for pos, byte in enumerate(infile.read()):
-            byte_pos = pos % 4
-
-            high_index = byte % 32
-            low_index = byte // 32
-
-            modified_byte = BYTE_HIGH_NIBBLE[byte_pos][high_index]
-
-            if byte % 2 == 0:
-                modified_byte += BYTE_LOW_NIBBLE_EVEN[byte_pos][low_index]
-            else:
-                modified_byte += BYTE_LOW_NIBBLE_ODD[byte_pos][low_index]
-
-            outfile.write(bytes((modified_byte,)))
-
-
-def _convert_mki_to_mp3(mki_file: Path, mp3_file: Path) -> None:
-    with mki_file.open("rb") as infile, mp3_file.open("wb") as outfile:
-        for pos, byte in enumerate(infile.read()):
-            byte_pos = pos % 4
-
-            high_byte = byte & 0xF0
-            low_byte = byte & 0x0F
-
-            index_high = BYTE_HIGH_NIBBLE[byte_pos].index(high_byte)
-            if low_byte in BYTE_LOW_NIBBLE_EVEN[byte_pos]:
-                index_low = BYTE_LOW_NIBBLE_EVEN[byte_pos].index(low_byte)
-            else:
-                index_low = BYTE_LOW_NIBBLE_ODD[byte_pos].index(low_byte)
-                index_high += 1
-
-            outfile.write(bytes((index_low * 32 + index_high,)))
+        raise ConversionError(f"Error processing {mki_file}: {e}") from e
+
+
+def read_mki_title(mki_file: Path, device: str = DEFAULT_DEVICE) -> str | None:
+    """Return the title tag of an MKI file, decoding only its ID3 header, or None if missing"""
+    codec = get_codec(device)
+    with mki_file.open("rb") as infile:
+        header = codec.decode(infile.read(ID3_HEADER_SIZE))
+        if len(header) < ID3_HEADER_SIZE or not header.startswith(b"ID3"):
+            return None
+        # The tag size is a synchsafe integer: 7 significant bits per byte
+        tag_size = sum((b & 0x7F) << (7 * (3 - i)) for i, b in enumerate(header[6:10]))
+        tag = header + codec.decode(infile.read(tag_size), ID3_HEADER_SIZE)
+    return read_title(tag)
+
+
+def collect_all_mp3_files_in_folder(source: Path) -> list[Mp3Source]:
+    """Collect the MP3 files of a folder or of a ZIP/TAR archive, sorted by path"""
+    if is_archive(source):
+        return list(list_archive_mp3_members(source))
+    return [found.path for found in iter_mp3_files(source)]
+
+
+def _clear_tags_and_set_title(mp3_file: Path | IO[bytes], new_title: str) -> None:
+    if isinstance(mp3_file, Path):
+        with mp3_file.open("r+b") as stream:
+            set_title(stream, new_title)
+    else:
+        set_title(mp3_file, new_title)
+
+
+def iter_mki_to_mp3_chunks(
+    mki_file: Path,
+    chunk_size: int = CHUNK_SIZE,
+    io_policy: IoPolicy = IoPolicy.CACHED,
+    device: str = DEFAULT_DEVICE,
+) -> Iterator[bytes]:
+    """Yield the restored MP3 bytes of an MKI file chunk by chunk, as soon as each is decoded"""
+    codec = get_codec(device)
+    with mki_file.open("rb") as infile:
+        if io_policy is not IoPolicy.CACHED:
+            advise_sequential(infile)
+        offset = 0
+        while chunk := infile.read(chunk_size):
+            if io_policy is not IoPolicy.CACHED:
+                drop_cached_pages(infile.fileno(), offset, len(chunk))
+            yield codec.decode(chunk, offset)
+            offset += len(chunk)
+
+
+def iter_mp3_to_mki_chunks(
+    data: bytes, chunk_size: int = CHUNK_SIZE, device: str = DEFAULT_DEVICE
+) -> Iterator[bytes]:
+    """Yield the MKI bytes of an in-memory MP3 file chunk by chunk"""
+    codec = get_codec(device)
+    for offset in range(0, len(data), chunk_size):
+        yield codec.encode(data[offset : offset + chunk_size], offset)
+
+
+def _convert_mp3_to_mki(
+    mp3_file: Path | IO[bytes],
+    mki_file: Path,
+    writer: OutputWriter,
+    device: str,
+    hash_source: bool = False,
+) -> OutputDigest:
+    if isinstance(mp3_file, Path):
+        with mp3_file.open("rb") as infile:
+            data = infile.read()
+            if writer.io_policy is not IoPolicy.CACHED:
+                drop_cached_pages(infile.fileno())
+    else:
+        mp3_file.seek(0)
+        data = mp3_file.read()
+
+    codec = get_codec(device)
+    source_hash = hashlib.sha256() if hash_source else None
+    # The transform preserves length, so the output size is known before writing
+    with writer.open(mki_file, size=len(data)) as outfile:
+        if parallel_workers(len(data)):
+            translate_in_parallel(BytesIO(data), outfile, len(data), False, device, source_hash)
+        else:
+            for offset in range(0, len(data), CHUNK_SIZE):
+                chunk = data[offset : offset + CHUNK_SIZE]
+                if source_hash is not None:
+                    source_hash.update(chunk)
+                outfile.write(codec.encode(chunk, offset))
+
+    if source_hash is None:
+        return outfile.digest
+    return replace(outfile.digest, source_sha256=source_hash.hexdigest())
+
+
+def _stream_mp3_to_mki(
+    mp3_stream: IO[bytes],
+    new_tag: bytes,
+    start: int,
+    end: int,
+    mki_file: Path,
+    writer: OutputWriter,
+    device: str,
+    hash_source: bool,
+) -> OutputDigest:
+    codec = get_codec(device)
+    source_hash = hashlib.sha256(new_tag) if hash_source else None
+    audio_size = end - start
+    with writer.open(mki_file, size=len(new_tag) + audio_size) as outfile:
+        outfile.write(codec.encode(new_tag))
+        mp3_stream.seek(start)
+        if parallel_workers(audio_size):
+            translate_in_parallel(
+                mp3_stream, outfile, audio_size, False, device, source_hash, len(new_tag)
+            )
+        else:
+            position = 0
+            while position < audio_size:
+                chunk = mp3_stream.read(min(CHUNK_SIZE, audio_size - position))
+                if not chunk:
+                    raise IOError(f"The MP3 stream ended before byte {end}")
+                if source_hash is not None:
+                    source_hash.update(chunk)
+                outfile.write(codec.encode(chunk, len(new_tag) + position))
+                position += len(chunk)
+
+    if source_hash is None:
+        return outfile.digest
+    return replace(outfile.digest, source_sha256=source_hash.hexdigest())
+
+
+def _convert_mki_to_mp3(
+    mki_file: Path, mp3_file: Path, writer: OutputWriter, device: str
+) -> OutputDigest:
+    size = mki_file.stat().st_size
+    with writer.open(mp3_file, size=size) as outfile:
+        if parallel_workers(size):
+            with mki_file.open("rb") as infile:
+                if writer.io_policy is not IoPolicy.CACHED:
+                    advise_sequential(infile)
+                translate_in_parallel(infile, outfile, size, True, device)
+                if writer.io_policy is not IoPolicy.CACHED:
+                    drop_cached_pages(infile.fileno())
+        else:
+            chunks = iter_mki_to_mp3_chunks(mki_file, io_policy=writer.io_policy, device=device)
+            for chunk in chunks:
+                outfile.write(chunk)
+
+    return outfile.digest
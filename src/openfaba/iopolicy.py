@@ -0,0 +1,110 @@
+import importlib.util
+import logging
+import mmap
+import os
+from collections.abc import Buffer
+from enum import StrEnum
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO
+
+logger = logging.getLogger(__name__)
+
+# O_DIRECT transfers must start and end on multiples of the device logical block size
+DIRECT_ALIGNMENT = 4096
+DIRECT_BUFFER_SIZE = 1024 * 1024
+
+
+class IoPolicy(StrEnum):
+    """How conversions use the page cache of the operating system"""
+
+    CACHED = "cached"
+    STREAM = "stream"
+    DIRECT = "direct"
+
+
+def direct_io_available() -> bool:
+    """Return True if this platform can write files with ``O_DIRECT``, as Linux does"""
+    return hasattr(os, "O_DIRECT") and importlib.util.find_spec("fcntl") is not None
+
+
+def advise_sequential(infile: BinaryIO) -> None:
+    """Tell the kernel a file will be read once, front to back"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(infile.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError as exc:
+            logger.debug("posix_fadvise not supported: %s", exc)
+
+
+def drop_cached_pages(fd: int, offset: int = 0, length: int = 0) -> None:
+    """
+    Evict a range of a file from the page cache, the whole file by default.
+
+    Only clean pages are dropped: data written to a file must be flushed to
+    the device first for its pages to be released.
+    """
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+        except OSError as exc:
+            logger.debug("posix_fadvise not supported: %s", exc)
+
+
+class DirectFile:
+    """
+    Write-only file opened with ``O_DIRECT``, bypassing the page cache.
+
+    Data is copied to a page-aligned buffer and written in aligned blocks. A
+    trailing partial block can only be written through the page cache, so it
+    must be the last write of the file. Raises OSError on open if the
+    filesystem does not support direct I/O. Only available where
+    ``direct_io_available`` is True.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT, 0o644)
+        self._buffer = mmap.mmap(-1, DIRECT_BUFFER_SIZE)
+
+    def __enter__(self) -> "DirectFile":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def write(self, data: Buffer) -> int:
+        view = memoryview(data).cast("B")
+        aligned = len(view) - len(view) % DIRECT_ALIGNMENT
+        for start in range(0, aligned, DIRECT_BUFFER_SIZE):
+            block = view[start : min(start + DIRECT_BUFFER_SIZE, aligned)]
+            self._buffer[: len(block)] = block
+            _write_all(self._fd, memoryview(self._buffer)[: len(block)])
+
+        if aligned < len(view):
+            import fcntl  # Unix only, like O_DIRECT itself
+
+            flags = fcntl.fcntl(self._fd, fcntl.F_GETFL)
+            fcntl.fcntl(self._fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+            _write_all(self._fd, view[aligned:])
+        return len(view)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if not self._buffer.closed:
+            self._buffer.close()
+            os.close(self._fd)
+
+
+def _write_all(fd: int, data: memoryview) -> None:
+    while data:
+        data = data[os.write(fd, data) :]
@@ -0,0 +1,111 @@
+import json
+import logging
+from collections import defaultdict
+from pathlib import Path
+from types import TracebackType
+from typing import TextIO
+
+from openfaba.archive import Mp3Source
+from openfaba.writer import OutputDigest, partial_file
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_NAME = ".openfaba-journal.jsonl"
+
+
+class ConversionJournal:
+    """
+    Append-only record of the files completed by a library conversion.
+
+    The journal lives in the target library while a conversion is running and
+    holds one JSON line per finished output file with its source, size and
+    SHA-256. It is removed once the conversion completes, so its presence
+    means a previous run was interrupted and can be resumed.
+    """
+
+    def __init__(self, library: Path, resume: bool = False) -> None:
+        self.library = library
+        self.path = library / JOURNAL_NAME
+        self.resume = resume
+        self._entries: dict[str, dict[str, str | int]] = {}
+        self._file: TextIO | None = None
+
+    def __enter__(self) -> "ConversionJournal":
+        if self.path.exists():
+            previous = self._load()
+            self._remove_partial_files(previous)
+            if self.resume:
+                self._entries = previous
+                logger.info("Resuming conversion, %d files already done", len(self._entries))
+
+        # The journal is written before any output, its library may not exist yet
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a" if self.resume else "w", encoding="utf-8")
+        if self._file.tell() > 0:
+            # Never append to a line cut short by the interruption
+            self._file.write("\n")
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if exc_type is None:
+            self.path.unlink(missing_ok=True)
+
+    def is_complete(self, source: Mp3Source, target: Path) -> bool:
+        """Return True if ``target`` was fully converted from ``source`` by a previous run"""
+        entry = self._entries.get(self._key(target))
+        if entry is None or entry["source"] != str(source):
+            return False
+        try:
+            return target.stat().st_size == entry["size"]
+        except FileNotFoundError:
+            return False
+
+    def record(self, source: Mp3Source, target: Path, digest: OutputDigest) -> None:
+        """Mark ``target`` as completely converted from ``source``"""
+        assert self._file is not None, "The journal must be used as a context manager"
+        entry: dict[str, str | int] = {
+            "target": self._key(target),
+            "source": str(source),
+            "size": digest.size,
+            "sha256": digest.sha256,
+        }
+        self._entries[self._key(target)] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def _remove_partial_files(self, entries: dict[str, dict[str, str | int]]) -> None:
+        # Outputs are renamed into place when complete, so the temporary files left by the
+        # interrupted run are never valid. Only the folders it wrote to are cleaned, and only
+        # of files named like the temporary file of one of its outputs
+        suffixes_by_folder: defaultdict[Path, set[str]] = defaultdict(set)
+        for key in entries:
+            target = self.library / key
+            suffixes_by_folder[target.parent].add(target.suffix.lower())
+        for folder, suffixes in suffixes_by_folder.items():
+            for candidate in folder.glob(".*.part"):
+                target = folder / candidate.name[1:].removesuffix(".part")
+                if target.suffix.lower() in suffixes and partial_file(target) == candidate:
+                    candidate.unlink()
+
+    def _key(self, target: Path) -> str:
+        return target.relative_to(self.library).as_posix()
+
+    def _load(self) -> dict[str, dict[str, str | int]]:
+        entries = {}
+        with self.path.open(encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may have been cut short by the interruption
+                    continue
+                entries[entry["target"]] = entry
+        return entries
@@ -0,0 +1,290 @@
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from types import TracebackType
+from typing import Iterator, Sequence
+
+from openfaba.archive import Mp3Source
+from openfaba.codec import DEFAULT_DEVICE, DeviceProfile, get_device
+from openfaba.discovery import DiscoveredFile, iter_mki_files, list_figure_mki_files
+from openfaba.exceptions import FigureExistsError, TrackNotFoundError
+from openfaba.io import collect_all_mp3_files_in_folder, convert_mki_to_mp3, read_mki_title
+from openfaba.media import obfuscate_figure_mp3_files
+from openfaba.writer import OutputWriter, SyncPolicy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TrackInfo:
+    """A ``CP##.MKI`` file of a figure"""
+
+    number: int
+    path: Path
+    size: int
+
+
+@dataclass(frozen=True)
+class FigureInfo:
+    """A ``K####`` figure folder of a Faba library and its tracks, in playback order"""
+
+    figure_id: str
+    path: Path
+    tracks: tuple[TrackInfo, ...]
+
+    @property
+    def size(self) -> int:
+        return sum(track.size for track in self.tracks)
+
+
+@dataclass(frozen=True)
+class VerificationIssue:
+    """A problem found in a Faba library by ``Library.verify``"""
+
+    path: str
+    problem: str
+
+
+class Library:
+    """
+    A Faba library, for programs that manage figures without the CLI.
+
+    The figures and tracks of the library are indexed the first time they are
+    needed and the index is kept up to date by the methods that change the
+    library, so repeated queries never rescan the card. Tracks are extracted
+    and verified on a pool of ``workers`` threads that lives as long as the
+    library object; use it as a context manager or call ``close`` to release it.
+
+    Operations run inside ``batch()`` skip the per-figure flush, and every
+    file they wrote is flushed to the device once, when the batch ends. The
+    layout and encoding of the files follow the ``device`` profile.
+
+    Example
+    -------
+    >>> with Library(Path("/mnt/faba/MKI01")) as library, library.batch():
+    ...     library.insert("4742", Path("songs"))
+    ...     library.extend("0104", Path("more_songs"))
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        workers: int = 4,
+        sync: SyncPolicy = SyncPolicy.FIGURE,
+        device: str = DEFAULT_DEVICE,
+    ) -> None:
+        self.path = path
+        self.workers = workers
+        self.sync = sync
+        self.device = device
+        self.profile = get_device(device)
+        self._index: dict[str, FigureInfo] | None = None
+        self._pool: ThreadPoolExecutor | None = None
+        self._batch: set[str] | None = None
+
+    def __enter__(self) -> "Library":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the worker pool, it is started again if needed"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def figures(self) -> list[FigureInfo]:
+        """Return every figure of the library, sorted by ID"""
+        return [self._figures()[figure_id] for figure_id in sorted(self._figures())]
+
+    def figure(self, figure_id: str) -> FigureInfo:
+        """Return one figure, raising TrackNotFoundError if it has no tracks"""
+        figure_id = _normalize(figure_id)
+        if figure_id not in self._figures():
+            raise TrackNotFoundError(
+                f"Figure {self._folder(figure_id)} does not exist in the library."
+            )
+        return self._figures()[figure_id]
+
+    def __contains__(self, figure_id: str) -> bool:
+        return _normalize(figure_id) in self._figures()
+
+    def refresh(self) -> None:
+        """Forget the index, for when the library was changed by someone else"""
+        self._index = None
+
+    def insert(self, figure_id: str, sources: Path | Sequence[Mp3Source]) -> FigureInfo:
+        """Create a figure from a folder, an archive or a list of MP3 files"""
+        figure_id = _normalize(figure_id)
+        figure_path = self.path / self._folder(figure_id)
+        if figure_path.exists() and (not figure_path.is_dir() or any(figure_path.iterdir())):
+            raise FigureExistsError(f"Figure {figure_path.name} already exists in the library.")
+        return self._obfuscate(figure_id, sources, append=False)
+
+    def extend(self, figure_id: str, sources: Path | Sequence[Mp3Source]) -> FigureInfo:
+        """Append tracks to an existing figure"""
+        figure_id = _normalize(figure_id)
+        if not (self.path / self._folder(figure_id)).is_dir():
+            raise TrackNotFoundError(
+                f"Figure {self._folder(figure_id)} does not exist in the library."
+            )
+        return self._obfuscate(figure_id, sources, append=True)
+
+    def replace(self, figure_id: str, sources: Path | Sequence[Mp3Source]) -> FigureInfo:
+        """Recreate a figure from scratch, whether it exists or not"""
+        figure_id = _normalize(figure_id)
+        mp3_files = _collect(sources)
+        figure_path = self.path / self._folder(figure_id)
+        if figure_path.exists():
+            shutil.rmtree(figure_path)
+        return self._obfuscate(figure_id, mp3_files, append=False)
+
+    def extract(self, figure_id: str, output_folder: Path) -> list[Path]:
+        """Restore the tracks of a figure as MP3 files in ``output_folder/K####``"""
+        figure = self.figure(figure_id)
+        target_path = output_folder / figure.path.name
+        target_path.mkdir(parents=True, exist_ok=True)
+
+        targets = [(target_path / t.path.name).with_suffix(".mp3") for t in figure.tracks]
+        with OutputWriter(self.sync) as writer:
+            list(
+                self._workers().map(
+                    lambda track, target: convert_mki_to_mp3(
+                        track.path, target, writer, self.device
+                    ),
+                    figure.tracks,
+                    targets,
+                )
+            )
+        return targets
+
+    def verify(self, figure_ids: Sequence[str] | None = None) -> list[VerificationIssue]:
+        """
+        Check figures for problems the Faba box would stumble on.
+
+        Tracks must be numbered ``CP01``, ``CP02``... without gaps, must not be
+        empty and must carry the ``K####CP##`` title the box expects. Only the
+        ID3 header of every track is decoded, on the worker pool.
+        """
+        figures = self.figures() if figure_ids is None else [self.figure(f) for f in figure_ids]
+        issues = self._workers().map(partial(_verify_figure, profile=self.profile), figures)
+        return [issue for figure_issues in issues for issue in figure_issues]
+
+    @contextmanager
+    def batch(self) -> Iterator["Library"]:
+        """Defer flushing every file written inside the block to its end"""
+        if self._batch is not None:
+            yield self
+            return
+
+        self._batch = set()
+        try:
+            yield self
+        finally:
+            touched, self._batch = self._batch, None
+            for figure_id in sorted(touched):
+                if (figure_path := self.path / self._folder(figure_id)).is_dir():
+                    _fsync_folder(figure_path, self.device)
+
+    def _obfuscate(
+        self, figure_id: str, sources: Path | Sequence[Mp3Source], append: bool
+    ) -> FigureInfo:
+        mp3_files = _collect(sources)
+        sync = self.sync if self._batch is None else SyncPolicy.NEVER
+        obfuscate_figure_mp3_files(
+            figure_id, mp3_files, self.path, append=append, sync=sync, device=self.device
+        )
+        if self._batch is not None:
+            self._batch.add(figure_id)
+        return self._reindex(figure_id)
+
+    def _figures(self) -> dict[str, FigureInfo]:
+        if self._index is None:
+            found_by_figure: dict[str, list[DiscoveredFile]] = {}
+            prefix_length = len(self.profile.figure_prefix)
+            for found in iter_mki_files(self.path, self.device):
+                figure_id = found.path.parent.name[prefix_length:]
+                found_by_figure.setdefault(figure_id, []).append(found)
+            self._index = {
+                figure_id: self._figure_info(figure_id, found)
+                for figure_id, found in found_by_figure.items()
+            }
+        return self._index
+
+    def _reindex(self, figure_id: str) -> FigureInfo:
+        figure_path = self.path / self._folder(figure_id)
+        figure = self._figure_info(figure_id, list_figure_mki_files(figure_path, self.device))
+        if self._index is not None:
+            if figure.tracks:
+                self._index[figure_id] = figure
+            else:
+                self._index.pop(figure_id, None)
+        return figure
+
+    def _folder(self, figure_id: str) -> str:
+        return self.profile.figure_folder(figure_id)
+
+    def _figure_info(self, figure_id: str, found: list[DiscoveredFile]) -> FigureInfo:
+        tracks = []
+        for track in found:
+            match = self.profile.track_pattern.fullmatch(track.path.stem)
+            number = int(match.group(1)) if match else 0
+            tracks.append(TrackInfo(number, track.path, track.size))
+        return FigureInfo(figure_id, self.path / self._folder(figure_id), tuple(tracks))
+
+    def _workers(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="openfaba")
+        return self._pool
+
+
+def _normalize(figure_id: str) -> str:
+    if not (figure_id.isdigit() and len(figure_id) <= 4):
+        raise ValueError(f"Figure ID must be a 4-digit number, not {figure_id!r}")
+    return f"{int(figure_id):04d}"
+
+
+def _collect(sources: Path | Sequence[Mp3Source]) -> Sequence[Mp3Source]:
+    mp3_files = collect_all_mp3_files_in_folder(sources) if isinstance(sources, Path) else sources
+    if not mp3_files:
+        raise ValueError(f"No MP3 files found in {sources}")
+    return mp3_files
+
+
+def _verify_figure(figure: FigureInfo, profile: DeviceProfile) -> list[VerificationIssue]:
+    issues = []
+    for expected_number, track in enumerate(figure.tracks, start=1):
+        if track.number != expected_number:
+            problem = f"expected {profile.track_file(expected_number)} at this position"
+            issues.append(VerificationIssue(str(track.path), problem))
+            continue
+        if track.size == 0:
+            issues.append(VerificationIssue(str(track.path), "empty file"))
+            continue
+        expected_title = profile.track_title(figure.figure_id, track.number)
+        if (title := read_mki_title(track.path, profile.name)) != expected_title:
+            problem = f"title is {title!r}, expected {expected_title!r}"
+            issues.append(VerificationIssue(str(track.path), problem))
+    return issues
+
+
+def _fsync_folder(folder: Path, device: str) -> None:
+    for found in list_figure_mki_files(folder, device):
+        with found.path.open("rb") as written:
+            os.fsync(written.fileno())
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from openfaba.archive import Mp3Source
+from openfaba.exceptions import VerificationError
+from openfaba.iopolicy import drop_cached_pages
+from openfaba.writer import OutputDigest, atomic_writer
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".openfaba-manifest.json"
+MANIFEST_VERSION = 1
+
+# Per track file name: size, sha256, source and source_sha256
+ManifestEntries = dict[str, dict[str, str | int | None]]
+
+
+class ChecksumRecorder:
+    """
+    Keeps a checksum manifest in every figure folder written by a conversion.
+
+    The digests come from the conversion itself: outputs are hashed as they
+    are written and sources as they are encoded, so no file is read twice.
+    Recorded tracks are merged into the ``.openfaba-manifest.json`` of their
+    figure on ``flush()``, which callers invoke once the files are durable.
+
+    With ``verify`` every flushed track is also read back once, bypassing the
+    page cache where the platform allows it, and compared with its digest.
+    """
+
+    def __init__(self, verify: bool = False) -> None:
+        self.verify = verify
+        self._pending: dict[Path, ManifestEntries] = {}
+
+    def record(self, source: Mp3Source, target: Path, digest: OutputDigest) -> None:
+        """Add a converted track to the manifest of its figure"""
+        self._pending.setdefault(target.parent, {})[target.name] = {
+            "size": digest.size,
+            "sha256": digest.sha256,
+            "source": str(source),
+            "source_sha256": digest.source_sha256,
+        }
+
+    def flush(self) -> None:
+        """Write the manifests of the recorded tracks, reading them back with ``verify``"""
+        pending, self._pending = self._pending, {}
+        for figure_path, entries in pending.items():
+            manifest = read_manifest(figure_path)
+            manifest.update(entries)
+            write_manifest(figure_path, manifest)
+            if self.verify:
+                verify_tracks(figure_path, entries)
+                logger.info("Verified %d tracks of %s", len(entries), figure_path.name)
+
+
+def read_manifest(figure_path: Path) -> ManifestEntries:
+    """Return the tracks listed in the manifest of a figure, if it has one"""
+    try:
+        with (figure_path / MANIFEST_NAME).open(encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+    tracks: ManifestEntries = manifest["tracks"]
+    return tracks
+
+
+def write_manifest(figure_path: Path, tracks: ManifestEntries) -> None:
+    """Replace the manifest of a figure atomically"""
+    manifest = {"version": MANIFEST_VERSION, "tracks": dict(sorted(tracks.items()))}
+    data = (json.dumps(manifest, indent=2) + "\n").encode()
+    with atomic_writer(figure_path / MANIFEST_NAME, len(data)) as outfile:
+        outfile.write(data)
+
+
+def verify_tracks(figure_path: Path, tracks: ManifestEntries) -> None:
+    """Read tracks back from the device and raise VerificationError on any mismatch"""
+    for name, expected in tracks.items():
+        track = figure_path / name
+        with track.open("rb") as infile:
+            # Only clean pages can be dropped, so make sure they reached the device
+            os.fsync(infile.fileno())
+            drop_cached_pages(infile.fileno())
+            digest = hashlib.file_digest(infile, "sha256").hexdigest()
+            size = infile.tell()
+        if size != expected["size"] or digest != expected["sha256"]:
+            raise VerificationError(f"{track} does not match what was written")
@@ -1,23 +1,72 @@
 import logging
-import re
 import shutil
-import tempfile
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from functools import partial
+from io import BytesIO
 from pathlib import Path
-
-from openfaba.io import clear_tags_and_set_title, convert_mki_to_mp3, convert_mp3_to_mki
+from typing import IO, Generator, Iterable, Iterator, Sequence
+
+from openfaba.archive import (
+    Mp3Source,
+    UnreadableSource,
+    is_archive,
+    iter_mp3_source_streams,
+    list_archive_mp3_members,
+    prefetch_mp3_source_streams,
+    source_size,
+)
+from openfaba.codec import DEFAULT_DEVICE, get_device
+from openfaba.discovery import (
+    iter_mki_files,
+    iter_mp3_files,
+    list_figure_folders,
+    list_figure_mki_files,
+)
+from openfaba.exceptions import (
+    BatchConversionError,
+    ConversionFailure,
+    OpenFabaError,
+    SourceReadError,
+    TrackNotFoundError,
+)
+from openfaba.io import (
+    clear_tags_and_set_title,
+    convert_mki_to_mp3,
+    convert_mp3_to_mki,
+    iter_mki_to_mp3_chunks,
+    stream_mp3_to_mki,
+)
+from openfaba.iopolicy import IoPolicy
+from openfaba.journal import ConversionJournal
+from openfaba.manifest import ChecksumRecorder
+from openfaba.memory import IN_MEMORY_COPIES, memory_budget, streaming_buffer_size
+from openfaba.writer import FanOutWriter, OutputDigest, OutputWriter, SyncPolicy
 
 logger = logging.getLogger(__name__)
 
+# A planned conversion: source MP3, title to set and MKI file to write
+Track = tuple[Mp3Source, str, Path]
+
 
 def obfuscate_figure_mp3_files(
-    figure_id: str, source_mp3_files: list[Path], faba_library: Path, append: bool = False
+    figure_id: str,
+    source_mp3_files: Sequence[Mp3Source],
+    faba_library: Path,
+    append: bool = False,
+    sync: SyncPolicy = SyncPolicy.FIGURE,
+    device: str = DEFAULT_DEVICE,
+    checksum: bool = False,
+    verify: bool = False,
+    mirrors: Sequence[Path] = (),
+    prefetch: int = 0,
 ) -> None:
     """
     Obfuscate a sequence of MP3 files for a single Faba figure.
 
-    Each MP3 file is copied to a temporary location, stripped of metadata,
-    assigned a deterministic title, and converted to the proprietary MKI format.
+    Each MP3 file is loaded in memory, stripped of metadata, assigned a
+    deterministic title, and converted to the proprietary MKI format.
     Resulting files are written into the corresponding figure folder inside
     the Faba library (e.g. ``K0104``).
 
@@ -27,6 +76,7 @@ def obfuscate_figure_mp3_files(
         Four-digit Faba figure identifier (e.g. ``"0104"``).
     source_mp3_files:
         Ordered collection of source MP3 files to obfuscate for this figure.
+        Files may live on disk or inside a ZIP/TAR archive.
     faba_library:
         Root path of the target Faba library (typically an ``MKI01`` folder).
     append:
@@ -34,90 +84,464 @@ def obfuscate_figure_mp3_files(
         tracks are numbered after the highest existing ``.MKI`` file. When
         False (default) the figure will be created/overwritten starting at
         track 1.
+    sync:
+        When written files are flushed to the storage device: after each
+        file, once the whole figure is written (default) or never.
+    device:
+        Name of the device profile giving the file layout and the encoding.
+    checksum:
+        When True, the SHA-256 of every source and output computed during the
+        conversion is stored in the manifest of the figure folder.
+    verify:
+        When True, the figure is also read back from the device once written
+        and compared with the manifest. Implies ``checksum``.
+    mirrors:
+        Further Faba libraries that receive the same files as ``faba_library``.
+        Every track is converted once and written to all of them concurrently.
+        Not supported together with ``append``.
+    prefetch:
+        Number of source files read ahead on background threads while the
+        current one is converted. 0 (default) reads each file when its turn
+        comes.
+
+    Raises
+    ------
+    VerificationError
+        If a file read back with ``verify`` does not match what was written.
+    TargetWriteError
+        If writing to some of the libraries failed. The others are complete.
     """
     if not source_mp3_files:
         logger.warning("No MP3 files provided for figure `%s`", figure_id)
         return
+    if append and mirrors:
+        raise ValueError("Tracks cannot be appended to several libraries at once")
 
-    logger.info("Converting files for figure: `%s`", figure_id)
-
-    figure_path = faba_library / f"K{figure_id}"
-    if append and not figure_path.exists():
-        raise ValueError("You cannot append tracks to an unexisting figure")
-    figure_path.mkdir(parents=True, exist_ok=True)
-
-    existing_mki = sorted(p for p in figure_path.iterdir() if p.suffix.lower() == ".mki")
-    start_index = (len(existing_mki) + 1) if append else 1
-
-    for index, mp3_file in enumerate(sorted(source_mp3_files), start=start_index):
-        logger.info(
-            "Converting file %s [%d/%d]",
-            mp3_file.name,
-            index - start_index + 1,
-            len(source_mp3_files),
-        )
-
-        file_number = f"{index:02d}"
-
-        temp_handle = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-        temp_mp3 = Path(temp_handle.name)
-        temp_handle.close()  # Required for Windows compatibility
-
-        try:
-            shutil.copy(mp3_file, temp_mp3)
-
-            new_title = f"K{figure_id}CP{file_number}"
-            clear_tags_and_set_title(temp_mp3, new_title)
-
-            obfuscated_file = figure_path / f"CP{file_number}.MKI"
-            convert_mp3_to_mki(temp_mp3, obfuscated_file)
-        finally:
-            temp_mp3.unlink(missing_ok=True)
+    tracks = _plan_figure_tracks(figure_id, source_mp3_files, faba_library, append, device)
+    checksums = ChecksumRecorder(verify) if checksum or verify else None
+    writer = _output_writer(faba_library, mirrors, sync, IoPolicy.CACHED)
+    _obfuscate_tracks(
+        tracks, len(tracks), writer=writer, device=device, checksums=checksums, prefetch=prefetch
+    )
+    if isinstance(writer, FanOutWriter):
+        writer.raise_failures()
 
 
 def obfuscate_mp3_library(
-    faba_library_mp3: Path, faba_library: Path, default_figure_id: str = "0000"
+    faba_library_mp3: Path,
+    faba_library: Path,
+    default_figure_id: str = "0000",
+    resume: bool = False,
+    keep_going: bool = False,
+    quarantine: Path | None = None,
+    sync: SyncPolicy = SyncPolicy.FIGURE,
+    io_policy: IoPolicy = IoPolicy.CACHED,
+    device: str = DEFAULT_DEVICE,
+    checksum: bool = False,
+    verify: bool = False,
+    mirrors: Sequence[Path] = (),
+    prefetch: int = 0,
 ) -> int:
     """
     Obfuscate a directory tree of MP3 files into a Faba-compatible MKI library.
 
-    MP3 files are discovered recursively. If a file resides inside a directory
-    named ``K####``, the digits are interpreted as the figure identifier.
-    Otherwise, ``default_figure_id`` is used.
+    MP3 files are discovered recursively, and each one is converted as soon as
+    it is found. If a file resides inside a directory named ``K####``, the
+    digits are interpreted as the figure identifier. Otherwise,
+    ``default_figure_id`` is used.
 
     Parameters
     ----------
     faba_library_mp3:
-        Path containing source MP3 files. Subfolders named ``K####`` will be
-        interpreted as per-figure groupings.
+        Path containing source MP3 files, either a folder or a ZIP/TAR archive.
+        Subfolders named ``K####`` will be interpreted as per-figure groupings.
+        Archives are streamed member by member and never extracted to disk.
     faba_library:
         Destination Faba library root directory (typically an ``MKI01`` folder).
         Per-figure subfolders (e.g. ``K0104``) will be created as needed.
     default_figure_id:
         Figure identifier to use when no ``K####`` directory can be inferred.
+    resume:
+        When True, skip the files that an interrupted previous run recorded as
+        completed in the journal of ``faba_library``.
+    keep_going:
+        When True, files that fail are skipped and the rest of the library is
+        still converted. The failures are reported at the end.
+    quarantine:
+        Folder where a copy of every failed source is stored, grouped by
+        figure, when ``keep_going`` is enabled.
+    sync:
+        When written files are flushed to the storage device: after each
+        file, once each figure is written (default) or never. Files are only
+        recorded in the journal once flushed.
+    io_policy:
+        How sources and outputs use the page cache. ``IoPolicy.STREAM`` and
+        ``IoPolicy.DIRECT`` keep a large run from evicting everything else.
+    device:
+        Name of the device profile giving the file layout and the encoding.
+    checksum:
+        When True, the SHA-256 of every source and output computed during the
+        conversion is stored in the manifest of each figure folder.
+    verify:
+        When True, each figure is also read back from the device once written
+        and compared with its manifest. Implies ``checksum``.
+    mirrors:
+        Further Faba libraries that receive the same files as ``faba_library``.
+        Every file is converted once and written to all of them concurrently.
+        The journal is kept in ``faba_library`` only, so ``resume`` is not
+        supported together with mirrors.
+    prefetch:
+        Number of source files read ahead on background threads while the
+        current one is converted, to hide the latency of network shares or
+        slow drives. Each file read ahead is held in memory, so only files
+        small enough to be converted in memory are prefetched. 0 (default)
+        reads each file when its turn comes.
 
     Returns
     -------
     int
-        Total number of MP3 files processed.
+        Total number of MP3 files processed, including the skipped ones.
+
+    Raises
+    ------
+    TaggingError, ConversionError
+        When a file fails and ``keep_going`` is disabled.
+    VerificationError
+        If a file read back with ``verify`` does not match what was written.
+    TargetWriteError
+        If writing to some of the libraries failed. The others are complete.
+    BatchConversionError
+        When ``keep_going`` is enabled and at least one file failed. It holds
+        the number of converted files and the list of failures.
     """
-    # Monkeypatch to tolerate malformed ID3 headers
+    if resume and mirrors:
+        raise ValueError("Conversions to several libraries cannot be resumed")
+    tracks = plan_mp3_library(faba_library_mp3, faba_library, default_figure_id, device)
+
+    writer = _output_writer(faba_library, mirrors, sync, io_policy)
+    with ConversionJournal(faba_library, resume) as journal:
+        checksums = ChecksumRecorder(verify) if checksum or verify else None
+        processed, failures = _obfuscate_tracks(
+            tracks, None, journal, keep_going, quarantine, writer, device, checksums, prefetch
+        )
+        if failures:
+            raise BatchConversionError(processed - len(failures), failures)
+
+    if isinstance(writer, FanOutWriter):
+        writer.raise_failures()
+    return processed
 
-    all_mp3_files = sorted(p for p in faba_library_mp3.rglob("*") if p.suffix.lower() == ".mp3")
-    files_by_figure: defaultdict[str, list[Path]] = defaultdict(list)
 
-    for mp3_file in all_mp3_files:
-        match = re.search(r"K(\d{4})$", mp3_file.parent.name)
-        figure_id = match.group(1) if match else default_figure_id
+def plan_mp3_library(
+    faba_library_mp3: Path,
+    faba_library: Path,
+    default_figure_id: str = "0000",
+    device: str = DEFAULT_DEVICE,
+) -> Iterator[Track]:
+    """
+    Discover the MP3 files of a library and assign a title and MKI path to each.
+
+    Tracks are produced as files are found, the same way as
+    ``obfuscate_mp3_library`` converts them, and the folder of every figure
+    is created in ``faba_library`` when its first track is planned.
+    """
+    all_mp3_files: Iterable[Mp3Source] = (
+        list_archive_mp3_members(faba_library_mp3)
+        if is_archive(faba_library_mp3)
+        else (found.path for found in iter_mp3_files(faba_library_mp3))
+    )
+    return _plan_library_tracks(all_mp3_files, faba_library, default_figure_id, device)
+
+
+def obfuscate_track(
+    mp3_file: Mp3Source,
+    new_title: str,
+    mki_file: Path,
+    writer: OutputWriter | None = None,
+    device: str = DEFAULT_DEVICE,
+) -> OutputDigest:
+    """
+    Retitle and obfuscate a single planned track, within the memory budget.
+
+    Raises
+    ------
+    TaggingError, ConversionError
+        If the source is not a valid MP3 or cannot be converted.
+    """
+    writer = writer or OutputWriter()
+    with _open_source(mp3_file, writer.io_policy) as stream:
+        return _obfuscate_stream(mp3_file, stream, new_title, mki_file, writer, device, False)
+
+
+def tag_figure_tracks(
+    figure_id: str, mp3_data: Sequence[bytes], start_index: int = 1, device: str = DEFAULT_DEVICE
+) -> list[tuple[str, bytes]]:
+    """
+    Prepare in-memory MP3 files as the tracks of a figure, without touching the disk.
+
+    Every file gets the same single title tag as with
+    ``obfuscate_figure_mp3_files``, and is returned with the name of the MKI
+    file it becomes (e.g. ``CP01.MKI``), ready for ``iter_mp3_to_mki_chunks``.
+
+    Raises
+    ------
+    TaggingError
+        If one of the files is not a valid MP3.
+    """
+    tracks = []
+    for index, data in enumerate(mp3_data, start=start_index):
+        _, new_title, mki_file = _track(Path(), figure_id, index, Path(), device)
+        buffer = BytesIO(data)
+        clear_tags_and_set_title(buffer, new_title)
+        tracks.append((mki_file.name, buffer.getvalue()))
+    return tracks
+
+
+def figure_id_for_mp3_file(
+    mp3_file: Mp3Source, default_figure_id: str = "0000", device: str = DEFAULT_DEVICE
+) -> str:
+    """Return the figure ID of the figure folder (``K####``) holding ``mp3_file``, or the default"""
+    match = get_device(device).source_figure_pattern.search(mp3_file.parent.name)
+    return match.group(1) if match else default_figure_id
+
+
+def group_mp3_files_by_figure(
+    mp3_files: Sequence[Mp3Source], default_figure_id: str = "0000", device: str = DEFAULT_DEVICE
+) -> dict[str, list[Mp3Source]]:
+    """Group MP3 files by the figure ID inferred from their parent figure folder"""
+    files_by_figure: defaultdict[str, list[Mp3Source]] = defaultdict(list)
+    for mp3_file in mp3_files:
+        figure_id = figure_id_for_mp3_file(mp3_file, default_figure_id, device)
         files_by_figure[figure_id].append(mp3_file)
+    return dict(files_by_figure)
+
 
-    for figure_id, figure_mp3_files in files_by_figure.items():
-        obfuscate_figure_mp3_files(figure_id, figure_mp3_files, faba_library)
+def _plan_figure_tracks(
+    figure_id: str,
+    source_mp3_files: Sequence[Mp3Source],
+    faba_library: Path,
+    append: bool = False,
+    device: str = DEFAULT_DEVICE,
+) -> list[Track]:
+    """Create the figure folder and assign a title and MKI path to every source"""
+    logger.info("Converting files for figure: `%s`", figure_id)
+
+    figure_path = faba_library / get_device(device).figure_folder(figure_id)
+    if append and not figure_path.exists():
+        raise ValueError("You cannot append tracks to an unexisting figure")
+    figure_path.mkdir(parents=True, exist_ok=True)
 
-    return len(all_mp3_files)
+    existing_mki = list_figure_mki_files(figure_path, device)
+    start_index = (len(existing_mki) + 1) if append else 1
+
+    return [
+        _track(mp3_file, figure_id, index, figure_path, device)
+        for index, mp3_file in enumerate(sorted(source_mp3_files), start=start_index)
+    ]
+
+
+def _plan_library_tracks(
+    mp3_files: Iterable[Mp3Source],
+    faba_library: Path,
+    default_figure_id: str,
+    device: str = DEFAULT_DEVICE,
+) -> Iterator[Track]:
+    """Assign titles and MKI paths to sources, creating the folder of each figure first"""
+    figure_paths: set[Path] = set()
+    for track in assign_library_tracks(mp3_files, faba_library, default_figure_id, device):
+        figure_path = track[2].parent
+        if figure_path not in figure_paths:
+            figure_id = figure_path.name.removeprefix(get_device(device).figure_prefix)
+            logger.info("Converting files for figure: `%s`", figure_id)
+            figure_path.mkdir(parents=True, exist_ok=True)
+            figure_paths.add(figure_path)
+        yield track
+
+
+def assign_library_tracks(
+    mp3_files: Iterable[Mp3Source],
+    faba_library: Path,
+    default_figure_id: str = "0000",
+    device: str = DEFAULT_DEVICE,
+) -> Iterator[Track]:
+    """
+    Assign titles and MKI paths to sources arriving in sorted path order.
 
+    Tracks are numbered per figure as they come, which gives the same numbers
+    as sorting each figure's files first, without waiting for the full list.
+    Nothing is created on disk.
+    """
+    track_counts: dict[str, int] = {}
+    for mp3_file in mp3_files:
+        figure_id = figure_id_for_mp3_file(mp3_file, default_figure_id, device)
+        figure_path = faba_library / get_device(device).figure_folder(figure_id)
+        track_counts[figure_id] = track_counts.get(figure_id, 0) + 1
+        yield _track(mp3_file, figure_id, track_counts[figure_id], figure_path, device)
+
+
+def _track(
+    mp3_file: Mp3Source, figure_id: str, index: int, figure_path: Path, device: str
+) -> Track:
+    profile = get_device(device)
+    return (
+        mp3_file,
+        profile.track_title(figure_id, index),
+        figure_path / profile.track_file(index),
+    )
+
+
+def _output_writer(
+    faba_library: Path, mirrors: Sequence[Path], sync: SyncPolicy, io_policy: IoPolicy
+) -> OutputWriter:
+    if not mirrors:
+        return OutputWriter(sync, io_policy=io_policy)
+    return FanOutWriter([faba_library, *mirrors], sync, io_policy=io_policy)
+
+
+def _obfuscate_tracks(
+    tracks: Iterable[Track],
+    total: int | None = None,
+    journal: ConversionJournal | None = None,
+    keep_going: bool = False,
+    quarantine: Path | None = None,
+    writer: OutputWriter | None = None,
+    device: str = DEFAULT_DEVICE,
+    checksums: ChecksumRecorder | None = None,
+    prefetch: int = 0,
+) -> tuple[int, list[ConversionFailure]]:
+    """
+    Convert planned tracks, returning how many were processed and which ones failed.
 
-def deobfuscate_figure_mki_files(figure_id: str, faba_library: Path, output_folder: Path) -> int:
+    Output files are flushed by ``writer`` each time a figure is complete, and
+    then added to the manifest of their figure by ``checksums``, if given.
+    With ``prefetch``, that many sources are read ahead while converting.
+    """
+    writer = writer or OutputWriter()
+    planned: dict[Mp3Source, tuple[str, Path]] = {}
+    processed = 0
+
+    def record_checksums(mp3_file: Mp3Source, target: Path, digest: OutputDigest) -> None:
+        assert checksums is not None
+        for output in writer.outputs(target):
+            checksums.record(mp3_file, output, digest)
+
+    def pending_sources() -> Iterator[Mp3Source]:
+        nonlocal processed
+        for mp3_file, new_title, obfuscated_file in tracks:
+            processed += 1
+            if journal is not None and journal.is_complete(mp3_file, obfuscated_file):
+                logger.info("Skipping file %s, converted by a previous run", mp3_file.name)
+                continue
+            planned[mp3_file] = (new_title, obfuscated_file)
+            yield mp3_file
+
+    failures: list[ConversionFailure] = []
+    sources = (
+        prefetch_mp3_source_streams(
+            pending_sources(), prefetch, memory_budget().in_memory_limit(), writer.io_policy
+        )
+        if prefetch
+        else iter_mp3_source_streams(pending_sources(), writer.io_policy)
+    )
+    figure_path: Path | None = None
+    with writer, closing(sources):
+        for index, (mp3_file, stream) in enumerate(sources, start=1):
+            progress = f"{index}/{total}" if total is not None else f"{index}"
+            logger.info("Converting file %s [%s]", mp3_file.name, progress)
+
+            new_title, obfuscated_file = planned.pop(mp3_file)
+            if obfuscated_file.parent != figure_path:
+                writer.sync()
+                if checksums is not None:
+                    checksums.flush()
+                figure_path = obfuscated_file.parent
+
+            try:
+                if isinstance(stream, UnreadableSource):
+                    raise stream.error
+                digest = _obfuscate_stream(
+                    mp3_file,
+                    stream,
+                    new_title,
+                    obfuscated_file,
+                    writer,
+                    device,
+                    checksums is not None,
+                )
+            except OpenFabaError as exc:
+                if not keep_going:
+                    raise
+                logger.error("Skipping %s: %s", mp3_file, exc)
+                failures.append(ConversionFailure(str(mp3_file), str(exc)))
+                if quarantine is not None and not isinstance(exc, SourceReadError):
+                    with _open_source(mp3_file) as failed:
+                        _quarantine(
+                            failed, quarantine / obfuscated_file.parent.name / mp3_file.name
+                        )
+                continue
+
+            if journal is not None:
+                writer.when_durable(partial(journal.record, mp3_file, obfuscated_file, digest))
+            if checksums is not None:
+                writer.when_durable(partial(record_checksums, mp3_file, obfuscated_file, digest))
+
+    if checksums is not None:
+        checksums.flush()
+    return processed, failures
+
+
+def _obfuscate_stream(
+    mp3_file: Mp3Source,
+    stream: IO[bytes],
+    new_title: str,
+    obfuscated_file: Path,
+    writer: OutputWriter,
+    device: str,
+    hash_source: bool,
+) -> OutputDigest:
+    # Tags are rewritten on an in-memory copy, or while streaming for large files,
+    # the source is never modified
+    budget = memory_budget()
+    size = source_size(mp3_file)
+    streamed = size > budget.in_memory_limit() and _is_seekable(stream)
+    with budget.reserve(streaming_buffer_size(size) if streamed else IN_MEMORY_COPIES * size):
+        if streamed:
+            return stream_mp3_to_mki(
+                stream, obfuscated_file, new_title, writer, device, hash_source
+            )
+        buffer = BytesIO(stream.read())
+        clear_tags_and_set_title(buffer, new_title)
+        return convert_mp3_to_mki(buffer, obfuscated_file, writer, device, hash_source)
+
+
+@contextmanager
+def _open_source(mp3_file: Mp3Source, io_policy: IoPolicy = IoPolicy.CACHED) -> Iterator[IO[bytes]]:
+    with closing(iter_mp3_source_streams([mp3_file], io_policy)) as sources:
+        _, stream = next(sources)
+        if isinstance(stream, UnreadableSource):
+            raise stream.error
+        yield stream
+
+
+def _quarantine(source: IO[bytes], target: Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    source.seek(0)
+    with target.open("wb") as quarantined:
+        shutil.copyfileobj(source, quarantined)
+    logger.info("Quarantined failed file as %s", target)
+
+
+def _is_seekable(stream: IO[bytes]) -> bool:
+    try:
+        return stream.seekable()
+    except AttributeError:
+        # Members of TAR archives read in streaming mode can't tell
+        return False
+
+
+def deobfuscate_figure_mki_files(
+    figure_id: str, faba_library: Path, output_folder: Path, device: str = DEFAULT_DEVICE
+) -> int:
     """
     Deobfuscate all MKI files for a single Faba figure into MP3 files.
 
@@ -134,40 +558,175 @@ def deobfuscate_figure_mki_files(figure_id: str, faba_library: Path, output_fold
         Root path of the source Faba library (typically an ``MKI01`` folder).
     output_folder:
         Root path where deobfuscated MP3 files will be written.
+    device:
+        Name of the device profile giving the file layout and the encoding.
 
     Returns
     -------
     int
         Number of MKI files converted for this figure.
     """
-    figure_path = faba_library / f"K{figure_id}"
-    if not figure_path.exists():
+    figure_folder = get_device(device).figure_folder(figure_id)
+    if not (faba_library / figure_folder).exists():
         logger.warning("Figure directory not found for figure `%s`", figure_id)
         return 0
+    return _deobfuscate_figure(figure_id, faba_library, output_folder, device)
+
+
+def deobfuscate_figures(
+    figure_ids: Sequence[str],
+    faba_library: Path,
+    output_folder: Path,
+    workers: int = 4,
+    device: str = DEFAULT_DEVICE,
+) -> dict[str, int]:
+    """
+    Deobfuscate several Faba figures into MP3 files, on a pool of threads.
+
+    The root of the library is scanned once for all figures, and the figures
+    are then converted concurrently, each one exactly as with
+    ``deobfuscate_figure_mki_files``. A figure that fails does not stop the
+    others.
+
+    Parameters
+    ----------
+    figure_ids:
+        Four-digit Faba figure identifiers (e.g. ``"0104"``).
+    faba_library:
+        Root path of the source Faba library (typically an ``MKI01`` folder).
+    output_folder:
+        Root path where deobfuscated MP3 files will be written.
+    workers:
+        Number of figures converted at the same time.
+    device:
+        Name of the device profile giving the file layout and the encoding.
 
-    mki_files = sorted(p for p in figure_path.iterdir() if p.suffix.lower() == ".mki")
+    Returns
+    -------
+    dict[str, int]
+        Number of MKI files converted for every figure, in the given order.
+        Figures that do not exist or hold no MKI files count 0.
+
+    Raises
+    ------
+    BatchConversionError
+        When at least one figure failed. It holds the number of converted
+        files and the list of failed figures.
+    """
+    profile = get_device(device)
+    existing = list_figure_folders(faba_library, device)
+    converted = dict.fromkeys(figure_ids, 0)
+    failures: list[ConversionFailure] = []
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="extract") as pool:
+        conversions = {}
+        for figure_id in converted:
+            if profile.figure_folder(figure_id) not in existing:
+                logger.warning("Figure directory not found for figure `%s`", figure_id)
+                continue
+            conversions[figure_id] = pool.submit(
+                _deobfuscate_figure, figure_id, faba_library, output_folder, device
+            )
+        for figure_id, conversion in conversions.items():
+            try:
+                converted[figure_id] = conversion.result()
+            except OpenFabaError as exc:
+                logger.error("Figure %s failed: %s", figure_id, exc)
+                failures.append(ConversionFailure(profile.figure_folder(figure_id), str(exc)))
+
+    if failures:
+        raise BatchConversionError(sum(converted.values()), failures)
+    return converted
+
+
+def _deobfuscate_figure(
+    figure_id: str, faba_library: Path, output_folder: Path, device: str
+) -> int:
+    figure_folder = get_device(device).figure_folder(figure_id)
+    mki_files = [
+        found.path for found in list_figure_mki_files(faba_library / figure_folder, device)
+    ]
 
     if not mki_files:
         logger.warning("No MKI files found for figure `%s`", figure_id)
         return 0
 
-    target_figure_path = output_folder / f"K{figure_id}"
+    target_figure_path = output_folder / figure_folder
     target_figure_path.mkdir(parents=True, exist_ok=True)
 
     for index, mki_file in enumerate(mki_files, start=1):
         target_file = (target_figure_path / mki_file.name).with_suffix(".mp3")
         logger.info("Converting file %s [%d/%d]", mki_file.name, index, len(mki_files))
-        convert_mki_to_mp3(mki_file, target_file)
+        with memory_budget().reserve(streaming_buffer_size(mki_file.stat().st_size)):
+            convert_mki_to_mp3(mki_file, target_file, None, device)
 
     return len(mki_files)
 
 
-def deobfuscate_mki_library(faba_library: Path, faba_library_mp3: Path) -> int:
+def stream_figure_mki_files(
+    figure_id: str, faba_library: Path, track: int | None = None, device: str = DEFAULT_DEVICE
+) -> Generator[bytes]:
+    """
+    Deobfuscate the MKI files of a single Faba figure as a stream of MP3 bytes.
+
+    Nothing is written to disk: every chunk is yielded as soon as it is
+    decoded, so playback can start right away. Without ``track`` all the
+    tracks of the figure are streamed back to back.
+
+    Parameters
+    ----------
+    figure_id:
+        Four-digit Faba figure identifier (e.g. ``"0104"``).
+    faba_library:
+        Root path of the source Faba library (typically an ``MKI01`` folder).
+    track:
+        Number of the single track to stream (``3`` for ``CP03.MKI``).
+    device:
+        Name of the device profile giving the file layout and the encoding.
+
+    Returns
+    -------
+    Generator[bytes]
+        Chunks of MP3 data in playback order.
+
+    Raises
+    ------
+    TrackNotFoundError
+        If the figure has no MKI files or the requested track does not exist.
+        It is raised before any data is produced.
+    """
+    profile = get_device(device)
+    figure_folder = profile.figure_folder(figure_id)
+    mki_files = [
+        found.path for found in list_figure_mki_files(faba_library / figure_folder, device)
+    ]
+    if track is not None:
+        mki_files = [p for p in mki_files if p.name.upper() == profile.track_file(track).upper()]
+
+    if not mki_files:
+        track_name = f" track {track}" if track is not None else ""
+        raise TrackNotFoundError(f"No MKI files found for figure {figure_folder}{track_name}.")
+
+    return (
+        chunk for mki_file in mki_files for chunk in iter_mki_to_mp3_chunks(mki_file, device=device)
+    )
+
+
+def deobfuscate_mki_library(
+    faba_library: Path,
+    faba_library_mp3: Path,
+    resume: bool = False,
+    keep_going: bool = False,
+    quarantine: Path | None = None,
+    io_policy: IoPolicy = IoPolicy.CACHED,
+    device: str = DEFAULT_DEVICE,
+) -> int:
     """
     Deobfuscate a Faba MKI library back into standard MP3 files.
 
-    MKI files are discovered recursively inside the Faba library. The original
-    folder structure is preserved in the output directory, with file extensions
+    MKI files are discovered inside the ``K####`` figure folders of the Faba
+    library and converted as soon as they are found. The original folder
+    structure is preserved in the output directory, with file extensions
     converted to ``.mp3``.
 
     Parameters
@@ -177,20 +736,63 @@ def deobfuscate_mki_library(faba_library: Path, faba_library_mp3: Path) -> int:
         containing per-figure subdirectories with ``.MKI`` files.
     faba_library_mp3:
         Destination directory where deobfuscated MP3 files will be written.
+    resume:
+        When True, skip the files that an interrupted previous run recorded as
+        completed in the journal of ``faba_library_mp3``.
+    keep_going:
+        When True, files that fail are skipped and the rest of the library is
+        still converted. The failures are reported at the end.
+    quarantine:
+        Folder where a copy of every failed MKI file is stored, keeping its
+        path inside the library, when ``keep_going`` is enabled.
+    io_policy:
+        How MKI files and outputs use the page cache. ``IoPolicy.STREAM`` and
+        ``IoPolicy.DIRECT`` keep a large run from evicting everything else.
+    device:
+        Name of the device profile giving the file layout and the encoding.
 
     Returns
     -------
     int
-        Total number of MKI files converted.
+        Total number of MKI files converted, including the skipped ones.
+
+    Raises
+    ------
+    ConversionError
+        When a file fails and ``keep_going`` is disabled.
+    BatchConversionError
+        When ``keep_going`` is enabled and at least one file failed. It holds
+        the number of converted files and the list of failures.
     """
-    mki_files = sorted(p for p in faba_library.rglob("*") if p.suffix.lower() == ".mki")
-
-    for index, mki_file in enumerate(mki_files, start=1):
-        relative_path = mki_file.relative_to(faba_library)
-        target_file = (faba_library_mp3 / relative_path).with_suffix(".mp3")
-        target_file.parent.mkdir(parents=True, exist_ok=True)
-
-        logger.info("Converting file %s [%d/%d]", mki_file.name, index, len(mki_files))
-        convert_mki_to_mp3(mki_file, target_file)
-
-    return len(mki_files)
+    processed = 0
+    failures: list[ConversionFailure] = []
+    writer = OutputWriter(io_policy=io_policy)
+    with ConversionJournal(faba_library_mp3, resume) as journal:
+        for processed, found in enumerate(iter_mki_files(faba_library, device), start=1):
+            mki_file = found.path
+            relative_path = mki_file.relative_to(faba_library)
+            target_file = (faba_library_mp3 / relative_path).with_suffix(".mp3")
+            if journal.is_complete(mki_file, target_file):
+                logger.info("Skipping file %s, converted by a previous run", mki_file.name)
+                continue
+            target_file.parent.mkdir(parents=True, exist_ok=True)
+
+            logger.info("Converting file %s [%d]", mki_file.name, processed)
+            try:
+                with memory_budget().reserve(streaming_buffer_size(found.stat.st_size)):
+                    digest = convert_mki_to_mp3(mki_file, target_file, writer, device)
+            except OpenFabaError as exc:
+                if not keep_going:
+                    raise
+                logger.error("Skipping %s: %s", mki_file, exc)
+                failures.append(ConversionFailure(str(mki_file), str(exc)))
+                if quarantine is not None:
+                    with mki_file.open("rb") as failed:
+                        _quarantine(failed, quarantine / relative_path)
+                continue
+            journal.record(mki_file, target_file, digest)
+
+        if failures:
+            raise BatchConversionError(processed - len(failures), failures)
+
+    return processed
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from openfaba.parallel import parallel_buffer_size, parallel_workers
+
+logger = logging.getLogger(__name__)
+
+# MP3 files up to this size are retitled and encoded in memory, larger ones are streamed
+IN_MEMORY_LIMIT = 64 * 1024 * 1024
+# A file converted in memory is held about this many times: as read, retitled and encoded
+IN_MEMORY_COPIES = 3
+# A streamed file holds about a read chunk and a block waiting to be written
+STREAM_BUFFER_SIZE = 2 * 1024 * 1024
+
+
+class MemoryBudget:
+    """
+    Admits conversion jobs while the bytes they buffer stay within ``limit``.
+
+    Every job reserves what it will hold in memory before it starts, based on
+    the size of its file when it is loaded whole or on its buffers when it is
+    streamed, and waits until enough of the budget is free. A job larger than
+    the whole budget is admitted alone, once nothing else is in flight, so it
+    is never refused. Without a limit every job is admitted right away.
+
+    Buffers read ahead of the jobs only take what is free, without waiting,
+    and never keep a job waiting: a job that doesn't fit is admitted once only
+    read-ahead buffers are left in flight.
+    """
+
+    def __init__(self, limit: int | None = None) -> None:
+        self.limit = limit
+        self.in_flight = 0
+        self.read_ahead = 0
+        self._released = threading.Condition()
+
+    def in_memory_limit(self) -> int:
+        """Largest file loaded whole: a fraction of the budget, so several fit at once"""
+        if self.limit is None:
+            return IN_MEMORY_LIMIT
+        return min(IN_MEMORY_LIMIT, self.limit // (4 * IN_MEMORY_COPIES))
+
+    def set_limit(self, limit: int | None) -> None:
+        with self._released:
+            self.limit = limit
+            self._released.notify_all()
+
+    @contextmanager
+    def reserve(self, size: int, timeout: float | None = None) -> Iterator[None]:
+        """
+        Wait until ``size`` bytes fit in the budget and hold them for the block.
+
+        Raises TimeoutError if they don't fit within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._released:
+            while self.in_flight > self.read_ahead and not self._fits(size):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"{size} bytes of memory not free within {timeout} s")
+                logger.debug("Waiting for %d bytes of memory, %d in flight", size, self.in_flight)
+                self._released.wait(remaining)
+            self.in_flight += size
+        try:
+            yield
+        finally:
+            with self._released:
+                self.in_flight -= size
+                self._released.notify_all()
+
+    def try_reserve(self, size: int) -> bool:
+        """Hold ``size`` bytes for a read-ahead buffer if they fit right now, until ``release``"""
+        with self._released:
+            if not self._fits(size):
+                return False
+            self.in_flight += size
+            self.read_ahead += size
+            return True
+
+    def release(self, size: int) -> None:
+        """Give back the bytes of a read-ahead buffer held by ``try_reserve``"""
+        with self._released:
+            self.in_flight -= size
+            self.read_ahead -= size
+            self._released.notify_all()
+
+    def _fits(self, size: int) -> bool:
+        return self.limit is None or self.in_flight + size <= self.limit
+
+
+_budget = MemoryBudget()
+
+
+def streaming_buffer_size(size: int) -> int:
+    """Bytes held while a file of ``size`` bytes is converted without loading it whole"""
+    return parallel_buffer_size(size) if parallel_workers(size) else STREAM_BUFFER_SIZE
+
+
+def memory_budget() -> MemoryBudget:
+    """Return the budget shared by every conversion of the process"""
+    return _budget
+
+
+def set_max_memory(limit: int | None) -> None:
+    """Limit the memory buffered by all conversions together, or lift the limit with None"""
+    _budget.set_limit(limit)
@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections.abc import Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import cache
+from multiprocessing.shared_memory import SharedMemory
+from typing import IO, Iterator, Protocol
+
+from openfaba.codec import DEFAULT_DEVICE, CodecEngine, get_codec, get_engine, translate
+from openfaba.exceptions import ConversionError
+
+logger = logging.getLogger(__name__)
+
+# Files at least this large are split across processes, smaller ones aren't worth the startup
+PARALLEL_THRESHOLD = 256 * 1024 * 1024
+# Bytes translated by one process at a time
+SEGMENT_SIZE = 8 * 1024 * 1024
+# Translated bytes are handed to the output in pieces of this size
+_WRITE_SIZE = 1024 * 1024
+
+
+class _Output(Protocol):
+    def write(self, data: bytes, /) -> int: ...
+
+
+def parallel_workers(size: int) -> int:
+    """Number of processes that should share the translation of a file, 0 to keep it serial"""
+    engine = get_engine()
+    if engine is CodecEngine.PARALLEL:
+        return _worker_count() if size else 0
+    workers = _worker_count()
+    if engine is not CodecEngine.AUTO or workers < 2:
+        return 0
+    return workers if size >= PARALLEL_THRESHOLD else 0
+
+
+def parallel_buffer_size(size: int, period: int = 4) -> int:
+    """Bytes of shared memory held while a file of ``size`` bytes is translated in parallel"""
+    return 2 * _window_size(size, _segment_size(period))
+
+
+def translate_in_parallel(
+    infile: IO[bytes],
+    outfile: _Output,
+    size: int,
+    decode: bool = False,
+    device: str = DEFAULT_DEVICE,
+    source_hash: "hashlib._Hash | None" = None,
+    offset: int = 0,
+) -> None:
+    """
+    Encode or decode ``size`` bytes of ``infile`` into ``outfile`` on several processes.
+
+    The transform of a byte only depends on its position modulo the period of
+    the device, so a file can be cut into segments translated independently.
+    The file is read into one of two shared memory windows, each split into
+    period-aligned ``SEGMENT_SIZE`` segments that worker processes translate
+    in place. Only the name of the window and the segment bounds are sent to
+    the workers, never the data. While the workers translate one window, the
+    previous one is written out and the next one read.
+
+    With ``source_hash`` the bytes read are also hashed before translation.
+    The data read is found at byte ``offset`` of the file being translated.
+    """
+    codec = get_codec(device)
+    tables = codec.decode_tables if decode else codec.encode_tables
+    pool = _process_pool()
+    segment_size = _segment_size(len(tables))
+    window_size = _window_size(size, segment_size)
+
+    with ExitStack() as stack:
+        windows = [stack.enter_context(_shared_memory(window_size)) for _ in range(2)]
+        pending: tuple[SharedMemory, list[Future[None]], int] | None = None
+        position = 0
+        while position < size or pending:
+            current = None
+            if position < size:
+                window = windows[position // window_size % 2]
+                with _buffer(window)[: min(window_size, size - position)] as view:
+                    length = _read_into(infile, view)
+                if source_hash is not None:
+                    source_hash.update(_buffer(window)[:length])
+                segments = [
+                    pool.submit(
+                        _translate_segment,
+                        window.name,
+                        start,
+                        min(start + segment_size, length),
+                        offset + position + start,
+                        tables,
+                    )
+                    for start in range(0, length, segment_size)
+                ]
+                current = (window, segments, length)
+                position += length
+            if pending:
+                _write_window(outfile, *pending)
+            pending = current
+
+
+def _write_window(
+    outfile: _Output, window: SharedMemory, segments: list[Future[None]], length: int
+) -> None:
+    for segment in segments:
+        segment.result()
+    for start in range(0, length, _WRITE_SIZE):
+        outfile.write(bytes(_buffer(window)[start : min(start + _WRITE_SIZE, length)]))
+
+
+def _read_into(infile: IO[bytes], buffer: memoryview) -> int:
+    length = 0
+    while length < len(buffer):
+        if not (data := infile.read(min(len(buffer) - length, _WRITE_SIZE))):
+            raise ConversionError(f"Expected {len(buffer)} bytes, the file ended after {length}")
+        buffer[length : length + len(data)] = data
+        length += len(data)
+    return length
+
+
+def _translate_segment(
+    name: str, start: int, end: int, offset: int, tables: Sequence[bytes]
+) -> None:
+    # Runs in a worker process: translate the segment in place in the shared window
+    shared = SharedMemory(name, track=False)
+    try:
+        with _buffer(shared)[start:end] as segment:
+            segment[:] = translate(bytes(segment), offset, tables)
+    finally:
+        shared.close()
+
+
+def _buffer(shared: SharedMemory) -> memoryview:
+    if shared.buf is None:
+        raise ValueError(f"Shared memory {shared.name} is closed")
+    return shared.buf
+
+
+@contextmanager
+def _shared_memory(size: int) -> Iterator[SharedMemory]:
+    shared = SharedMemory(create=True, size=size)
+    try:
+        yield shared
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def _segment_size(period: int) -> int:
+    return max(SEGMENT_SIZE - SEGMENT_SIZE % period, period)
+
+
+def _window_size(size: int, segment_size: int) -> int:
+    return min(size, _worker_count() * segment_size) or segment_size
+
+
+def _worker_count() -> int:
+    return os.process_cpu_count() or 1
+
+
+@cache
+def _process_pool() -> ProcessPoolExecutor:
+    # Forked children would inherit the locks of the conversion threads, start clean ones
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    workers = _worker_count()
+    logger.debug("Starting %d codec processes", workers)
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
@@ -0,0 +1,267 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from openfaba.archive import ArchiveMember, Mp3Source, is_archive, list_archive_mp3_members
+from openfaba.codec import DEFAULT_DEVICE, get_codec, get_device
+from openfaba.discovery import iter_mp3_files, list_figure_mki_files
+from openfaba.exceptions import TaggingError
+from openfaba.media import assign_library_tracks
+from openfaba.tags import retitle_layout, title_tag
+
+logger = logging.getLogger(__name__)
+
+# Largest file FAT32 can store
+FAT32_MAX_FILE_SIZE = 2**32 - 1
+# Cluster size assumed where the filesystem doesn't tell, the default of FAT32 SD cards
+DEFAULT_CLUSTER_SIZE = 32 * 1024
+# Bytes encoded and written to the target to measure the speed of this machine
+CALIBRATION_SIZE = 16 * 1024 * 1024
+_CALIBRATION_CHUNK = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Throughput:
+    """Speeds measured on this machine, in bytes per second"""
+
+    codec: float
+    write: float
+
+    def seconds(self, size: int) -> float:
+        """Time to encode and write ``size`` bytes, one after the other"""
+        return size / self.codec + size / self.write
+
+
+@dataclass(frozen=True)
+class PlannedTrack:
+    """A source MP3 file, the MKI file it becomes and their sizes"""
+
+    source: Mp3Source
+    target: Path
+    source_size: int
+    output_size: int
+
+
+@dataclass
+class LibraryPlan:
+    """
+    What converting an MP3 library into a Faba library would write, before it starts.
+
+    ``allocated`` and ``released`` are the bytes the new tracks take and those
+    of the tracks they overwrite, ``peak`` the most taken at once along the way.
+    """
+
+    tracks: list[PlannedTrack] = field(default_factory=list)
+    free_space: int = 0
+    allocated: int = 0
+    released: int = 0
+    peak: int = 0
+    issues: list[str] = field(default_factory=list)
+    throughput: Throughput | None = None
+
+    @property
+    def source_size(self) -> int:
+        return sum(track.source_size for track in self.tracks)
+
+    @property
+    def output_size(self) -> int:
+        return sum(track.output_size for track in self.tracks)
+
+    @property
+    def figures(self) -> list[str]:
+        return sorted({track.target.parent.name for track in self.tracks})
+
+    @property
+    def free_space_after(self) -> int:
+        return self.free_space + self.released - self.allocated
+
+    @property
+    def lowest_free_space(self) -> int:
+        return self.free_space - self.peak
+
+    @property
+    def fits(self) -> bool:
+        return self.lowest_free_space >= 0
+
+    @property
+    def estimated_seconds(self) -> float | None:
+        return self.throughput.seconds(self.output_size) if self.throughput else None
+
+    def __bool__(self) -> bool:
+        return self.fits and not self.issues
+
+
+def plan_obfuscation(
+    faba_library_mp3: Path,
+    faba_library: Path,
+    default_figure_id: str = "0000",
+    device: str = DEFAULT_DEVICE,
+    calibrate: bool = True,
+) -> LibraryPlan:
+    """
+    Predict what ``obfuscate_mp3_library`` would write, without converting anything.
+
+    Sources are discovered with the sizes read while scanning, and numbered
+    like the conversion does. The output size of every track is its audio,
+    found by reading only the tags of the source, behind the new title tag,
+    or the whole source when it already has the right title only. Sources in
+    an archive are assumed to have no tags to drop.
+
+    The space needed is counted in whole clusters of the target filesystem,
+    new figure folders included. The tracks that would be overwritten give
+    their clusters back only once their figure is done: until then the new
+    tracks of the figure are written next to them. Figures with more tracks
+    than the device plays, files over the FAT32 size limit and sources without
+    audio are reported as issues.
+
+    Parameters
+    ----------
+    faba_library_mp3:
+        Folder or ZIP/TAR archive of MP3 files, as for ``obfuscate_mp3_library``.
+    faba_library:
+        Existing target Faba library, usually the root of the SD card.
+    default_figure_id:
+        Figure ID of the files outside ``K####`` folders.
+    device:
+        Name of the device profile giving the layout and limits of the library.
+    calibrate:
+        Measure the codec and the write speed of the target to estimate the runtime.
+    """
+    profile = get_device(device)
+    cluster_size = _cluster_size(faba_library)
+    plan = LibraryPlan(free_space=shutil.disk_usage(faba_library).free)
+
+    sources = _discover_sources(faba_library_mp3)
+    tracks = assign_library_tracks(sources, faba_library, default_figure_id, device)
+    existing: dict[Path, dict[Path, int]] = {}
+    # Clusters each figure takes and gives back, the figures in the order they are written
+    allocated: defaultdict[Path, int] = defaultdict(int)
+    released: defaultdict[Path, int] = defaultdict(int)
+    for source, title, target in tracks:
+        if target.parent not in existing:
+            existing[target.parent] = _existing_tracks(target.parent, device)
+            if not target.parent.is_dir():
+                allocated[target.parent] += cluster_size
+        try:
+            output_size = _output_size(source, title)
+        except TaggingError as exc:
+            plan.issues.append(f"{source}: {exc}")
+            continue
+        track = PlannedTrack(source, target, sources[source], output_size)
+        plan.tracks.append(track)
+        allocated[target.parent] += _allocated(track.output_size, cluster_size)
+        if (replaced := existing[target.parent].get(target)) is not None:
+            released[target.parent] += _allocated(replaced, cluster_size)
+        if track.output_size > FAT32_MAX_FILE_SIZE:
+            plan.issues.append(
+                f"{target.parent.name}/{target.name}: {track.output_size} bytes, "
+                f"over the FAT32 limit of {FAT32_MAX_FILE_SIZE}"
+            )
+
+    for figure_path, figure_allocated in allocated.items():
+        plan.peak = max(plan.peak, plan.allocated - plan.released + figure_allocated)
+        plan.allocated += figure_allocated
+        plan.released += released[figure_path]
+
+    track_counts = Counter(track.target.parent.name for track in plan.tracks)
+    for figure, count in sorted(track_counts.items()):
+        if count > profile.max_tracks:
+            plan.issues.append(
+                f"{figure}: {count} tracks, the device plays at most {profile.max_tracks}"
+            )
+
+    if calibrate and plan.tracks:
+        plan.throughput = calibrate_throughput(faba_library, device=device)
+    return plan
+
+
+def calibrate_throughput(
+    directory: Path, size: int = CALIBRATION_SIZE, device: str = DEFAULT_DEVICE
+) -> Throughput:
+    """Time encoding ``size`` bytes, then writing and flushing them to a file in ``directory``"""
+    data = os.urandom(size)
+    start = time.perf_counter()
+    encoded = get_codec(device).encode(data)
+    codec_time = time.perf_counter() - start
+
+    with tempfile.TemporaryFile(dir=directory, prefix=".openfaba-calibration-") as probe:
+        start = time.perf_counter()
+        for offset in range(0, size, _CALIBRATION_CHUNK):
+            probe.write(encoded[offset : offset + _CALIBRATION_CHUNK])
+        probe.flush()
+        os.fsync(probe.fileno())
+        write_time = time.perf_counter() - start
+
+    # A clock too coarse for a fast machine must not divide by zero
+    throughput = Throughput(size / max(codec_time, 1e-6), size / max(write_time, 1e-6))
+    logger.info("Codec: %.0f bytes/s, writes: %.0f bytes/s", throughput.codec, throughput.write)
+    return throughput
+
+
+def format_library_plan(plan: LibraryPlan) -> str:
+    """Render a plan as a summary of sizes, space and time, followed by its issues"""
+    lines = [
+        f"Figures: {len(plan.figures)}, tracks: {len(plan.tracks)}",
+        f"Sources: {_megabytes(plan.source_size)}",
+        f"Output: {_megabytes(plan.output_size)} ({_megabytes(plan.allocated)} on disk)",
+        f"Free space: {_megabytes(plan.free_space)} now, "
+        f"{_megabytes(plan.lowest_free_space)} at the lowest, "
+        f"{_megabytes(plan.free_space_after)} after",
+    ]
+    if plan.throughput is not None:
+        lines.append(
+            f"Estimated time: {_duration(plan.throughput.seconds(plan.output_size))} "
+            f"(codec {_megabytes(plan.throughput.codec)}/s, "
+            f"writes {_megabytes(plan.throughput.write)}/s)"
+        )
+    if not plan.fits:
+        lines.append(f"Not enough space: {_megabytes(-plan.lowest_free_space)} missing")
+    lines += plan.issues
+    return "\n".join(lines)
+
+
+def _discover_sources(faba_library_mp3: Path) -> dict[Mp3Source, int]:
+    # Sorted sources with their sizes, from the scan itself: no file is stat'ed again
+    if is_archive(faba_library_mp3):
+        return {member: member.size for member in list_archive_mp3_members(faba_library_mp3)}
+    return {found.path: found.size for found in iter_mp3_files(faba_library_mp3)}
+
+
+def _existing_tracks(figure_path: Path, device: str) -> dict[Path, int]:
+    return {found.path: found.size for found in list_figure_mki_files(figure_path, device)}
+
+
+def _output_size(source: Mp3Source, title: str) -> int:
+    if isinstance(source, ArchiveMember):
+        return len(title_tag(title)) + source.size
+    with source.open("rb") as stream:
+        new_tag, start, end = retitle_layout(stream, title)
+    return len(new_tag) + end - start
+
+
+def _cluster_size(directory: Path) -> int:
+    if not hasattr(os, "statvfs"):
+        return DEFAULT_CLUSTER_SIZE
+    stat = os.statvfs(directory)
+    return stat.f_frsize or stat.f_bsize or DEFAULT_CLUSTER_SIZE
+
+
+def _allocated(size: int, cluster_size: int) -> int:
+    return -(-size // cluster_size) * cluster_size
+
+
+def _megabytes(size: float) -> str:
+    return f"{size / 1_000_000:.1f} MB"
+
+
+def _duration(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
@@ -0,0 +1,158 @@
+import logging
+import random
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from io import BytesIO
+
+from openfaba.codec import (
+    DEFAULT_DEVICE,
+    CodecEngine,
+    DeviceProfile,
+    get_codec,
+    get_device,
+    reference_translate,
+    translate,
+)
+from openfaba.parallel import SEGMENT_SIZE, translate_in_parallel
+
+logger = logging.getLogger(__name__)
+
+# Longest random buffer of the fuzzing rounds, kept small as the reference is slow
+FUZZ_MAX_SIZE = 16 * 1024
+# Bytes compared with the reference on each side of a segment boundary of the parallel engine
+_BOUNDARY_WINDOW = 64
+
+# An engine under test: translates bytes found at an offset, decoding when asked
+Translate = Callable[[bytes, int, bool], bytes]
+
+
+@dataclass(frozen=True)
+class EngineReport:
+    """Outcome of the self-test of one codec engine"""
+
+    engine: CodecEngine
+    checks: int
+    mismatches: tuple[str, ...] = ()
+
+    @property
+    def passed(self) -> bool:
+        return not self.mismatches
+
+
+def run_selftest(
+    seed: int,
+    rounds: int = 100,
+    device: str = DEFAULT_DEVICE,
+    engines: tuple[CodecEngine, ...] = (CodecEngine.TABLE, CodecEngine.PARALLEL),
+) -> list[EngineReport]:
+    """
+    Compare the output of codec engines with the reference engine, byte for byte.
+
+    Every engine first translates all 256 byte values at every phase, in
+    both directions, then ``rounds`` random buffers of random lengths, odd
+    tails included, found at random offsets. Every buffer must also decode
+    back to itself, which is all that is checked for the reference. The
+    parallel engine also translates a buffer of several segments, compared
+    with the reference around every segment boundary. The same ``seed``
+    repeats the same buffers.
+    """
+    profile = get_device(device)
+    return [
+        _check_engine(engine, _translator(engine, profile), profile, seed, rounds)
+        for engine in (CodecEngine.REFERENCE, *engines)
+    ]
+
+
+def _check_engine(
+    engine: CodecEngine, engine_translate: Translate, profile: DeviceProfile, seed: int, rounds: int
+) -> EngineReport:
+    logger.info("Checking the %s engine", engine)
+    checks, mismatches = 0, []
+    for label, data, offset in _cases(seed, rounds, profile.period):
+        for decode in (False, True):
+            checks += 1
+            expected = reference_translate(profile, data, offset, decode)
+            if (actual := engine_translate(data, offset, decode)) != expected:
+                mismatches.append(_describe(label, decode, expected, actual))
+        checks += 1
+        if engine_translate(engine_translate(data, offset, False), offset, True) != data:
+            mismatches.append(f"{label}: does not decode back to the input")
+
+    if engine is CodecEngine.PARALLEL:
+        segment_checks, segment_mismatches = _check_segments(engine_translate, profile, seed)
+        checks += segment_checks
+        mismatches.extend(segment_mismatches)
+    return EngineReport(engine, checks, tuple(mismatches))
+
+
+def _cases(seed: int, rounds: int, period: int) -> Iterator[tuple[str, bytes, int]]:
+    # Byte ``b`` of this buffer has phase ``(offset + b) % period``: together the
+    # offsets cover every byte value at every phase
+    for offset in range(period):
+        yield f"all bytes at offset {offset}", bytes(range(256)), offset
+    yield "empty buffer", b"", 0
+
+    # Seeded so that a failing run can be repeated, the buffers don't need to be secret
+    rng = random.Random(seed)  # noqa: S311
+    for round_number in range(rounds):
+        # Half the buffers are a few bytes long, to hit every tail length
+        length = rng.randrange(1, 2 * period) if round_number % 2 else rng.randrange(FUZZ_MAX_SIZE)
+        offset = rng.randrange(2**32)
+        yield f"random buffer of {length} bytes at offset {offset}", rng.randbytes(length), offset
+
+
+def _check_segments(
+    engine_translate: Translate, profile: DeviceProfile, seed: int
+) -> tuple[int, list[str]]:
+    rng = random.Random(seed)  # noqa: S311
+    size, offset = 2 * SEGMENT_SIZE + rng.randrange(1, 2 * profile.period), rng.randrange(2**32)
+    data = rng.randbytes(size)
+    label = f"buffer of {size} bytes at offset {offset}"
+    encoded = engine_translate(data, offset, False)
+
+    checks, mismatches = 1, []
+    if engine_translate(encoded, offset, True) != data:
+        mismatches.append(f"{label}: does not decode back to the input")
+    for boundary in range(0, size + 1, SEGMENT_SIZE):
+        start, end = max(boundary - _BOUNDARY_WINDOW, 0), min(boundary + _BOUNDARY_WINDOW, size)
+        checks += 1
+        expected = reference_translate(profile, data[start:end], offset + start)
+        if (actual := encoded[start:end]) != expected:
+            mismatches.append(_describe(f"{label}, bytes {start}-{end}", False, expected, actual))
+    tail = max(size - _BOUNDARY_WINDOW, 0)
+    checks += 1
+    if encoded[tail:] != reference_translate(profile, data[tail:], offset + tail):
+        mismatches.append(f"{label}: the tail differs from the reference")
+    return checks, mismatches
+
+
+def _translator(engine: CodecEngine, profile: DeviceProfile) -> Translate:
+    codec = get_codec(profile.name)
+
+    def reference(data: bytes, offset: int, decode: bool) -> bytes:
+        return reference_translate(profile, data, offset, decode)
+
+    def table(data: bytes, offset: int, decode: bool) -> bytes:
+        return translate(data, offset, codec.decode_tables if decode else codec.encode_tables)
+
+    def parallel(data: bytes, offset: int, decode: bool) -> bytes:
+        output = BytesIO()
+        translate_in_parallel(BytesIO(data), output, len(data), decode, profile.name, offset=offset)
+        return output.getvalue()
+
+    engines = {
+        CodecEngine.REFERENCE: reference,
+        CodecEngine.TABLE: table,
+        CodecEngine.AUTO: table,
+        CodecEngine.PARALLEL: parallel,
+    }
+    return engines[engine]
+
+
+def _describe(label: str, decode: bool, expected: bytes, actual: bytes) -> str:
+    index = next(
+        (index for index, (a, b) in enumerate(zip(expected, actual, strict=False)) if a != b),
+        min(len(expected), len(actual)),
+    )
+    direction = "decoding" if decode else "encoding"
+    return f"{label}: {direction} differs from the reference at byte {index}"
@@ -0,0 +1,409 @@
+import email.parser
+import email.policy
+import http.client
+import io
+import logging
+import re
+import socket
+import tarfile
+import threading
+import time
+import zipfile
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import PurePosixPath
+from typing import Iterator
+from urllib.parse import parse_qs, urlsplit
+
+from openfaba import __version__
+from openfaba.codec import DEFAULT_DEVICE, get_device
+from openfaba.exceptions import OpenFabaError
+from openfaba.io import iter_mp3_to_mki_chunks
+from openfaba.media import tag_figure_tracks
+from openfaba.memory import IN_MEMORY_COPIES, memory_budget
+
+logger = logging.getLogger(__name__)
+
+FIGURE_PATH_PATTERN = re.compile(r"/figures/(\d{1,4})/?")
+ARCHIVE_CONTENT_TYPES = {"zip": "application/zip", "tar": "application/x-tar"}
+# Longest wait for a refused client to send its request, per socket operation
+REFUSAL_TIMEOUT = 5.0
+_REFUSAL = (
+    b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\nConnection: close\r\n"
+    b"Content-Length: 0\r\n\r\n"
+)
+
+
+class HttpError(Exception):
+    """An error answered to the client with ``status``"""
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ServerMetrics:
+    """Thread-safe counters of a conversion server, rendered in Prometheus text format"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.responses: Counter[int] = Counter()
+        self.totals: defaultdict[str, float] = defaultdict(float)
+
+    def add(self, **increments: float) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                if name in ("queued", "active"):
+                    setattr(self, name, getattr(self, name) + int(value))
+                else:
+                    self.totals[name] += value
+
+    def respond(self, status: int) -> None:
+        with self._lock:
+            self.responses[status] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                "# TYPE openfaba_requests_queued gauge",
+                f"openfaba_requests_queued {self.queued}",
+                "# TYPE openfaba_requests_active gauge",
+                f"openfaba_requests_active {self.active}",
+                "# TYPE openfaba_responses_total counter",
+                *(
+                    f'openfaba_responses_total{{status="{status}"}} {count}'
+                    for status, count in sorted(self.responses.items())
+                ),
+            ]
+            for name in ("tracks", "received_bytes", "sent_bytes", "conversion_seconds"):
+                lines += [
+                    f"# TYPE openfaba_{name}_total counter",
+                    f"openfaba_{name}_total {self.totals[name]:g}",
+                ]
+        return "\n".join(lines) + "\n"
+
+
+class ConversionServer(HTTPServer):
+    """
+    HTTP server that turns uploaded MP3 files into the MKI files of a figure.
+
+    Requests are handled by a pool of ``workers`` threads. Once they are all
+    busy, up to ``max_queue`` further connections wait for a free worker;
+    beyond that they are answered with ``503 Service Unavailable``, on a
+    thread of their own that first reads the request, so that the client gets
+    the answer instead of a reset connection. Uploads are converted for
+    the ``device`` profile, in memory: each one reserves what it holds from
+    the memory budget of the process, and is answered with ``503`` while the
+    budget is taken, or ``413`` if it can never fit.
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        workers: int = 2,
+        max_queue: int = 16,
+        max_upload: int = 512 * 1024 * 1024,
+        device: str = DEFAULT_DEVICE,
+    ) -> None:
+        super().__init__(address, ConversionRequestHandler)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_upload = max_upload
+        self.device = device
+        self.metrics = ServerMetrics()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="openfaba-server")
+        self._refusals = ThreadPoolExecutor(1, thread_name_prefix="openfaba-refusal")
+
+    def process_request(
+        self, request: socket.socket | tuple[bytes, socket.socket], client_address: tuple[str, int]
+    ) -> None:
+        assert isinstance(request, socket.socket), "HTTP runs over stream sockets"
+        # Only this thread adds requests, and a queued one only leaves once it is done
+        if self.metrics.queued + self.metrics.active >= self.workers + self.max_queue:
+            self.metrics.respond(HTTPStatus.SERVICE_UNAVAILABLE)
+            self._refusals.submit(self._refuse, request)
+            return
+
+        self.metrics.add(queued=1)
+        self._pool.submit(self._process, request, client_address)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._pool.shutdown()
+        self._refusals.shutdown()
+
+    def _process(self, request: socket.socket, client_address: tuple[str, int]) -> None:
+        self.metrics.add(queued=-1, active=1)
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.metrics.add(active=-1)
+            self.shutdown_request(request)
+
+    def _refuse(self, request: socket.socket) -> None:
+        # Read the request first: a client still sending its body would only see a reset
+        try:
+            request.settimeout(REFUSAL_TIMEOUT)
+            with request.makefile("rb") as rfile:
+                rfile.readline(65537)
+                headers = http.client.parse_headers(rfile)
+                length = headers.get("Content-Length", "")
+                if length.isdigit() and int(length) <= self.max_upload:
+                    body = _BodyReader(rfile, int(length))
+                    while body.read(64 * 1024):
+                        pass
+            request.sendall(_REFUSAL)
+        except (OSError, http.client.HTTPException) as exc:
+            logger.debug("Could not answer a refused request: %s", exc)
+        finally:
+            self.shutdown_request(request)
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """
+    ``POST /figures/<figure-id>?format=zip|tar`` converts the uploaded MP3 files.
+
+    The body is either ``multipart/form-data`` with one file per track, a TAR
+    archive of MP3 files (``application/x-tar``) or a single MP3 file
+    (``audio/mpeg``). Tracks are numbered in file name order, as in ``insert``.
+    The response streams a ZIP or TAR archive holding ``K####/CP##.MKI``.
+    ``GET /metrics`` and ``GET /healthz`` report the state of the server.
+    """
+
+    server: ConversionServer
+    server_version = f"openFABA/{__version__}"
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            self._send_text(HTTPStatus.OK, self.server.metrics.render())
+        elif self.path == "/healthz":
+            self._send_text(HTTPStatus.OK, "ok\n")
+        else:
+            self._send_text(HTTPStatus.NOT_FOUND, "Not found\n")
+
+    def do_POST(self) -> None:
+        start = time.monotonic()
+        with ExitStack() as reservation:
+            try:
+                figure_id, archive_format = self._parse_target()
+                body = self._read_body()
+                self._reserve_memory(reservation, body.length)
+                uploads = _read_uploads(self.headers.get_content_type(), self.headers, body)
+                if not uploads:
+                    raise HttpError(HTTPStatus.BAD_REQUEST, "No MP3 files found in the request")
+                mp3_data = [data for _, data in sorted(uploads)]
+                tracks = tag_figure_tracks(figure_id, mp3_data, device=self.server.device)
+            except HttpError as exc:
+                self._send_text(exc.status, f"Error: {exc}\n")
+                return
+            except OpenFabaError as exc:
+                self._send_text(HTTPStatus.UNPROCESSABLE_ENTITY, f"Error: {exc}\n")
+                return
+
+            folder = get_device(self.server.device).figure_folder(figure_id)
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", ARCHIVE_CONTENT_TYPES[archive_format])
+            self.send_header(
+                "Content-Disposition", f'attachment; filename="{folder}.{archive_format}"'
+            )
+            self.end_headers()
+            self.server.metrics.respond(HTTPStatus.OK)
+
+            output = _CountingWriter(self.wfile)
+            _write_archive(output, archive_format, folder, tracks, self.server.device)
+        self.server.metrics.add(
+            tracks=len(tracks),
+            received_bytes=body.consumed,
+            sent_bytes=output.written,
+            conversion_seconds=time.monotonic() - start,
+        )
+        logger.info("Converted figure %s with %d tracks", folder, len(tracks))
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def _parse_target(self) -> tuple[str, str]:
+        url = urlsplit(self.path)
+        if not (match := FIGURE_PATH_PATTERN.fullmatch(url.path)):
+            raise HttpError(HTTPStatus.NOT_FOUND, "Use POST /figures/<figure-id>")
+        archive_format = parse_qs(url.query).get("format", ["zip"])[0]
+        if archive_format not in ARCHIVE_CONTENT_TYPES:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "format must be zip or tar")
+        return f"{int(match.group(1)):04d}", archive_format
+
+    def _read_body(self) -> "_BodyReader":
+        if (length := self.headers.get("Content-Length")) is None or not length.isdigit():
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required")
+        if int(length) > self.server.max_upload:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Upload too large")
+        return _BodyReader(self.rfile, int(length))
+
+    def _reserve_memory(self, reservation: ExitStack, length: int) -> None:
+        # An upload is held about as many times as a file converted in memory:
+        # as read, as parsed and as retitled
+        size = IN_MEMORY_COPIES * length
+        budget = memory_budget()
+        if budget.limit is not None and size > budget.limit:
+            raise HttpError(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Upload too large for the memory limit"
+            )
+        try:
+            reservation.enter_context(budget.reserve(size, timeout=0))
+        except TimeoutError as exc:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "Not enough memory free") from exc
+
+    def _send_text(self, status: HTTPStatus, text: str) -> None:
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        if status is HTTPStatus.SERVICE_UNAVAILABLE:
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        # Counted before the body is sent, the client may ask for /metrics right after
+        self.server.metrics.respond(status)
+        self.wfile.write(data)
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    workers: int = 2,
+    max_queue: int = 16,
+    max_upload: int = 512 * 1024 * 1024,
+    device: str = DEFAULT_DEVICE,
+) -> None:
+    """Run a conversion server until interrupted with Ctrl+C"""
+    with ConversionServer((host, port), workers, max_queue, max_upload, device) as server:
+        logger.info("Serving on http://%s:%d", *server.server_address[:2])
+        server.serve_forever()
+
+
+class _BodyReader(io.RawIOBase):
+    """Reads a request body up to its Content-Length, never past it"""
+
+    def __init__(self, rfile: io.BufferedIOBase, length: int) -> None:
+        self._rfile = rfile
+        self._remaining = self.length = length
+        self.consumed = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: memoryview) -> int:  # type: ignore[override]
+        size = min(len(buffer), self._remaining)
+        data = self._rfile.read(size) if size else b""
+        buffer[: len(data)] = data
+        self._remaining -= len(data)
+        self.consumed += len(data)
+        return len(data)
+
+
+class _CountingWriter:
+    def __init__(self, wfile: io.BufferedIOBase) -> None:
+        self._wfile = wfile
+        self.written = 0
+
+    def write(self, data: bytes) -> int:
+        self._wfile.write(data)
+        self.written += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        self._wfile.flush()
+
+    def close(self) -> None:
+        # The connection belongs to the request handler
+        self.flush()
+
+
+class _ChunkReader(io.RawIOBase):
+    """File-like view of an iterator of byte chunks, for ``TarFile.addfile``"""
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: memoryview) -> int:  # type: ignore[override]
+        if not self._pending:
+            self._pending = next(self._chunks, b"")
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _read_uploads(
+    content_type: str, headers: email.message.Message, body: _BodyReader
+) -> list[tuple[str, bytes]]:
+    if content_type == "multipart/form-data":
+        # The email parser understands MIME multipart bodies, HTTP form data included
+        header = f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode()
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            header + body.read()
+        )
+        if not message.is_multipart():
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed multipart body")
+        return [
+            (PurePosixPath(filename).name, payload)
+            for part in message.iter_parts()
+            if (filename := part.get_filename())
+            and isinstance(payload := part.get_payload(decode=True), bytes)
+        ]
+
+    if content_type in ("application/x-tar", "application/gzip", "application/x-gzip"):
+        try:
+            with tarfile.open(fileobj=io.BufferedReader(body), mode="r|*") as tf:
+                return [
+                    (tar_info.name, extracted.read())
+                    for tar_info in tf
+                    if tar_info.isfile()
+                    and tar_info.name.lower().endswith(".mp3")
+                    and (extracted := tf.extractfile(tar_info)) is not None
+                ]
+        except tarfile.TarError as exc:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"Invalid TAR archive: {exc}") from exc
+
+    if content_type == "audio/mpeg":
+        return [(headers.get("X-Filename", "track.mp3"), body.read())]
+
+    raise HttpError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, f"Unsupported content type {content_type}")
+
+
+def _write_archive(
+    output: _CountingWriter,
+    archive_format: str,
+    folder: str,
+    tracks: list[tuple[str, bytes]],
+    device: str,
+) -> None:
+    if archive_format == "zip":
+        # The output is not seekable, so sizes and CRCs follow each member's data
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as zf:
+            for name, data in tracks:
+                zip_info = zipfile.ZipInfo(f"{folder}/{name}", time.localtime()[:6])
+                zip_info.file_size = len(data)
+                with zf.open(zip_info, "w") as member:
+                    for chunk in iter_mp3_to_mki_chunks(data, device=device):
+                        member.write(chunk)
+        return
+
+    with tarfile.open(fileobj=output, mode="w|") as tf:  # type: ignore[call-overload]
+        for name, data in tracks:
+            tar_info = tarfile.TarInfo(f"{folder}/{name}")
+            tar_info.size = len(data)
+            tar_info.mtime = int(time.time())
+            tf.addfile(
+                tar_info,
+                io.BufferedReader(_ChunkReader(iter_mp3_to_mki_chunks(data, device=device))),
+            )
@@ -0,0 +1,202 @@
+import codecs
+import os
+from collections.abc import Iterator
+from typing import IO, Any
+
+from mutagen.id3._id3v1 import find_id3v1
+
+from openfaba.exceptions import TaggingError
+
+ID3_HEADER_SIZE = 10
+# The audio must start within this many bytes after the ID3v2 tag, as mutagen requires
+AUDIO_SEARCH_SIZE = 1024 * 1024
+# Bytes moved at a time when the audio of a file is shifted behind a new tag
+_MOVE_SIZE = 1024 * 1024
+
+# Text encoding byte of a text frame: codec and terminator of each value
+_TEXT_ENCODINGS = {
+    0: ("latin-1", b"\x00"),
+    1: ("utf-16", b"\x00\x00"),
+    2: ("utf-16-be", b"\x00\x00"),
+    3: ("utf-8", b"\x00"),
+}
+# Title frames of ID3v2.2 and of the later versions
+_TITLE_FRAMES = {"TT2", "TIT2"}
+
+
+def title_tag(title: str) -> bytes:
+    """
+    Build an ID3v2.3 tag holding only ``title``.
+
+    The title is a single UTF-16 ``TIT2`` frame, with a byte order mark and a
+    terminator, and the tag has no padding: the same bytes as mutagen writes
+    with ``v2_version=3`` and no padding.
+    """
+    text = b"\x01" + codecs.BOM_UTF16_LE + title.encode("utf-16-le") + b"\x00\x00"
+    frame = b"TIT2" + len(text).to_bytes(4, "big") + b"\x00\x00" + text
+    return b"ID3\x03\x00\x00" + _to_synchsafe(len(frame)) + frame
+
+
+def retitle_layout(mp3_stream: IO[bytes], title: str) -> tuple[bytes, int, int]:
+    """
+    Plan the replacement of every tag of a seekable MP3 stream by a single title.
+
+    Return the new tag and the bounds of the audio kept after it: the bytes
+    between the ID3v2 tag at the start and the ID3v1 tag at the end. When the
+    only tag of the stream already is ``title``, return an empty tag and the
+    whole stream, so that its bytes are kept as they are. Tag sizes are read
+    tolerantly, whatever the high bits of their synchsafe bytes. Raises
+    TaggingError when no MPEG audio frame follows the tags.
+    """
+    size, v2_size, v1_frames, end = _locate_tags(mp3_stream)
+    start = min(v2_size, end)
+    if not _has_audio_frame(mp3_stream, v2_size, end):
+        raise TaggingError("No MPEG audio frame found")
+
+    mp3_stream.seek(0)
+    titles = dict(_iter_frame_titles(mp3_stream.read(v2_size)))
+    for key, frame in (v1_frames or {}).items():
+        titles.setdefault(key, str(frame.text[0]) if key == "TIT2" and frame.text else None)
+    if titles.keys() == {"TIT2"} and titles["TIT2"] == title:
+        return b"", 0, size
+    return title_tag(title), start, end
+
+
+def set_title(mp3_stream: IO[bytes], title: str) -> None:
+    """Replace every tag of a seekable, writable MP3 stream by a single title, in place"""
+    new_tag, start, end = retitle_layout(mp3_stream, title)
+    if not new_tag:
+        return
+    _move_bytes(mp3_stream, start, end, len(new_tag))
+    mp3_stream.seek(0)
+    mp3_stream.write(new_tag)
+    mp3_stream.truncate(len(new_tag) + end - start)
+
+
+def read_title(tag: bytes) -> str | None:
+    """Return the title of an ID3v2 tag, header included, or None if it has none"""
+    return next((title for key, title in _iter_frame_titles(tag) if key == "TIT2"), None)
+
+
+def _locate_tags(mp3_stream: IO[bytes]) -> tuple[int, int, dict[str, Any] | None, int]:
+    # Size of the stream and of its ID3v2 tag, frames of its ID3v1 tag and where that tag starts
+    size = mp3_stream.seek(0, os.SEEK_END)
+    mp3_stream.seek(0)
+    header = mp3_stream.read(ID3_HEADER_SIZE)
+    v2_size = 0
+    if len(header) == ID3_HEADER_SIZE and header.startswith(b"ID3"):
+        v2_size = ID3_HEADER_SIZE + _from_synchsafe(header[6:10])
+    v1_frames, v1_offset = find_id3v1(mp3_stream)
+    return size, v2_size, v1_frames, size + v1_offset if v1_frames is not None else size
+
+
+def _iter_frame_titles(tag: bytes) -> Iterator[tuple[str, str | None]]:
+    # Yield the ID of every frame, the title frame with its first value when it is readable
+    if len(tag) < ID3_HEADER_SIZE or not tag.startswith(b"ID3") or tag[3] not in (2, 3, 4):
+        return
+    version, flags = tag[3], tag[5]
+    body = tag[ID3_HEADER_SIZE:]
+    if version < 4 and flags & 0x80:
+        body = _resynchronise(body)
+    if version > 2 and flags & 0x40 and len(body) >= 4:
+        # The extended header of ID3v2.4 counts its own size, that of ID3v2.3 doesn't
+        body = body[_from_synchsafe(body[:4]) if version == 4 else int.from_bytes(body[:4]) + 4 :]
+
+    header_size, id_size = (6, 3) if version == 2 else (10, 4)
+    position = 0
+    while position + header_size <= len(body):
+        header = body[position : position + header_size]
+        if not header[:id_size].strip(b"\x00"):
+            return  # Padding
+        frame_id = header[:id_size].decode("latin-1")
+        if version == 2:
+            size, frame_flags = int.from_bytes(header[3:6]), 0
+        elif version == 3:
+            size, frame_flags = int.from_bytes(header[4:8]), int.from_bytes(header[8:10])
+        else:
+            size, frame_flags = _from_synchsafe(header[4:8]), int.from_bytes(header[8:10])
+        data = body[position + header_size : position + header_size + size]
+        position += header_size + size
+        if not size:
+            continue
+        if frame_id not in _TITLE_FRAMES:
+            yield frame_id, None
+            continue
+        content = _frame_content(data, version, frame_flags | (0x02 if flags & 0x80 else 0))
+        yield "TIT2", _first_text(content) if content is not None else None
+
+
+def _frame_content(data: bytes, version: int, flags: int) -> bytes | None:
+    # Strip what the frame flags add in front of the content, None if it is compressed or encrypted
+    if version == 3:
+        if flags & 0x00C0:
+            return None
+        return data[1:] if flags & 0x0020 else data
+    if version == 4:
+        if flags & 0x000C:
+            return None
+        data = data[1:] if flags & 0x0040 else data
+        data = data[4:] if flags & 0x0001 else data
+        return _resynchronise(data) if flags & 0x0002 else data
+    return data
+
+
+def _first_text(data: bytes) -> str | None:
+    if not data or data[0] not in _TEXT_ENCODINGS:
+        return None
+    encoding, terminator = _TEXT_ENCODINGS[data[0]]
+    text = data[1:]
+    # Only a terminator aligned on a character ends a UTF-16 value
+    end = next(
+        (
+            i
+            for i in range(0, len(text), len(terminator))
+            if text[i : i + len(terminator)] == terminator
+        ),
+        len(text),
+    )
+    return text[:end].decode(encoding, errors="replace")
+
+
+def _has_audio_frame(mp3_stream: IO[bytes], start: int, end: int) -> bool:
+    mp3_stream.seek(start)
+    data = mp3_stream.read(max(min(AUDIO_SEARCH_SIZE, end - start), 0))
+    position = data.find(b"\xff")
+    while 0 <= position < len(data) - 3:
+        if _is_frame_header(data[position : position + 4]):
+            return True
+        position = data.find(b"\xff", position + 1)
+    return False
+
+
+def _is_frame_header(header: bytes) -> bool:
+    # As strict as mutagen, to rule out false syncs: a known MPEG version, layer,
+    # bitrate and sample rate
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return False
+    version, layer = header[1] >> 3 & 0x03, header[1] >> 1 & 0x03
+    bitrate, sample_rate = header[2] >> 4, header[2] >> 2 & 0x03
+    return version != 1 and layer != 0 and sample_rate != 3 and bitrate not in (0, 15)
+
+
+def _move_bytes(stream: IO[bytes], start: int, end: int, destination: int) -> None:
+    # Copy in the direction that never overwrites bytes not yet copied
+    positions = range(0, end - start, _MOVE_SIZE)
+    for position in positions if destination < start else reversed(positions):
+        stream.seek(start + position)
+        chunk = stream.read(min(_MOVE_SIZE, end - start - position))
+        stream.seek(destination + position)
+        stream.write(chunk)
+
+
+def _resynchronise(data: bytes) -> bytes:
+    return data.replace(b"\xff\x00", b"\xff")
+
+
+def _from_synchsafe(data: bytes) -> int:
+    # 7 significant bits per byte, a set high bit written by a sloppy tagger is ignored
+    return sum((b & 0x7F) << (7 * (len(data) - 1 - i)) for i, b in enumerate(data))
+
+
+def _to_synchsafe(value: int) -> bytes:
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
@@ -0,0 +1,278 @@
+import contextlib
+import ctypes
+import ctypes.util
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Protocol, Sequence
+
+from openfaba.archive import Mp3Source
+from openfaba.codec import DEFAULT_DEVICE, get_device
+from openfaba.discovery import iter_mp3_files
+from openfaba.media import (
+    figure_id_for_mp3_file,
+    group_mp3_files_by_figure,
+    obfuscate_figure_mp3_files,
+)
+
+logger = logging.getLogger(__name__)
+
+# Stat fingerprint of every source MP3: path -> (size, mtime in ns)
+Snapshot = dict[Path, tuple[int, int]]
+
+# Shortest wait between two rescans, so that a zero debounce doesn't spin on the source tree
+MIN_WAIT = 0.05
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+
+
+class SourceWatcher(Protocol):
+    def watch(self, directories: list[Path]) -> bool: ...
+
+    def wait(self, timeout: float) -> bool: ...
+
+    def close(self) -> None: ...
+
+
+class InotifyWatcher:
+    """Wake up on filesystem events reported by the Linux inotify API, Linux only"""
+
+    def __init__(self) -> None:
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        # IN_NONBLOCK is O_NONBLOCK, which only exists on Unix
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched: set[Path] = set()
+
+    def watch(self, directories: list[Path]) -> bool:
+        """Watch the given directories, returning True if any of them was new"""
+        new_directories = [d for d in directories if d not in self._watched]
+        for directory in new_directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self._watched.add(directory)
+        return bool(new_directories)
+
+    def wait(self, timeout: float) -> bool:
+        import select  # Selecting on a file descriptor is Unix only
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+
+        # Drain the queue; rescanning the tree tells what actually changed
+        with contextlib.suppress(BlockingIOError):
+            while os.read(self._fd, 64 * 1024):
+                pass
+        # Removed directories are dropped by the kernel, forget them so they can be re-added
+        self._watched = {d for d in self._watched if d.is_dir()}
+        return True
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback watcher that requests a rescan every ``interval`` seconds"""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+
+    def watch(self, directories: list[Path]) -> bool:
+        return False
+
+    def wait(self, timeout: float) -> bool:
+        time.sleep(min(timeout, self.interval))
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+def create_watcher(poll_interval: float, use_inotify: bool = True) -> SourceWatcher:
+    """Return an inotify watcher when the platform supports it, a polling one otherwise"""
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as exc:
+            logger.warning("inotify unavailable (%s), falling back to polling", exc)
+    return PollingWatcher(poll_interval)
+
+
+def scan_mp3_library(root: Path) -> tuple[Snapshot, list[Path]]:
+    """Return the stat snapshot of every MP3 below ``root`` and the directories visited"""
+    directories: list[Path] = []
+    snapshot: Snapshot = {
+        found.path: (found.size, found.mtime_ns)
+        for found in iter_mp3_files(root, on_directory=directories.append)
+    }
+    return snapshot, directories
+
+
+def changed_figures(
+    previous: Snapshot, current: Snapshot, default_figure_id: str, device: str = DEFAULT_DEVICE
+) -> set[str]:
+    """Return the figure IDs whose source files were added, removed or modified"""
+    changed = {
+        path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)
+    }
+    return {figure_id_for_mp3_file(path, default_figure_id, device) for path in changed}
+
+
+def reconvert_figure(
+    figure_id: str,
+    mp3_files: Sequence[Mp3Source],
+    faba_library: Path,
+    device: str = DEFAULT_DEVICE,
+) -> None:
+    """
+    Rebuild a single figure from its current sources, removing it if none are left.
+
+    The figure is converted into a hidden folder of the library first and only
+    replaces the previous version once every track is written, so a failed
+    conversion leaves the previous version in place.
+    """
+    figure_path = faba_library / get_device(device).figure_folder(figure_id)
+    if not mp3_files:
+        if figure_path.exists():
+            shutil.rmtree(figure_path)
+        logger.info("Removed figure %s, no sources left", figure_path.name)
+        return
+
+    # Hidden, so that it is never taken for a figure; next to it, so that moves are renames
+    staging = Path(tempfile.mkdtemp(prefix=".openfaba-", dir=faba_library))
+    try:
+        obfuscate_figure_mp3_files(figure_id, mp3_files, staging, device=device)
+        previous = staging / "previous"
+        if figure_path.exists():
+            figure_path.rename(previous)
+        try:
+            (staging / figure_path.name).rename(figure_path)
+        except OSError:
+            if previous.exists():
+                previous.rename(figure_path)
+            raise
+    finally:
+        shutil.rmtree(staging)
+    logger.info("Reconverted figure %s with %d tracks", figure_path.name, len(mp3_files))
+
+
+def watch_mp3_library(
+    mp3_library: Path,
+    faba_library: Path,
+    debounce: float = 2.0,
+    workers: int = 2,
+    poll_interval: float = 1.0,
+    default_figure_id: str = "0000",
+    use_inotify: bool = True,
+    stop_event: threading.Event | None = None,
+    device: str = DEFAULT_DEVICE,
+) -> None:
+    """
+    Keep a Faba library in sync with an MP3 library as its files change.
+
+    The source tree is watched with inotify when available and polled with
+    ``os.scandir`` otherwise. Changes are grouped per ``K####`` figure and a
+    figure is only reconverted once its own sources have been quiet for
+    ``debounce`` seconds, whatever happens to the other figures.
+    Reconversions run on a pool of ``workers`` threads and never run twice at
+    the same time for one figure.
+
+    Parameters
+    ----------
+    mp3_library:
+        Source directory tree of MP3 files, laid out as for ``obfuscate``.
+    faba_library:
+        Destination Faba library root directory (typically an ``MKI01`` folder).
+    debounce:
+        Seconds without changes to wait before reconverting a figure.
+    workers:
+        Number of figures that may be reconverted concurrently.
+    poll_interval:
+        Seconds between rescans when polling is used.
+    default_figure_id:
+        Figure identifier to use when no ``K####`` directory can be inferred.
+    use_inotify:
+        When False, always poll even if inotify is available.
+    stop_event:
+        Stop watching once this event is set. Watch forever when omitted.
+    device:
+        Name of the device profile giving the file layout and the encoding.
+    """
+    stop_event = stop_event or threading.Event()
+    watcher = create_watcher(poll_interval, use_inotify)
+    snapshot, directories = scan_mp3_library(mp3_library)
+    watcher.watch(directories)
+    logger.info("Watching %s (%s)", mp3_library, type(watcher).__name__)
+
+    # Figures waiting to be reconverted -> when their sources last changed
+    pending: dict[str, float] = {}
+    running: dict[str, Future[None]] = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while not stop_event.is_set():
+                if watcher.wait(max(min(poll_interval, debounce), MIN_WAIT)):
+                    current, directories = scan_mp3_library(mp3_library)
+                    # Files created before a new folder got its watch only show up on a rescan
+                    while watcher.watch(directories):
+                        current, directories = scan_mp3_library(mp3_library)
+                    now = time.monotonic()
+                    for figure_id in changed_figures(snapshot, current, default_figure_id, device):
+                        pending[figure_id] = now
+                    snapshot = current
+
+                now = time.monotonic()
+                quiet = sorted(f for f, changed in pending.items() if now - changed >= debounce)
+                if not quiet:
+                    continue
+
+                files_by_figure = group_mp3_files_by_figure(
+                    sorted(snapshot), default_figure_id, device
+                )
+                for figure_id in quiet:
+                    if figure_id in running and not running[figure_id].done():
+                        continue
+                    del pending[figure_id]
+                    mp3_files = files_by_figure.get(figure_id, [])
+                    future = pool.submit(
+                        reconvert_figure, figure_id, mp3_files, faba_library, device
+                    )
+                    figure_folder = get_device(device).figure_folder(figure_id)
+                    future.add_done_callback(_log_failure(figure_folder))
+                    running[figure_id] = future
+        finally:
+            watcher.close()
+
+
+def _log_failure(figure_folder: str) -> Callable[[Future[None]], None]:
+    def callback(future: Future[None]) -> None:
+        try:
+            future.result()
+        except BaseException as exc:
+            logger.error("Failed to reconvert figure %s: %r", figure_folder, exc)
+
+    return callback
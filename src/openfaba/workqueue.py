@@ -0,0 +1,358 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from enum import StrEnum
+from pathlib import Path
+
+from openfaba.archive import ArchiveMember, Mp3Source
+from openfaba.codec import DEFAULT_DEVICE
+from openfaba.discovery import iter_mki_files
+from openfaba.exceptions import ConversionFailure, OpenFabaError, WorkQueueError
+from openfaba.io import convert_mki_to_mp3
+from openfaba.media import obfuscate_track, plan_mp3_library
+from openfaba.writer import OutputDigest, OutputWriter, SyncPolicy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE tasks (
+    task_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    member TEXT,
+    member_offset INTEGER,
+    source_size INTEGER NOT NULL DEFAULT 0,
+    title TEXT,
+    target TEXT NOT NULL,
+    device TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    output_size INTEGER,
+    output_sha256 TEXT
+);
+CREATE INDEX tasks_by_state ON tasks (state, task_id);
+CREATE TABLE settings (lease REAL NOT NULL, max_attempts INTEGER NOT NULL);
+"""
+
+
+class TaskKind(StrEnum):
+    """What a task converts"""
+
+    OBFUSCATE = "obfuscate"
+    DEOBFUSCATE = "deobfuscate"
+
+
+@dataclass(frozen=True)
+class Task:
+    """A single file to convert, claimed by a worker"""
+
+    task_id: int
+    kind: TaskKind
+    source: Mp3Source
+    title: str | None
+    target: Path
+    device: str
+    attempts: int
+
+
+@dataclass(frozen=True)
+class QueueStatus:
+    """Number of tasks in each state"""
+
+    pending: int = 0
+    leased: int = 0
+    done: int = 0
+    failed: int = 0
+
+    @property
+    def unfinished(self) -> int:
+        return self.pending + self.leased
+
+
+class WorkQueue:
+    """
+    A queue of conversion tasks in a SQLite database, shared by several machines.
+
+    The coordinator creates the queue and adds one task per track. Workers
+    claim tasks with a lease of ``lease`` seconds, which they renew while
+    converting. The task of a worker that crashed or lost the shared
+    filesystem becomes claimable again once its lease expires. A task that
+    failed or expired ``max_attempts`` times is failed for good. Both settings
+    are stored in the queue, so every worker applies the coordinator's.
+
+    Every operation opens its own connection, so a queue can be used from any
+    thread and any process. The database is meant for a filesystem with
+    working locks, and the clocks of the machines should agree.
+    """
+
+    def __init__(self, path: Path) -> None:
+        if not path.is_file():
+            raise WorkQueueError(f"No work queue at {path}")
+        self.path = path
+        with self._connect() as connection:
+            self.lease, self.max_attempts = connection.execute(
+                "SELECT lease, max_attempts FROM settings"
+            ).fetchone()
+
+    @classmethod
+    def create(
+        cls, path: Path, lease: float = DEFAULT_LEASE, max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> "WorkQueue":
+        """Create an empty queue at ``path``, which must not exist yet"""
+        if path.exists():
+            raise WorkQueueError(f"{path} already exists")
+        with closing(sqlite3.connect(path)) as connection, connection:
+            connection.executescript(_SCHEMA)
+            connection.execute("INSERT INTO settings VALUES (?, ?)", (lease, max_attempts))
+        return cls(path)
+
+    def add_tasks(
+        self, tasks: Iterable[tuple[TaskKind, Mp3Source, str | None, Path]], device: str
+    ) -> int:
+        """
+        Queue conversions of ``(kind, source, title, target)``, returning how many were added.
+
+        Paths are stored resolved, so that workers started from any directory
+        find the same files.
+        """
+        rows = (
+            (
+                kind,
+                str((source.archive if isinstance(source, ArchiveMember) else source).resolve()),
+                source.member if isinstance(source, ArchiveMember) else None,
+                source.offset if isinstance(source, ArchiveMember) else None,
+                source.size if isinstance(source, ArchiveMember) else 0,
+                title,
+                str(target.resolve()),
+                device,
+            )
+            for kind, source, title, target in tasks
+        )
+        with self._connect() as connection:
+            cursor = connection.executemany(
+                "INSERT INTO tasks "
+                "(kind, source, member, member_offset, source_size, title, target, device) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return cursor.rowcount
+
+    def claim(self, worker: str) -> Task | None:
+        """Lease the next pending or expired task to ``worker``, or return None if there is none"""
+        now = time.time()
+        with self._connect() as connection:
+            self._fail_expired(connection, now)
+            row = connection.execute(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1 "
+                "WHERE task_id = ("
+                "  SELECT task_id FROM tasks "
+                "  WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) "
+                "  ORDER BY task_id LIMIT 1"
+                ") RETURNING task_id, kind, source, member, member_offset, source_size, title, "
+                "target, device, attempts",
+                (worker, now + self.lease, now),
+            ).fetchone()
+        if row is None:
+            return None
+        task_id, kind, source, member, offset, size, title, target, device, attempts = row
+        return Task(
+            task_id,
+            TaskKind(kind),
+            (
+                ArchiveMember(Path(source), member, size, offset)
+                if member is not None
+                else Path(source)
+            ),
+            title,
+            Path(target),
+            device,
+            attempts,
+        )
+
+    def renew(self, task: Task, worker: str) -> bool:
+        """Extend the lease of a task, returning False if the worker no longer holds it"""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_expires = ? "
+                "WHERE task_id = ? AND worker = ? AND state = 'leased'",
+                (time.time() + self.lease, task.task_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task: Task, worker: str, digest: OutputDigest) -> bool:
+        """Record a converted task, returning False if its lease had passed to another worker"""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET state = 'done', error = NULL, output_size = ?, "
+                "output_sha256 = ? WHERE task_id = ? AND worker = ? AND state = 'leased'",
+                (digest.size, digest.sha256, task.task_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, task: Task, worker: str, reason: str) -> None:
+        """Give a failed task back to the queue, or fail it for good after ``max_attempts``"""
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE tasks SET error = ?, worker = NULL, lease_expires = NULL, "
+                "state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE task_id = ? AND worker = ? AND state = 'leased'",
+                (reason, self.max_attempts, task.task_id, worker),
+            )
+
+    def status(self) -> QueueStatus:
+        """Count the tasks in each state"""
+        with self._connect() as connection:
+            self._fail_expired(connection, time.time())
+            counts = dict(
+                connection.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+            )
+        return QueueStatus(**counts)
+
+    def failures(self) -> list[ConversionFailure]:
+        """Return the tasks that failed for good, with their last error"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT source, member, error FROM tasks WHERE state = 'failed' ORDER BY task_id"
+            ).fetchall()
+        return [
+            ConversionFailure(f"{source}/{member}" if member else source, error or "")
+            for source, member, error in rows
+        ]
+
+    def _fail_expired(self, connection: sqlite3.Connection, now: float) -> None:
+        connection.execute(
+            "UPDATE tasks SET state = 'failed', "
+            "error = COALESCE(error, 'The worker stopped responding') "
+            "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, self.max_attempts),
+        )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit: every statement is its own transaction, claims are a single UPDATE
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+            yield connection
+
+
+def enqueue_obfuscation(
+    queue: WorkQueue,
+    faba_library_mp3: Path,
+    faba_library: Path,
+    default_figure_id: str = "0000",
+    device: str = DEFAULT_DEVICE,
+) -> int:
+    """Queue every track of ``obfuscate_mp3_library``, creating the figure folders"""
+    tracks = plan_mp3_library(faba_library_mp3, faba_library, default_figure_id, device)
+    return queue.add_tasks(
+        ((TaskKind.OBFUSCATE, source, title, target) for source, title, target in tracks),
+        device,
+    )
+
+
+def enqueue_deobfuscation(
+    queue: WorkQueue, faba_library: Path, faba_library_mp3: Path, device: str = DEFAULT_DEVICE
+) -> int:
+    """Queue every track of ``deobfuscate_mki_library``"""
+    return queue.add_tasks(
+        (
+            (
+                TaskKind.DEOBFUSCATE,
+                found.path,
+                None,
+                (faba_library_mp3 / found.path.relative_to(faba_library)).with_suffix(".mp3"),
+            )
+            for found in iter_mki_files(faba_library, device)
+        ),
+        device,
+    )
+
+
+def run_worker(
+    queue: WorkQueue,
+    worker: str | None = None,
+    poll_interval: float = 1.0,
+    stop: threading.Event | None = None,
+) -> int:
+    """
+    Claim and convert tasks until the queue is finished, returning how many were converted.
+
+    When no task can be claimed but others are still leased, the worker waits
+    ``poll_interval`` seconds and tries again, in case their lease expires.
+    Every output file is flushed to the device before its task is completed.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    writer = OutputWriter(SyncPolicy.FILE)
+    converted = 0
+    while not stop.is_set():
+        if (task := queue.claim(worker)) is None:
+            if queue.status().unfinished == 0:
+                break
+            stop.wait(poll_interval)
+            continue
+
+        logger.info("Converting %s [task %d, attempt %d]", task.source, task.task_id, task.attempts)
+        try:
+            with _keep_leased(queue, task, worker):
+                digest = _convert(task, writer)
+        except (OpenFabaError, OSError) as exc:
+            logger.error("Task %d failed: %s", task.task_id, exc)
+            queue.fail(task, worker, str(exc))
+            continue
+        if queue.complete(task, worker, digest):
+            converted += 1
+        else:
+            logger.warning("Task %d was taken over by another worker", task.task_id)
+    return converted
+
+
+def wait_for_queue(queue: WorkQueue, poll_interval: float = 1.0) -> Iterator[QueueStatus]:
+    """Yield the status of the queue every ``poll_interval`` seconds until it is finished"""
+    while True:
+        status = queue.status()
+        yield status
+        if status.unfinished == 0:
+            return
+        time.sleep(poll_interval)
+
+
+def _convert(task: Task, writer: OutputWriter) -> OutputDigest:
+    task.target.parent.mkdir(parents=True, exist_ok=True)
+    if task.kind is TaskKind.OBFUSCATE:
+        assert task.title is not None
+        return obfuscate_track(task.source, task.title, task.target, writer, task.device)
+    assert isinstance(task.source, Path)
+    return convert_mki_to_mp3(task.source, task.target, writer, task.device)
+
+
+@contextmanager
+def _keep_leased(queue: WorkQueue, task: Task, worker: str) -> Iterator[None]:
+    # Renew the lease in the background while a long conversion runs
+    done = threading.Event()
+
+    def renew() -> None:
+        while not done.wait(queue.lease / 3):
+            if not queue.renew(task, worker):
+                logger.warning("Lost the lease of task %d", task.task_id)
+                return
+
+    thread = threading.Thread(target=renew, name=f"lease-{task.task_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
@@ -0,0 +1,401 @@
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import queue
+import sys
+import threading
+from collections.abc import Buffer, Sequence
+from contextlib import AbstractContextManager, contextmanager, suppress
+from dataclasses import dataclass
+from enum import StrEnum
+from functools import cache
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO, Callable, Iterator, Protocol, Self
+
+from openfaba.exceptions import ConversionError, ConversionFailure, TargetWriteError
+from openfaba.iopolicy import (
+    DIRECT_ALIGNMENT,
+    DirectFile,
+    IoPolicy,
+    direct_io_available,
+    drop_cached_pages,
+)
+
+logger = logging.getLogger(__name__)
+
+# Output is written in whole blocks of this size, aligned to the start of the file
+BLOCK_SIZE = 1024 * 1024
+
+FALLOC_FL_KEEP_SIZE = 0x01
+
+
+class SyncPolicy(StrEnum):
+    """When written files are flushed to the storage device"""
+
+    FILE = "file"
+    FIGURE = "figure"
+    NEVER = "never"
+
+
+class RawOutput(Protocol):
+    def write(self, data: Buffer, /) -> int | None: ...
+
+    def flush(self) -> None: ...
+
+    def fileno(self) -> int: ...
+
+
+@dataclass(frozen=True)
+class OutputDigest:
+    """Size and SHA-256 of a file written by one of the converters, and of its source if hashed"""
+
+    size: int
+    sha256: str
+    source_sha256: str | None = None
+
+
+class HashingWriter:
+    """
+    Binary writer that hashes and counts everything written through it.
+
+    Data is gathered and handed to the file in whole ``block_size`` blocks,
+    only the tail of the file is written as a shorter block.
+    """
+
+    def __init__(self, outfile: RawOutput, block_size: int = BLOCK_SIZE) -> None:
+        self._outfile = outfile
+        self._block_size = block_size
+        self._pending = bytearray()
+        self._hash = hashlib.sha256()
+        self._size = 0
+
+    def write(self, data: bytes) -> int:
+        self._hash.update(data)
+        self._size += len(data)
+        self._pending += data
+        if len(self._pending) >= self._block_size:
+            whole_blocks = len(self._pending) - len(self._pending) % self._block_size
+            self._outfile.write(self._pending[:whole_blocks])
+            del self._pending[:whole_blocks]
+        return len(data)
+
+    def flush(self) -> None:
+        if self._pending:
+            self._outfile.write(self._pending)
+            self._pending.clear()
+        self._outfile.flush()
+
+    @property
+    def digest(self) -> OutputDigest:
+        return OutputDigest(self._size, self._hash.hexdigest())
+
+
+def partial_file(target: Path) -> Path:
+    """Return the temporary file ``target`` is written to, renamed to ``target`` once complete"""
+    return target.with_name(f".{target.name}.part")
+
+
+class OutputWriter:
+    """
+    Writes the output files of a conversion, tuned for SD cards.
+
+    Every file is written to a temporary sibling, preallocated to its final
+    size when known so the filesystem can keep it contiguous, filled in large
+    aligned blocks and renamed into place. With ``SyncPolicy.FILE`` each file
+    is flushed to the device before its rename. With ``SyncPolicy.FIGURE``
+    files are kept aside and flushed and renamed together on ``sync()``, which
+    callers invoke at the end of each figure. With ``SyncPolicy.NEVER`` files
+    are renamed right away and flushing is left to the operating system.
+
+    Either way, a target is never visible half-written. Callbacks registered
+    with ``when_durable`` run once the files written so far are safely stored.
+
+    With ``IoPolicy.STREAM`` the pages of every file are evicted from the page
+    cache once flushed, and ``IoPolicy.DIRECT`` also writes them with
+    ``O_DIRECT`` where the filesystem allows it; it raises ConversionError on
+    platforms without ``O_DIRECT``. Converters read their sources following
+    the same ``io_policy``.
+    """
+
+    def __init__(
+        self,
+        sync: SyncPolicy = SyncPolicy.FILE,
+        block_size: int = BLOCK_SIZE,
+        io_policy: IoPolicy = IoPolicy.CACHED,
+    ) -> None:
+        if io_policy is IoPolicy.DIRECT and not direct_io_available():
+            raise ConversionError("The direct I/O policy needs O_DIRECT, which this system lacks")
+        self.sync_policy = sync
+        self.block_size = block_size
+        self.io_policy = io_policy
+        self._unsynced: list[tuple[Path, Path]] = []
+        self._callbacks: list[Callable[[], None]] = []
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        # Files completed before a failure are still valid and worth keeping
+        self.sync()
+
+    @contextmanager
+    def open(self, target: Path, size: int | None = None) -> Iterator[HashingWriter]:
+        """Write ``target``, whose final ``size`` is given when known in advance"""
+        temp_file = partial_file(target)
+        try:
+            with self._open_temp_file(temp_file) as outfile:
+                if size:
+                    preallocate(outfile.fileno(), size)
+                writer = HashingWriter(outfile, self.block_size)
+                yield writer
+                writer.flush()
+                if self.sync_policy is SyncPolicy.FILE:
+                    os.fsync(outfile.fileno())
+                if self.io_policy is not IoPolicy.CACHED:
+                    drop_cached_pages(outfile.fileno())
+        except BaseException:
+            temp_file.unlink(missing_ok=True)
+            raise
+
+        if self.sync_policy is SyncPolicy.FIGURE:
+            self._unsynced.append((temp_file, target))
+        else:
+            temp_file.replace(target)
+
+    def outputs(self, target: Path) -> list[Path]:
+        """Return the paths where ``target`` was written"""
+        return [target]
+
+    def when_durable(self, callback: Callable[[], None]) -> None:
+        """Run ``callback`` once every file written so far is safely stored"""
+        if self._unsynced:
+            self._callbacks.append(callback)
+        else:
+            callback()
+
+    def sync(self) -> None:
+        """Flush and rename the files kept aside by ``SyncPolicy.FIGURE``"""
+        for temp_file, _ in self._unsynced:
+            with temp_file.open("rb") as written:
+                os.fsync(written.fileno())
+                if self.io_policy is not IoPolicy.CACHED:
+                    drop_cached_pages(written.fileno())
+        for temp_file, target in self._unsynced:
+            temp_file.replace(target)
+        self._unsynced.clear()
+
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def _open_temp_file(self, temp_file: Path) -> DirectFile | BinaryIO:
+        if self.io_policy is IoPolicy.DIRECT and self.block_size % DIRECT_ALIGNMENT == 0:
+            try:
+                return DirectFile(temp_file)
+            except OSError as exc:
+                logger.debug("Direct I/O not supported for %s: %s", temp_file, exc)
+        return temp_file.open("wb", buffering=0)
+
+
+class FanOutWriter(OutputWriter):
+    """
+    Writes every output file to the same place in several libraries at once.
+
+    Targets are given inside the first library and mirrored in the others.
+    Files are produced once and their blocks are handed to one thread per
+    library, each with its own ``OutputWriter``, so a slow card only holds
+    back the others once it lags more than ``max_lag`` bytes behind.
+
+    A library that fails is dropped and the others are still written, the
+    failures are raised by ``raise_failures()``. Callbacks registered with
+    ``when_durable`` run once every remaining library has synced the files
+    written so far.
+    """
+
+    def __init__(
+        self,
+        libraries: Sequence[Path],
+        sync: SyncPolicy = SyncPolicy.FILE,
+        block_size: int = BLOCK_SIZE,
+        io_policy: IoPolicy = IoPolicy.CACHED,
+        max_lag: int = 64 * 1024 * 1024,
+    ) -> None:
+        super().__init__(sync, block_size, io_policy)
+        self.libraries = list(libraries)
+        self._threads = [
+            _LibraryThread(
+                library, OutputWriter(sync, block_size, io_policy), max(1, max_lag // block_size)
+            )
+            for library in self.libraries
+        ]
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.sync()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.queue.put(None)
+                thread.join()
+
+    @contextmanager
+    def open(self, target: Path, size: int | None = None) -> Iterator[HashingWriter]:
+        relative = target.relative_to(self.libraries[0])
+        if all(thread.error is not None for thread in self._threads):
+            self.raise_failures()
+
+        self._send(("open", relative, size))
+        writer = HashingWriter(_Broadcast(self._send), self.block_size)
+        try:
+            yield writer
+            writer.flush()
+        except BaseException:
+            self._send(("abort",))
+            raise
+        self._send(("close",))
+
+    def outputs(self, target: Path) -> list[Path]:
+        relative = target.relative_to(self.libraries[0])
+        return [thread.library / relative for thread in self._threads if thread.error is None]
+
+    def when_durable(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+    def sync(self) -> None:
+        """Wait until every library has flushed the files written so far"""
+        self._send(("sync",))
+        for thread in self._threads:
+            thread.queue.join()
+
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def raise_failures(self) -> None:
+        """Raise TargetWriteError if writing to any of the libraries failed"""
+        failures = [
+            ConversionFailure(str(thread.library), str(thread.error))
+            for thread in self._threads
+            if thread.error is not None
+        ]
+        if failures:
+            raise TargetWriteError(len(self._threads), failures)
+
+    def _send(self, command: tuple[object, ...]) -> None:
+        for thread in self._threads:
+            if not thread.is_alive():
+                thread.start()
+            # A failed library still consumes its commands, skipping them is only faster
+            if thread.error is None:
+                thread.queue.put(command)
+
+
+class _Broadcast:
+    """Raw output handing every block of a HashingWriter to the library threads"""
+
+    def __init__(self, send: Callable[[tuple[object, ...]], None]) -> None:
+        self._send = send
+
+    def write(self, data: Buffer, /) -> int:
+        # Copied, the writer reuses its buffer once this returns
+        block = bytes(data)
+        self._send(("write", block))
+        return len(block)
+
+    def flush(self) -> None:
+        pass
+
+    def fileno(self) -> int:
+        raise OSError("Fan-out outputs have no file descriptor")
+
+
+class _LibraryThread(threading.Thread):
+    """Runs the commands of a FanOutWriter against one library, in order"""
+
+    def __init__(self, library: Path, writer: OutputWriter, max_pending: int) -> None:
+        super().__init__(name=f"openfaba-writer-{library.name}", daemon=True)
+        self.library = library
+        self.writer = writer
+        self.queue: queue.Queue[tuple[object, ...] | None] = queue.Queue(max_pending)
+        self.error: Exception | None = None
+        self._output: AbstractContextManager[HashingWriter] | None = None
+        self._outfile: HashingWriter | None = None
+
+    def run(self) -> None:
+        while True:
+            command = self.queue.get()
+            try:
+                if command is None:
+                    return
+                if self.error is None:
+                    self._execute(command)
+            except Exception as exc:
+                logger.error("Writing to %s failed: %s", self.library, exc)
+                self.error = exc
+                self._abort(exc)
+            finally:
+                self.queue.task_done()
+
+    def _execute(self, command: tuple[object, ...]) -> None:
+        match command:
+            case ("open", Path() as relative, int() | None as size):
+                target = self.library / relative
+                target.parent.mkdir(parents=True, exist_ok=True)
+                self._output = self.writer.open(target, size)
+                self._outfile = self._output.__enter__()
+            case ("write", bytes() as block):
+                assert self._outfile is not None
+                self._outfile.write(block)
+            case ("close",):
+                output, self._output, self._outfile = self._output, None, None
+                assert output is not None
+                output.__exit__(None, None, None)
+            case ("abort",):
+                self._abort(ConversionError("The conversion was aborted"))
+            case ("sync",):
+                self.writer.sync()
+
+    def _abort(self, exc: Exception) -> None:
+        """Remove the temporary file of the output being written, if any"""
+        output, self._output, self._outfile = self._output, None, None
+        if output is not None:
+            with suppress(Exception):
+                output.__exit__(type(exc), exc, exc.__traceback__)
+
+
+@contextmanager
+def atomic_writer(target: Path, size: int | None = None) -> Iterator[HashingWriter]:
+    """Write ``target`` through a temporary file flushed and renamed into place on success"""
+    with OutputWriter(SyncPolicy.FILE).open(target, size) as writer:
+        yield writer
+
+
+def preallocate(fd: int, size: int) -> None:
+    """Reserve ``size`` bytes for a file, if the platform and filesystem support it"""
+    try:
+        if sys.platform.startswith("linux"):
+            # KEEP_SIZE avoids glibc's fallback of writing zeros on filesystems such as FAT
+            if _libc().fallocate(fd, FALLOC_FL_KEEP_SIZE, 0, size) != 0:
+                logger.debug("fallocate failed: %s", os.strerror(ctypes.get_errno()))
+        elif hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+    except (OSError, AttributeError) as exc:
+        logger.debug("Preallocation not supported: %s", exc)
+
+
+@cache
+def _libc() -> ctypes.CDLL:
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    return libc
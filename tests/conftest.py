@@ -1,7 +1,12 @@
+from collections.abc import Iterator
 from pathlib import Path
 
 import pytest
 
+from openfaba import codec
+from openfaba.codec import DeviceProfile, get_codec, register_device
+from openfaba.media import deobfuscate_mki_library
+
 
 @pytest.fixture
 def fixtures_dir() -> Path:
@@ -34,3 +39,23 @@ def fake_mp3_library(tmp_path: Path) -> Path:
     d = tmp_path / "mp3"
     d.mkdir()
     return d
+
+
+@pytest.fixture(scope="session")
+def mp3_library(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Return an MP3 library deobfuscated once from the MKI01 fixture library."""
+    target = tmp_path_factory.mktemp("mp3_library")
+    deobfuscate_mki_library(Path(__file__).parent / "fixtures" / "MKI01", target)
+    return target
+
+
+@pytest.fixture
+def box_device(monkeypatch: pytest.MonkeyPatch) -> Iterator[DeviceProfile]:
+    """Register a device with its own transform and layout, figures named ``F####``"""
+    monkeypatch.setattr(codec, "_DEVICES", dict(codec._DEVICES))
+    profile = DeviceProfile(
+        "box", lambda byte, phase: byte ^ (0x5A + phase), figure_prefix="F", track_suffix=".BOX"
+    )
+    register_device(profile)
+    yield profile
+    get_codec.cache_clear()
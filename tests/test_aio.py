@@ -0,0 +1,100 @@
+import asyncio
+import filecmp
+import inspect
+import threading
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+
+from openfaba import aio, media
+from openfaba.aio import AsyncConverter, adecode_stream, aobfuscate_figure, aobfuscate_library
+from openfaba.exceptions import TrackNotFoundError
+from openfaba.media import stream_figure_mki_files
+
+
+def test_aobfuscate_figure_matches_fixture(
+    mki_library: Path, mp3_library: Path, fake_faba_library: Path
+) -> None:
+    sources = sorted((mp3_library / "K3001").glob("*.mp3"))
+
+    asyncio.run(aobfuscate_figure("3001", sources, fake_faba_library))
+
+    original = mki_library / "K3001" / "CP01.MKI"
+    assert filecmp.cmp(original, fake_faba_library / "K3001" / "CP01.MKI", shallow=False)
+
+
+def test_adecode_stream_yields_decoded_chunks(mki_library: Path) -> None:
+    async def collect() -> bytes:
+        return b"".join([chunk async for chunk in adecode_stream("3001", mki_library)])
+
+    assert asyncio.run(collect()) == b"".join(stream_figure_mki_files("3001", mki_library))
+
+
+def test_decode_stream_raises_typed_error(mki_library: Path) -> None:
+    async def collect() -> list[bytes]:
+        async with AsyncConverter() as converter:
+            return [chunk async for chunk in converter.decode_stream("9999", mki_library)]
+
+    with pytest.raises(TrackNotFoundError):
+        asyncio.run(collect())
+
+
+def test_concurrency_limit_is_respected(mki_library: Path, tmp_path: Path) -> None:
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow_job() -> None:
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    async def main() -> None:
+        async with AsyncConverter(max_concurrency=2) as converter:
+            await asyncio.gather(*(converter._run(slow_job) for _ in range(6)))
+
+    asyncio.run(main())
+
+    assert peak == 2
+
+
+@pytest.mark.parametrize(
+    ("method", "function", "blocking"),
+    [
+        ("obfuscate_figure", "aobfuscate_figure", "obfuscate_figure_mp3_files"),
+        ("obfuscate_library", "aobfuscate_library", "obfuscate_mp3_library"),
+        ("deobfuscate_figure", "adeobfuscate_figure", "deobfuscate_figure_mki_files"),
+        ("deobfuscate_library", "adeobfuscate_library", "deobfuscate_mki_library"),
+        ("decode_stream", "adecode_stream", "stream_figure_mki_files"),
+    ],
+)
+def test_async_signatures_match_the_blocking_functions(
+    method: str, function: str, blocking: str
+) -> None:
+    expected = list(inspect.signature(getattr(media, blocking)).parameters.values())
+
+    bound_method = getattr(AsyncConverter(), method)
+    assert list(inspect.signature(bound_method).parameters.values()) == expected
+    assert list(inspect.signature(getattr(aio, function)).parameters.values()) == expected
+
+
+def test_options_are_passed_to_the_blocking_function(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    blocking = Mock(return_value=3)
+    monkeypatch.setattr(aio, "obfuscate_mp3_library", blocking)
+
+    converted = asyncio.run(
+        aobfuscate_library(tmp_path, tmp_path, checksum=True, mirrors=[tmp_path], prefetch=2)
+    )
+
+    assert converted == 3
+    assert blocking.call_args.kwargs["checksum"] is True
+    assert blocking.call_args.kwargs["mirrors"] == [tmp_path]
+    assert blocking.call_args.kwargs["prefetch"] == 2
@@ -0,0 +1,191 @@
+import tarfile
+import threading
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from openfaba.archive import (
+    ArchiveMember,
+    UnreadableSource,
+    is_archive,
+    iter_mp3_source_streams,
+    list_archive_mp3_members,
+    prefetch_mp3_source_streams,
+)
+from openfaba.exceptions import SourceReadError
+from openfaba.io import collect_all_mp3_files_in_folder
+from openfaba.media import obfuscate_figure_mp3_files, obfuscate_mp3_library
+from openfaba.memory import MemoryBudget
+
+
+@pytest.fixture
+def mp3_zip(mp3_library: Path, tmp_path: Path) -> Path:
+    archive = tmp_path / "library.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for mp3_file in sorted(mp3_library.rglob("*.mp3")):
+            zf.write(mp3_file, mp3_file.relative_to(mp3_library).as_posix())
+        zf.writestr("K3001/cover.jpg", b"not audio")
+    return archive
+
+
+@pytest.fixture
+def mp3_tar_gz(mp3_library: Path, tmp_path: Path) -> Path:
+    archive = tmp_path / "library.tar.gz"
+    with tarfile.open(archive, "w:gz") as tf:
+        tf.add(mp3_library, arcname="library")
+    return archive
+
+
+def test_is_archive(mp3_zip: Path, mp3_tar_gz: Path, tmp_path: Path) -> None:
+    assert is_archive(mp3_zip)
+    assert is_archive(mp3_tar_gz)
+    assert not is_archive(tmp_path)
+
+
+def test_list_archive_mp3_members_skips_other_files(mp3_zip: Path) -> None:
+    members = list_archive_mp3_members(mp3_zip)
+
+    assert members == [ArchiveMember(mp3_zip, "K3001/CP01.mp3")]
+    assert members[0].name == "CP01.mp3"
+    assert members[0].parent.name == "K3001"
+
+
+@pytest.mark.parametrize("archive_fixture", ["mp3_zip", "mp3_tar_gz"])
+def test_obfuscate_mp3_library_from_archive(
+    archive_fixture: str,
+    request: pytest.FixtureRequest,
+    mki_library: Path,
+    fake_faba_library: Path,
+) -> None:
+    archive: Path = request.getfixturevalue(archive_fixture)
+
+    converted = obfuscate_mp3_library(archive, fake_faba_library)
+
+    assert converted == 1
+    for original in mki_library.rglob("*.MKI"):
+        rebuilt = fake_faba_library / original.relative_to(mki_library)
+        assert rebuilt.read_bytes() == original.read_bytes()
+
+
+def test_obfuscate_figure_from_archive_members(mp3_tar_gz: Path, fake_faba_library: Path) -> None:
+    members = collect_all_mp3_files_in_folder(mp3_tar_gz)
+
+    obfuscate_figure_mp3_files("0042", members, fake_faba_library)
+
+    assert [p.name for p in (fake_faba_library / "K0042").iterdir()] == ["CP01.MKI"]
+
+
+def test_zip_members_are_streamed_in_requested_order(tmp_path: Path) -> None:
+    archive = tmp_path / "figure.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("K0001/02.mp3", b"second")
+        zf.writestr("K0001/01.mp3", b"first")
+
+    members = list_archive_mp3_members(archive)
+    streamed = [(source, stream.read()) for source, stream in iter_mp3_source_streams(members)]
+
+    assert streamed == [(members[0], b"first"), (members[1], b"second")]
+
+
+@pytest.fixture
+def mixed_sources(tmp_path: Path) -> list[Path | ArchiveMember]:
+    (tmp_path / "K0001").mkdir()
+    for name, content in [("01.mp3", b"first"), ("02.mp3", b"second file"), ("03.mp3", b"3")]:
+        (tmp_path / "K0001" / name).write_bytes(content)
+    with zipfile.ZipFile(tmp_path / "figure.zip", "w") as zf:
+        zf.writestr("K0002/01.mp3", b"zipped")
+        zf.writestr("K0002/02.mp3", b"zipped and large")
+    with tarfile.open(tmp_path / "figure.tar", "w") as tf:
+        for name in ["01.mp3", "02.mp3", "03.mp3"]:
+            tf.add(tmp_path / "K0001" / name, arcname=f"K0003/{name}")
+    return [
+        *sorted((tmp_path / "K0001").iterdir()),
+        *list_archive_mp3_members(tmp_path / "figure.zip"),
+        *list_archive_mp3_members(tmp_path / "figure.tar"),
+    ]
+
+
+@pytest.mark.parametrize("depth", [1, 2, 8])
+def test_prefetch_yields_the_same_streams(
+    mixed_sources: list[Path | ArchiveMember], depth: int
+) -> None:
+    expected = [
+        (source, stream.read()) for source, stream in iter_mp3_source_streams(mixed_sources)
+    ]
+
+    # Sources over 8 bytes are too large to prefetch and are read when their turn comes
+    prefetched = prefetch_mp3_source_streams(mixed_sources, depth, max_size=8)
+
+    assert [(source, stream.read()) for source, stream in prefetched] == expected
+
+
+@pytest.mark.parametrize("stop_after", [1, 4, None])
+def test_prefetch_reserves_buffers_until_they_are_used(
+    mixed_sources: list[Path | ArchiveMember], stop_after: int | None
+) -> None:
+    budget = MemoryBudget(1024)
+    prefetched = prefetch_mp3_source_streams(mixed_sources, 2, max_size=8, budget=budget)
+
+    for index, (_, stream) in enumerate(prefetched, start=1):
+        if isinstance(stream, BytesIO):
+            assert budget.in_flight >= len(stream.getvalue())
+        if index == stop_after:
+            prefetched.close()
+
+    assert budget.in_flight == budget.read_ahead == 0
+
+
+def test_prefetch_reads_lazily_when_the_budget_is_full(
+    mixed_sources: list[Path | ArchiveMember],
+) -> None:
+    budget = MemoryBudget(4)
+    expected = [
+        (source, stream.read()) for source, stream in iter_mp3_source_streams(mixed_sources)
+    ]
+
+    with budget.reserve(4):
+        prefetched = prefetch_mp3_source_streams(mixed_sources, 2, max_size=8, budget=budget)
+        read = [
+            (source, stream.read(), isinstance(stream, BytesIO)) for source, stream in prefetched
+        ]
+
+    assert read == [(source, content, False) for source, content in expected]
+    assert budget.in_flight == 0
+
+
+def test_prefetch_reports_missing_files_in_turn(tmp_path: Path) -> None:
+    (first := tmp_path / "01.mp3").write_bytes(b"first")
+
+    prefetched = prefetch_mp3_source_streams([first, tmp_path / "02.mp3"], 2, max_size=1024)
+
+    assert next(prefetched)[0] == first
+    source, stream = next(prefetched)
+    prefetched.close()
+
+    assert source == tmp_path / "02.mp3"
+    assert isinstance(stream, UnreadableSource)
+    with pytest.raises(SourceReadError, match="No such file or directory"):
+        stream.read()
+
+
+def test_prefetch_stops_reading_archives_when_closed(
+    mixed_sources: list[Path | ArchiveMember],
+) -> None:
+    prefetched = prefetch_mp3_source_streams(mixed_sources[-3:], 1, max_size=8)
+
+    assert next(prefetched)[1].read() == b"first"
+    prefetched.close()
+
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("prefetch")]
+
+
+def test_obfuscate_mp3_library_with_prefetch(
+    mp3_zip: Path, mp3_library: Path, mki_library: Path, fake_faba_library: Path
+) -> None:
+    assert obfuscate_mp3_library(mp3_library, fake_faba_library, prefetch=2) == 1
+
+    for original in mki_library.rglob("*.MKI"):
+        rebuilt = fake_faba_library / original.relative_to(mki_library)
+        assert rebuilt.read_bytes() == original.read_bytes()
@@ -0,0 +1,122 @@
+import io
+import json
+import struct
+from pathlib import Path
+
+import pytest
+
+from openfaba.bundle import (
+    BUNDLE_MAGIC,
+    PAYLOAD_ALIGNMENT,
+    FigureBundle,
+    build_bundle_index,
+    iter_bundle_chunks,
+    read_bundle_index,
+    unpack_figure,
+)
+from openfaba.exceptions import BundleError, FigureExistsError, TrackNotFoundError
+from openfaba.writer import SyncPolicy
+
+
+@pytest.fixture
+def figure_library(tmp_path: Path) -> Path:
+    library = tmp_path / "source"
+    (figure_path := library / "K0104").mkdir(parents=True)
+    for number, size in [(1, 5000), (2, 0), (3, 123)]:
+        (figure_path / f"CP{number:02d}.MKI").write_bytes(bytes([number]) * size)
+    return library
+
+
+def pack(library: Path, figure_id: str = "0104") -> bytes:
+    return b"".join(iter_bundle_chunks(build_bundle_index(figure_id, library), library, 1000))
+
+
+def test_pack_and_unpack_round_trip(figure_library: Path, tmp_path: Path) -> None:
+    bundle = pack(figure_library)
+    target = tmp_path / "target"
+
+    index = unpack_figure(io.BytesIO(bundle), target)
+
+    assert len(bundle) == index.size
+    assert index.payload_offset % PAYLOAD_ALIGNMENT == 0
+    assert [track.name for track in index.tracks] == ["CP01.MKI", "CP02.MKI", "CP03.MKI"]
+    for track in (figure_library / "K0104").iterdir():
+        assert (target / "K0104" / track.name).read_bytes() == track.read_bytes()
+
+
+def test_bundle_tracks_are_read_by_random_access(figure_library: Path, tmp_path: Path) -> None:
+    (bundle_path := tmp_path / "figure.fabapack").write_bytes(pack(figure_library))
+
+    bundle = FigureBundle(bundle_path)
+
+    assert bundle.read_track(3) == b"\x03" * 123
+    assert bundle.read_track(2) == b""
+    with pytest.raises(TrackNotFoundError, match="Track 4"):
+        bundle.read_track(4)
+
+
+def test_unpack_reads_short_blocks_from_pipes(figure_library: Path, tmp_path: Path) -> None:
+    class Pipe(io.BytesIO):
+        def read(self, size: int | None = -1) -> bytes:
+            return super().read(7 if size is None or size < 0 else min(size, 7))
+
+    unpack_figure(Pipe(pack(figure_library)), tmp_path)
+
+    assert (tmp_path / "K0104" / "CP01.MKI").read_bytes() == b"\x01" * 5000
+
+
+@pytest.mark.parametrize("sync", list(SyncPolicy))
+def test_unpack_rejects_corrupted_tracks(
+    figure_library: Path, tmp_path: Path, sync: SyncPolicy
+) -> None:
+    bundle = bytearray(pack(figure_library))
+    bundle[-1] ^= 0xFF
+
+    with pytest.raises(BundleError, match=r"CP03\.MKI does not match"):
+        unpack_figure(io.BytesIO(bytes(bundle)), tmp_path, sync)
+
+    # The tracks that matched are not installed either, and the bundle can be installed again
+    assert not (tmp_path / "K0104").exists()
+    unpack_figure(io.BytesIO(pack(figure_library)), tmp_path, sync)
+    assert len(list((tmp_path / "K0104").iterdir())) == 3
+
+
+def test_unpack_rejects_truncated_bundles(figure_library: Path, tmp_path: Path) -> None:
+    with pytest.raises(BundleError, match="truncated"):
+        unpack_figure(io.BytesIO(pack(figure_library)[:-10]), tmp_path)
+
+    assert not (tmp_path / "K0104").exists()
+
+
+def test_unpack_refuses_existing_figures(figure_library: Path) -> None:
+    with pytest.raises(FigureExistsError, match="K0104"):
+        unpack_figure(io.BytesIO(pack(figure_library)), figure_library)
+
+
+@pytest.mark.parametrize(
+    "changes,problem",
+    [
+        ({"tracks": [{"name": "../CP01.MKI", "offset": 0, "size": 0, "sha256": ""}]}, "name"),
+        ({"figure_id": "12345"}, "figure ID"),
+        ({"device": "faba-plus"}, "Unknown device"),
+        ({"tracks": None}, "Malformed"),
+    ],
+)
+def test_read_bundle_index_rejects_malformed_indexes(
+    changes: dict[str, object], problem: str
+) -> None:
+    index = json.dumps({"figure_id": "0104", "device": "faba", "tracks": []} | changes).encode()
+    header = struct.pack("<8sII", BUNDLE_MAGIC, 1, len(index))
+
+    with pytest.raises(BundleError, match=problem):
+        read_bundle_index(io.BytesIO(header + index))
+
+
+def test_read_bundle_index_rejects_other_files() -> None:
+    with pytest.raises(BundleError, match="Not a figure bundle"):
+        read_bundle_index(io.BytesIO(b"ID3" + bytes(100)))
+
+
+def test_pack_needs_tracks(tmp_path: Path) -> None:
+    with pytest.raises(TrackNotFoundError, match="K0104"):
+        build_bundle_index("0104", tmp_path)
@@ -1,3 +1,5 @@
+import json
+import shutil
 from pathlib import Path
 from unittest.mock import Mock
 
@@ -5,7 +7,17 @@ import pytest
 from pytest import MonkeyPatch
 from typer.testing import CliRunner
 
-from openfaba.cli import app, normalize_figure_id
+from openfaba.cli import app, expand_figure_ids, normalize_figure_id
+from openfaba.codec import CodecEngine
+from openfaba.exceptions import (
+    BatchConversionError,
+    ConversionError,
+    ConversionFailure,
+    TaggingError,
+)
+from openfaba.figures import FigureIndex, build_figure_index
+from openfaba.planner import LibraryPlan, PlannedTrack
+from openfaba.selftest import EngineReport
 
 runner = CliRunner()
 
@@ -346,7 +358,7 @@ def test_replace_fails_when_no_mp3_files_found(
 
 
 def test_extract_success(monkeypatch: MonkeyPatch, fake_faba_library: Path, tmp_path: Path) -> None:
-    monkeypatch.setattr("openfaba.cli.deobfuscate_figure_mki_files", lambda *_: 3)
+    monkeypatch.setattr("openfaba.cli.deobfuscate_figures", lambda *_: {"0001": 3})
 
     output = tmp_path / "out"
 
@@ -388,7 +400,7 @@ def test_extract_invalid_figure_id() -> None:
 def test_extract_fails_when_no_mki_files_found(
     monkeypatch: MonkeyPatch, fake_faba_library: Path, tmp_path: Path
 ) -> None:
-    monkeypatch.setattr("openfaba.cli.deobfuscate_figure_mki_files", lambda *_: 0)
+    monkeypatch.setattr("openfaba.cli.deobfuscate_figures", lambda *_: {"0001": 0})
 
     result = runner.invoke(
         app,
@@ -407,13 +419,94 @@ def test_extract_fails_when_no_mki_files_found(
     assert "No MKI files found" in result.stdout
 
 
+@pytest.mark.parametrize(
+    "values,expected",
+    [
+        (["1", "0003"], ["0001", "0003"]),
+        (["0100-0102", "101"], ["0100", "0101", "0102"]),
+        (["7-7"], ["0007"]),
+        (["0102-0100"], None),
+        (["1-x"], None),
+    ],
+)
+def test_expand_figure_ids(values: list[str], expected: list[str] | None) -> None:
+    assert expand_figure_ids(values) == expected
+
+
+def test_extract_many_figures(mki_library: Path, tmp_path: Path) -> None:
+    (figure_file := tmp_path / "figures.txt").write_text("# returned devices\n3001\n\n0001-0002\n")
+
+    options = ["-b", str(mki_library), "-o", str(tmp_path / "out")]
+
+    result = runner.invoke(
+        app, ["extract", "-f", "3001", "--figure-file", str(figure_file), *options]
+    )
+
+    assert result.exit_code == 0
+    assert "Extracted 1 figures. Converted 1 files." in result.stdout
+    assert "No MKI files found for 2 figures: K0001, K0002" in result.stdout
+    assert (tmp_path / "out" / "K3001" / "CP01.mp3").exists()
+
+
+def test_extract_requires_a_figure(mki_library: Path, tmp_path: Path) -> None:
+    result = runner.invoke(app, ["extract", "-b", str(mki_library), "-o", str(tmp_path)])
+
+    assert result.exit_code == 1
+    assert "Give at least one --figure-id" in result.stdout
+
+
+def test_extract_lists_failed_figures(
+    monkeypatch: MonkeyPatch, mki_library: Path, tmp_path: Path
+) -> None:
+    failure = BatchConversionError(2, [ConversionFailure("K0002", "Broken")])
+    monkeypatch.setattr("openfaba.cli.deobfuscate_figures", Mock(side_effect=failure))
+
+    result = runner.invoke(
+        app, ["extract", "-f", "1-3", "-b", str(mki_library), "-o", str(tmp_path)]
+    )
+
+    assert result.exit_code == 1
+    assert "K0002: Broken" in result.stdout
+
+
+## `cat`
+
+
+def test_cat_streams_track_to_stdout(mki_library: Path, mp3_library: Path) -> None:
+    result = runner.invoke(
+        app,
+        ["cat", "--figure-id", "3001", "--faba-library", str(mki_library), "--track", "1"],
+    )
+
+    assert result.exit_code == 0
+    assert result.stdout_bytes == (mp3_library / "K3001" / "CP01.mp3").read_bytes()
+
+
+def test_cat_fails_when_track_not_found(mki_library: Path) -> None:
+    result = runner.invoke(
+        app,
+        ["cat", "--figure-id", "3001", "--faba-library", str(mki_library), "--track", "7"],
+    )
+
+    assert result.exit_code == 1
+    assert result.stdout_bytes == b""
+    assert "No MKI files found for figure K3001 track 7" in result.stderr
+
+
+def test_cat_invalid_figure_id() -> None:
+    result = runner.invoke(app, ["cat", "--figure-id", "nope", "--faba-library", "."])
+
+    assert result.exit_code == 1
+    assert "figure-id must be a 4-digit number" in result.stderr
+
+
 ## `obfuscate`
 
 
 def test_obfuscate_library(
     monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
 ) -> None:
-    monkeypatch.setattr("openfaba.cli.obfuscate_mp3_library", lambda *_: 5)
+    monkeypatch.setattr("openfaba.cli.obfuscate_mp3_library", lambda *_, **__: 5)
 
     result = runner.invoke(
         app,
@@ -433,7 +526,7 @@ def test_obfuscate_library(
 def test_obfuscate_fails_when_no_mp3_files_found(
     monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
 ) -> None:
-    monkeypatch.setattr("openfaba.cli.obfuscate_mp3_library", lambda *_: 0)
+    monkeypatch.setattr("openfaba.cli.obfuscate_mp3_library", lambda *_, **__: 0)
 
     result = runner.invoke(
         app,
@@ -450,13 +543,73 @@ def test_obfuscate_fails_when_no_mp3_files_found(
     assert "No MP3 files found" in result.stdout
 
 
+def test_obfuscate_passes_prefetch_depth(
+    monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    obfuscate = Mock(return_value=5)
+    monkeypatch.setattr("openfaba.cli.obfuscate_mp3_library", obfuscate)
+
+    result = runner.invoke(
+        app,
+        ["obfuscate", "-m", str(fake_mp3_library), "-b", str(fake_faba_library), "--prefetch", "8"],
+    )
+
+    assert result.exit_code == 0
+    assert obfuscate.call_args.kwargs["prefetch"] == 8
+
+
+## `plan`
+
+
+def test_plan_library(mp3_library: Path, tmp_path: Path) -> None:
+    result = runner.invoke(
+        app, ["plan", "-m", str(mp3_library), "-b", str(tmp_path), "--no-calibrate"]
+    )
+
+    assert result.exit_code == 0
+    assert "Figures: 1, tracks: 1" in result.stdout
+    assert "Estimated time" not in result.stdout
+    assert not any(tmp_path.iterdir())
+
+
+def test_plan_fails_when_the_library_does_not_fit(
+    monkeypatch: MonkeyPatch, mp3_library: Path, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(
+        "openfaba.cli.plan_obfuscation", Mock(return_value=LibraryPlan(tracks=[], free_space=0))
+    )
+    result = runner.invoke(app, ["plan", "-m", str(mp3_library), "-b", str(tmp_path)])
+    assert result.exit_code == 1
+    assert "No MP3 files found" in result.stdout
+
+    track = PlannedTrack(mp3_library, tmp_path / "K0001" / "CP01.MKI", 10, 10)
+    monkeypatch.setattr(
+        "openfaba.cli.plan_obfuscation",
+        Mock(return_value=LibraryPlan(tracks=[track], allocated=4096, peak=4096)),
+    )
+    result = runner.invoke(app, ["plan", "-m", str(mp3_library), "-b", str(tmp_path)])
+    assert result.exit_code == 1
+    assert "Not enough space" in result.stdout
+
+
+def test_plan_reports_errors(monkeypatch: MonkeyPatch, mp3_library: Path, tmp_path: Path) -> None:
+    monkeypatch.setattr(
+        "openfaba.cli.plan_obfuscation", Mock(side_effect=ConversionError("Cannot read K0001"))
+    )
+
+    result = runner.invoke(app, ["plan", "-m", str(mp3_library), "-b", str(tmp_path)])
+
+    assert result.exit_code == 1
+    assert "Error:" in result.stdout
+
+
 ## `deobfuscate`
 
 
 def test_deobfuscate_library(
     monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
 ) -> None:
-    monkeypatch.setattr("openfaba.cli.deobfuscate_mki_library", lambda *_: 2)
+    monkeypatch.setattr("openfaba.cli.deobfuscate_mki_library", lambda *_, **__: 2)
 
     result = runner.invoke(
         app,
@@ -473,10 +626,32 @@ def test_deobfuscate_library(
     assert "Converted 2 files" in result.stdout
 
 
+def test_deobfuscate_library_resume(
+    monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    deobfuscate = Mock(return_value=2)
+    monkeypatch.setattr("openfaba.cli.deobfuscate_mki_library", deobfuscate)
+
+    result = runner.invoke(
+        app,
+        [
+            "deobfuscate",
+            "--faba-library",
+            str(fake_faba_library),
+            "--mp3-library",
+            str(fake_mp3_library),
+            "--resume",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert deobfuscate.call_args.kwargs["resume"] is True
+
+
 def test_deobfuscate_fails_when_no_mki_files_found(
     monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
 ) -> None:
-    monkeypatch.setattr("openfaba.cli.deobfuscate_mki_library", lambda *_: 0)
+    monkeypatch.setattr("openfaba.cli.deobfuscate_mki_library", lambda *_, **__: 0)
 
     result = runner.invoke(
         app,
@@ -491,3 +666,412 @@ def test_deobfuscate_fails_when_no_mki_files_found(
 
     assert result.exit_code == 1
     assert "No MKI files found" in result.stdout
+
+
+## `watch`
+
+
+def test_watch_stops_on_keyboard_interrupt(
+    monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    watcher = Mock(side_effect=KeyboardInterrupt)
+    monkeypatch.setattr("openfaba.cli.watch_mp3_library", watcher)
+
+    result = runner.invoke(
+        app,
+        [
+            "watch",
+            "--mp3-library",
+            str(fake_mp3_library),
+            "--faba-library",
+            str(fake_faba_library),
+            "--polling",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert "Stopped watching." in result.stdout
+    assert watcher.call_args.kwargs["use_inotify"] is False
+
+
+def test_unknown_device_is_rejected(mki_library: Path, tmp_path: Path) -> None:
+    result = runner.invoke(
+        app,
+        ["extract", "-f", "3001", "-b", str(mki_library), "-o", str(tmp_path), "--device", "x"],
+    )
+
+    assert result.exit_code == 2
+    assert "Unknown device 'x'" in result.output
+
+
+def test_device_is_passed_to_conversion(
+    monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    obfuscate = Mock(return_value=1)
+    monkeypatch.setattr("openfaba.cli.obfuscate_mp3_library", obfuscate)
+
+    result = runner.invoke(
+        app,
+        [
+            "obfuscate",
+            "--mp3-library",
+            str(fake_mp3_library),
+            "--faba-library",
+            str(fake_faba_library),
+            "--device",
+            "faba",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert obfuscate.call_args.kwargs["device"] == "faba"
+
+
+def test_checksum_options_are_passed(
+    monkeypatch: MonkeyPatch, fake_source_dir: Path, fake_faba_library: Path
+) -> None:
+    monkeypatch.setattr("openfaba.cli.collect_all_mp3_files_in_folder", lambda _: [Path("a.mp3")])
+    obfuscate = Mock()
+    monkeypatch.setattr("openfaba.cli.obfuscate_figure_mp3_files", obfuscate)
+
+    result = runner.invoke(
+        app,
+        [
+            "insert",
+            "--figure-id",
+            "1",
+            "--source",
+            str(fake_source_dir),
+            "--faba-library",
+            str(fake_faba_library),
+            "--verify",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert obfuscate.call_args.kwargs["checksum"] is False
+    assert obfuscate.call_args.kwargs["verify"] is True
+
+
+def test_insert_writes_to_several_libraries(
+    monkeypatch: MonkeyPatch, fake_source_dir: Path, tmp_path: Path
+) -> None:
+    monkeypatch.setattr("openfaba.cli.collect_all_mp3_files_in_folder", lambda _: [Path("a.mp3")])
+    obfuscate = Mock()
+    monkeypatch.setattr("openfaba.cli.obfuscate_figure_mp3_files", obfuscate)
+    libraries = [tmp_path / "card1", tmp_path / "card2"]
+    for library in libraries:
+        library.mkdir()
+
+    result = runner.invoke(
+        app,
+        [
+            "insert",
+            "--figure-id",
+            "1",
+            "--source",
+            str(fake_source_dir),
+            "-b",
+            str(libraries[0]),
+            "-b",
+            str(libraries[1]),
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert obfuscate.call_args.args[2] == libraries[0]
+    assert obfuscate.call_args.kwargs["mirrors"] == libraries[1:]
+
+
+def test_obfuscate_resume_needs_a_single_library(
+    fake_mp3_library: Path, fake_faba_library: Path, tmp_path: Path
+) -> None:
+    result = runner.invoke(
+        app,
+        [
+            "obfuscate",
+            "--mp3-library",
+            str(fake_mp3_library),
+            "-b",
+            str(fake_faba_library),
+            "-b",
+            str(tmp_path),
+            "--resume",
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert "--resume works with a single --faba-library" in result.output
+
+
+def test_pack_and_unpack_figure(mki_library: Path, tmp_path: Path) -> None:
+    bundle = tmp_path / "figure.fabapack"
+    target = tmp_path / "target"
+    target.mkdir()
+
+    packed = runner.invoke(app, ["pack", "-f", "3001", "-b", str(mki_library), "-o", str(bundle)])
+    unpacked = runner.invoke(app, ["unpack", str(bundle), "-b", str(target)])
+
+    assert packed.exit_code == 0
+    assert "Packed 1 tracks" in packed.output
+    assert unpacked.exit_code == 0
+    assert "Installed figure K3001. Added 1 tracks." in unpacked.output
+    track = Path("K3001") / "CP01.MKI"
+    assert (target / track).read_bytes() == (mki_library / track).read_bytes()
+
+
+def test_pack_streams_to_stdout(mki_library: Path, tmp_path: Path) -> None:
+    packed = runner.invoke(app, ["pack", "-f", "3001", "-b", str(mki_library), "-o", "-"])
+
+    unpacked = runner.invoke(app, ["unpack", "-", "-b", str(tmp_path)], input=packed.stdout_bytes)
+
+    assert packed.stdout_bytes.startswith(b"FABAPACK")
+    assert unpacked.exit_code == 0
+    assert (tmp_path / "K3001" / "CP01.MKI").exists()
+
+
+def test_unpack_reports_bad_bundles(tmp_path: Path) -> None:
+    (bundle := tmp_path / "figure.fabapack").write_bytes(b"not a bundle" * 10)
+
+    result = runner.invoke(app, ["unpack", str(bundle), "-b", str(tmp_path)])
+
+    assert result.exit_code == 1
+    assert "Error: Not a figure bundle" in result.output
+
+
+@pytest.mark.parametrize(
+    "value,expected", [("1048576", 1024**2), ("512M", 512 * 1024**2), ("2gb", 2 * 1024**3)]
+)
+def test_max_memory_sets_the_budget(
+    monkeypatch: MonkeyPatch, mki_library: Path, value: str, expected: int
+) -> None:
+    set_max_memory = Mock()
+    monkeypatch.setattr("openfaba.cli.set_max_memory", set_max_memory)
+
+    result = runner.invoke(app, ["--max-memory", value, "ls", "-b", str(mki_library)])
+
+    assert result.exit_code == 0
+    set_max_memory.assert_called_once_with(expected)
+
+
+def test_max_memory_rejects_invalid_sizes(mki_library: Path) -> None:
+    result = runner.invoke(app, ["--max-memory", "lots", "ls", "-b", str(mki_library)])
+
+    assert result.exit_code == 2
+    assert "not a size" in result.output
+
+
+def test_convert_server_passes_limits(monkeypatch: MonkeyPatch) -> None:
+    serve = Mock(side_effect=KeyboardInterrupt)
+    monkeypatch.setattr("openfaba.cli.serve", serve)
+
+    result = runner.invoke(
+        app, ["convert-server", "--port", "9000", "--workers", "3", "--max-upload-mb", "1"]
+    )
+
+    assert result.exit_code == 0
+    assert "Stopped serving." in result.stdout
+    serve.assert_called_once_with("127.0.0.1", 9000, 3, 16, 1024 * 1024, "faba")
+
+
+def test_obfuscate_keep_going_reports_failures(
+    monkeypatch: MonkeyPatch, fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    failures = [ConversionFailure("K0001/b.mp3", "can't sync to MPEG frame")]
+    monkeypatch.setattr(
+        "openfaba.cli.obfuscate_mp3_library",
+        Mock(side_effect=BatchConversionError(4, failures)),
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "obfuscate",
+            "--mp3-library",
+            str(fake_mp3_library),
+            "--faba-library",
+            str(fake_faba_library),
+            "--keep-going",
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert "Converted 4 files. 1 files failed:" in result.stdout
+    assert "K0001/b.mp3: can't sync to MPEG frame" in result.stdout
+
+
+def test_insert_reports_conversion_errors(
+    monkeypatch: MonkeyPatch, fake_source_dir: Path, fake_faba_library: Path
+) -> None:
+    monkeypatch.setattr("openfaba.cli.collect_all_mp3_files_in_folder", lambda _: [Path("a.mp3")])
+    monkeypatch.setattr(
+        "openfaba.cli.obfuscate_figure_mp3_files",
+        Mock(side_effect=TaggingError("Error setting title K0001CP01")),
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "insert",
+            "--figure-id",
+            "1",
+            "--source",
+            str(fake_source_dir),
+            "--faba-library",
+            str(fake_faba_library),
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert "Error: Error setting title K0001CP01" in result.stdout
+
+
+## `diff`
+
+
+def test_diff_libraries(mki_library: Path, tmp_path: Path) -> None:
+    library_b = tmp_path / "b"
+    shutil.copytree(mki_library, library_b)
+
+    result = runner.invoke(app, ["diff", str(mki_library), str(library_b)])
+    assert result.exit_code == 0
+
+    (library_b / "K3001" / "CP01.MKI").unlink()
+    result = runner.invoke(app, ["diff", str(mki_library), str(library_b), "--json"])
+    assert result.exit_code == 1
+    assert json.loads(result.stdout)["removed_figures"] == ["K3001"]
+
+
+@pytest.fixture
+def figure_index(monkeypatch: MonkeyPatch, tmp_path: Path) -> FigureIndex:
+    csv_path = tmp_path / "figures.csv"
+    csv_path.write_text(
+        "figure_id,name,language,tracks,source_url,notes\n"
+        "0010,Ele,it,12,,Red elephant\n"
+        "3001,Test figure,,,,\n"
+    )
+    build_figure_index(csv_path, tmp_path / "figures.db")
+    index = FigureIndex(tmp_path / "figures.db")
+    monkeypatch.setattr("openfaba.cli.default_figure_index", lambda: index)
+    return index
+
+
+def test_details_prints_figure_metadata(figure_index: FigureIndex) -> None:
+    result = runner.invoke(app, ["details", "10"])
+
+    assert result.exit_code == 0
+    assert "K0010  Ele" in result.stdout
+    assert "Tracks:   12" in result.stdout
+    assert "Source" not in result.stdout
+
+
+def test_details_searches_names(figure_index: FigureIndex) -> None:
+    assert runner.invoke(app, ["details", "tes"]).stdout == "K3001  Test figure\n"
+
+    result = runner.invoke(app, ["details", "lion"])
+    assert result.exit_code == 1
+    assert "No figures found for 'lion'." in result.stdout
+
+
+@pytest.mark.usefixtures("box_device")
+def test_details_names_figures_like_the_device(figure_index: FigureIndex) -> None:
+    assert runner.invoke(app, ["details", "10", "--device", "box"]).stdout.startswith("F0010  Ele")
+    assert (
+        runner.invoke(app, ["details", "tes", "--device", "box"]).stdout == "F3001  Test figure\n"
+    )
+
+
+def test_ls_annotates_figures(figure_index: FigureIndex, mki_library: Path) -> None:
+    result = runner.invoke(app, ["ls", "--faba-library", str(mki_library)])
+
+    assert result.exit_code == 0
+    assert result.stdout.splitlines()[0].startswith("K3001    1 tracks")
+    assert result.stdout.splitlines()[0].endswith(" MB  Test figure")
+    assert result.stdout.count("K3001") == 1
+    assert "1 figures." in result.stdout
+
+
+## `coordinator` / `worker`
+
+
+def test_coordinator_and_worker_convert_a_library(mp3_library: Path, tmp_path: Path) -> None:
+    queue, faba = tmp_path / "queue.db", tmp_path / "faba"
+    options = ["-q", str(queue), "-m", str(mp3_library), "-b", str(faba)]
+
+    queued = runner.invoke(app, ["coordinator", "obfuscate", *options, "--no-wait"])
+    worked = runner.invoke(app, ["worker", "-q", str(queue)])
+    waited = runner.invoke(app, ["coordinator", "obfuscate", *options])
+
+    assert queued.exit_code == 0
+    assert f"Queued 1 files in {queue}" in queued.output
+    assert worked.exit_code == 0
+    assert "Converted 1 files" in worked.output
+    assert waited.exit_code == 0
+    assert "1 done, 0 converting, 0 pending, 0 failed" in waited.output
+    assert (faba / "K3001" / "CP01.MKI").exists()
+
+
+def test_coordinator_lists_failed_files(tmp_path: Path) -> None:
+    (tmp_path / "mp3" / "K0001").mkdir(parents=True)
+    (tmp_path / "mp3" / "K0001" / "broken.mp3").write_bytes(b"not an mp3")
+    queue = tmp_path / "queue.db"
+    options = ["-q", str(queue), "-m", str(tmp_path / "mp3"), "-b", str(tmp_path / "faba")]
+
+    runner.invoke(app, ["coordinator", "obfuscate", *options, "--max-attempts", "1", "--no-wait"])
+    runner.invoke(app, ["worker", "-q", str(queue)])
+    result = runner.invoke(app, ["coordinator", "obfuscate", *options])
+
+    assert result.exit_code == 1
+    assert "1 files failed:" in result.output
+    assert "broken.mp3" in result.output
+
+
+def test_coordinator_requires_the_source_library(tmp_path: Path) -> None:
+    queue, missing = tmp_path / "queue.db", tmp_path / "missing"
+    options = ["-q", str(queue), "-m", str(tmp_path), "-b", str(missing)]
+
+    result = runner.invoke(app, ["coordinator", "deobfuscate", *options])
+
+    assert result.exit_code == 1
+    assert "does not exist" in result.output
+    assert not queue.exists()
+
+
+def test_worker_requires_a_queue(tmp_path: Path) -> None:
+    result = runner.invoke(app, ["worker", "-q", str(tmp_path / "queue.db")])
+
+    assert result.exit_code == 1
+    assert "Error: No work queue" in result.output
+
+
+## `selftest` / `--engine`
+
+
+def test_selftest_reports_every_engine() -> None:
+    result = runner.invoke(app, ["selftest", "--rounds", "2", "--seed", "1"])
+
+    assert result.exit_code == 0
+    assert "Seed: 1" in result.output
+    assert "table: 21 checks, OK" in result.output
+    assert "parallel:" in result.output
+
+
+def test_selftest_fails_on_mismatches(monkeypatch: MonkeyPatch) -> None:
+    report = EngineReport(CodecEngine.TABLE, 3, ("all bytes at offset 0: encoding differs",))
+    monkeypatch.setattr("openfaba.cli.run_selftest", lambda *_: [report])
+
+    result = runner.invoke(app, ["selftest"])
+
+    assert result.exit_code == 1
+    assert "table: 3 checks, 1 mismatches" in result.output
+    assert "  all bytes at offset 0: encoding differs" in result.output
+
+
+def test_engine_is_selected_for_the_run(monkeypatch: MonkeyPatch, mki_library: Path) -> None:
+    set_engine = Mock()
+    monkeypatch.setattr("openfaba.cli.set_engine", set_engine)
+
+    result = runner.invoke(app, ["--engine", "reference", "ls", "-b", str(mki_library)])
+
+    assert result.exit_code == 0
+    set_engine.assert_called_once_with(CodecEngine.REFERENCE)
@@ -0,0 +1,136 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from openfaba import codec
+from openfaba.codec import (
+    Codec,
+    CodecEngine,
+    DeviceProfile,
+    _faba_encode_byte,
+    device_names,
+    get_codec,
+    get_device,
+    reference_translate,
+)
+from openfaba.consts import BYTE_HIGH_NIBBLE, BYTE_LOW_NIBBLE_EVEN, BYTE_LOW_NIBBLE_ODD
+from openfaba.io import convert_mki_to_mp3
+from openfaba.media import (
+    deobfuscate_mki_library,
+    figure_id_for_mp3_file,
+    obfuscate_figure_mp3_files,
+    obfuscate_mp3_library,
+)
+
+
+def reference_encode(data: bytes, offset: int = 0) -> bytes:
+    """The original byte-by-byte transform of the Faba box"""
+    output = bytearray()
+    for position, byte in enumerate(data, start=offset):
+        low_nibbles = BYTE_LOW_NIBBLE_EVEN if byte % 2 == 0 else BYTE_LOW_NIBBLE_ODD
+        phase = position % 4
+        output.append(BYTE_HIGH_NIBBLE[phase][byte % 32] + low_nibbles[phase][byte // 32])
+    return bytes(output)
+
+
+@pytest.mark.parametrize("offset", [0, 1, 2, 3, 4, 1001])
+def test_faba_codec_matches_reference(offset: int) -> None:
+    data = os.urandom(4099)
+
+    encoded = get_codec().encode(data, offset)
+
+    assert encoded == reference_encode(data, offset)
+    assert get_codec().decode(encoded, offset) == data
+
+
+def test_chunked_encoding_matches_whole_file() -> None:
+    data = os.urandom(1000)
+    codec = get_codec()
+
+    chunks = [codec.encode(data[start : start + 333], start) for start in range(0, 1000, 333)]
+
+    assert b"".join(chunks) == codec.encode(data)
+
+
+def test_codec_is_compiled_once() -> None:
+    assert get_codec("faba") is get_codec("faba")
+
+
+def test_codec_rejects_irreversible_transform() -> None:
+    with pytest.raises(ValueError, match="not reversible"):
+        Codec(DeviceProfile("lossy", lambda byte, phase: byte // 2))
+
+
+def test_get_device_rejects_unknown_names() -> None:
+    with pytest.raises(ValueError, match="Unknown device 'faba-plus'"):
+        get_device("faba-plus")
+
+
+def test_faba_profile_layout() -> None:
+    profile = get_device("faba")
+
+    assert profile.figure_folder("0104") == "K0104"
+    assert profile.track_file(3) == "CP03.MKI"
+    assert profile.track_title("0104", 3) == "K0104CP03"
+    assert profile.encode_byte is _faba_encode_byte
+
+
+def test_registered_device_is_used_end_to_end(
+    box_device: DeviceProfile, mp3_library: Path, tmp_path: Path
+) -> None:
+    mp3_files = sorted((mp3_library / "K3001").glob("*.mp3"))
+    faba_library = tmp_path / "library"
+    output = tmp_path / "mp3"
+    output.mkdir()
+
+    obfuscate_figure_mp3_files("0042", mp3_files, faba_library, device="box")
+    converted = deobfuscate_mki_library(faba_library, output, device="box")
+
+    assert "box" in device_names()
+    assert sorted(p.name for p in (faba_library / "F0042").iterdir()) == [
+        f"CP{n:02d}.BOX" for n in range(1, len(mp3_files) + 1)
+    ]
+    assert converted == len(mp3_files)
+    assert deobfuscate_mki_library(faba_library, output, device="faba") == 0
+
+
+def test_registered_device_names_source_figures(
+    box_device: DeviceProfile, mp3_library: Path, tmp_path: Path
+) -> None:
+    (source := tmp_path / "mp3" / "F0042").mkdir(parents=True)
+    shutil.copy(mp3_library / "K3001" / "CP01.mp3", source)
+    faba_library = tmp_path / "library"
+    faba_library.mkdir()
+
+    obfuscate_mp3_library(source.parent, faba_library, device="box")
+
+    assert [p.name for p in faba_library.iterdir()] == ["F0042"]
+    assert figure_id_for_mp3_file(source / "CP01.mp3", device="box") == "0042"
+    assert figure_id_for_mp3_file(source / "CP01.mp3") == "0000"
+
+
+@pytest.mark.parametrize("offset", [0, 3, 1001])
+def test_reference_engine_is_the_original_transform(offset: int) -> None:
+    data = os.urandom(1027)
+
+    encoded = reference_translate(get_device(), data, offset)
+
+    assert encoded == reference_encode(data, offset)
+    assert reference_translate(get_device(), encoded, offset, decode=True) == data
+
+
+def test_codec_uses_the_selected_engine(
+    monkeypatch: pytest.MonkeyPatch, mki_library: Path, tmp_path: Path
+) -> None:
+    mki_file = mki_library / "K3001" / "CP01.MKI"
+    table_file = tmp_path / "table.mp3"
+    convert_mki_to_mp3(mki_file, table_file)
+    monkeypatch.setattr(codec, "_engine", CodecEngine.REFERENCE)
+    # The lookup tables must not be used at all
+    monkeypatch.setattr(codec, "translate", None)
+
+    convert_mki_to_mp3(mki_file, reference_file := tmp_path / "reference.mp3")
+
+    assert reference_file.read_bytes() == table_file.read_bytes()
@@ -0,0 +1,44 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from openfaba.diff import diff_mki_libraries, format_library_diff
+
+
+@pytest.fixture
+def library_pair(mki_library: Path, tmp_path: Path) -> tuple[Path, Path]:
+    library_a = tmp_path / "a"
+    shutil.copytree(mki_library, library_a)
+    shutil.copytree(library_a / "K3001", library_a / "K0001")
+    shutil.copytree(library_a / "K3001", library_a / "K0002")
+    (library_a / "K3001" / "CP02.MKI").write_bytes(b"abcd")
+    library_b = tmp_path / "b"
+    shutil.copytree(library_a, library_b)
+    return library_a, library_b
+
+
+def test_identical_libraries(library_pair: tuple[Path, Path]) -> None:
+    library_diff = diff_mki_libraries(*library_pair)
+
+    assert not library_diff
+    assert format_library_diff(library_diff).endswith("Tracks: 0 added, 0 removed, 0 changed.")
+
+
+def test_diff_reports_added_removed_and_changed(library_pair: tuple[Path, Path]) -> None:
+    library_a, library_b = library_pair
+    shutil.rmtree(library_b / "K0001")
+    shutil.copytree(library_b / "K0002", library_b / "K0003")
+    (library_b / "K3001" / "CP02.MKI").write_bytes(b"abce")  # Same size, different bytes
+    (library_b / "K3001" / "CP03.MKI").write_bytes(b"abcd")
+    (library_b / "K0002" / "CP01.MKI").write_bytes(b"short")
+
+    library_diff = diff_mki_libraries(library_a, library_b, workers=2)
+
+    assert library_diff.added_figures == ["K0003"]
+    assert library_diff.removed_figures == ["K0001"]
+    assert library_diff.changed_figures == ["K0002", "K3001"]
+    assert library_diff.added_tracks == ["K0003/CP01.MKI", "K3001/CP03.MKI"]
+    assert library_diff.removed_tracks == ["K0001/CP01.MKI"]
+    assert library_diff.changed_tracks == ["K0002/CP01.MKI", "K3001/CP02.MKI"]
+    assert "~ K3001/CP02.MKI" in format_library_diff(library_diff).splitlines()
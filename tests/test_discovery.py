@@ -0,0 +1,65 @@
+from pathlib import Path
+
+from openfaba.discovery import iter_files, iter_mki_files, iter_mp3_files, list_figure_mki_files
+
+
+def _touch(root: Path, *relative_paths: str) -> None:
+    for relative_path in relative_paths:
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"data")
+
+
+def test_iter_mp3_files_matches_sorted_paths(tmp_path: Path) -> None:
+    _touch(
+        tmp_path,
+        "b.mp3",
+        "a/K0002/02.MP3",
+        "a/K0002/01.mp3",
+        "a.mp3",
+        "a-b/c.mp3",
+        "a/cover.jpg",
+        ".Trashes/old.mp3",
+    )
+
+    found = list(iter_mp3_files(tmp_path))
+
+    expected = sorted(
+        tmp_path / p for p in ("b.mp3", "a/K0002/02.MP3", "a/K0002/01.mp3", "a.mp3", "a-b/c.mp3")
+    )
+    assert [f.path for f in found] == expected
+    assert all(f.size == 4 for f in found)
+
+
+def test_iter_files_reports_walked_directories(tmp_path: Path) -> None:
+    _touch(tmp_path, "K0001/a.mp3", "K0002/sub/b.mp3")
+    directories: list[Path] = []
+
+    list(iter_files(tmp_path, ".mp3", on_directory=directories.append))
+
+    assert directories == [tmp_path, tmp_path / "K0001", tmp_path / "K0002", tmp_path / "K0002/sub"]
+
+
+def test_iter_mki_files_prunes_non_figure_folders(tmp_path: Path) -> None:
+    _touch(
+        tmp_path,
+        "K0001/CP01.MKI",
+        "K0001/CP02.mki",
+        "K0001/backup/CP01.MKI",
+        "K12345/CP01.MKI",
+        "other/K0002/CP01.MKI",
+        "CP01.MKI",
+    )
+
+    found = [f.path.relative_to(tmp_path).as_posix() for f in iter_mki_files(tmp_path)]
+
+    assert found == ["K0001/CP01.MKI", "K0001/CP02.mki"]
+
+
+def test_list_figure_mki_files(tmp_path: Path) -> None:
+    _touch(tmp_path, "K0001/CP02.MKI", "K0001/CP01.MKI", "K0001/notes.txt")
+
+    found = list_figure_mki_files(tmp_path / "K0001")
+
+    assert [f.path.name for f in found] == ["CP01.MKI", "CP02.MKI"]
+    assert list_figure_mki_files(tmp_path / "K0002") == []
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import pytest
+
+from openfaba.figures import (
+    CSV_FIELDS,
+    FIGURES_CSV,
+    FigureIndex,
+    FigureMetadata,
+    build_figure_index,
+    default_figure_index,
+    packaged_data,
+    read_figures_csv,
+)
+
+
+def write_csv(path: Path, rows: list[str]) -> Path:
+    path.write_text("\n".join([",".join(CSV_FIELDS), *rows]) + "\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def figure_index(tmp_path: Path) -> FigureIndex:
+    rows = [f"{n:04d},Figure {n},en,{n % 20},," for n in range(1, 901) if n != 10]
+    rows += ["0010,Ele,it,12,https://example.com/ele,Red elephant", "4742,élan,fr,,,"]
+    csv_path = write_csv(tmp_path / "figures.csv", rows)
+    build_figure_index(csv_path, tmp_path / "figures.db")
+    return FigureIndex(tmp_path / "figures.db")
+
+
+def test_packaged_index_is_up_to_date() -> None:
+    assert default_figure_index().all() == read_figures_csv(packaged_data(FIGURES_CSV))
+
+
+def test_get_returns_metadata(figure_index: FigureIndex) -> None:
+    assert figure_index.get("0010") == FigureMetadata(
+        "0010", "Ele", "it", 12, "https://example.com/ele", "Red elephant"
+    )
+    assert figure_index.get("0003") == FigureMetadata("0003", "Figure 3", "en", 3)
+    assert figure_index.get("9999") is None
+
+
+def test_search_by_id_and_name_prefix(figure_index: FigureIndex) -> None:
+    by_id = figure_index.search("089")
+    by_name = figure_index.search("ÉL")
+
+    assert [figure.figure_id for figure in by_id] == [f"{n:04d}" for n in range(890, 900)]
+    assert [figure.figure_id for figure in by_name] == ["4742"]
+    assert len(figure_index.search("figure", limit=5)) == 5
+    assert figure_index.search("  ") == []
+
+
+def test_annotate_looks_up_many_figures(figure_index: FigureIndex) -> None:
+    annotated = figure_index.annotate(["0010", "0900", "9999"])
+
+    assert sorted(annotated) == ["0010", "0900"]
+    assert annotated["0010"].name == "Ele"
+
+
+@pytest.mark.parametrize(
+    "rows,problem",
+    [
+        (["104,Short,,,,"], "4 digits"),
+        (["0104,One,,,,", "0104,Two,,,,"], "listed twice"),
+    ],
+)
+def test_read_figures_csv_rejects_malformed_rows(
+    tmp_path: Path, rows: list[str], problem: str
+) -> None:
+    with pytest.raises(ValueError, match=problem):
+        read_figures_csv(write_csv(tmp_path / "figures.csv", rows))
+
+
+def test_read_figures_csv_rejects_unknown_columns(tmp_path: Path) -> None:
+    (csv_path := tmp_path / "figures.csv").write_text("id,name\n0104,Lion\n")
+
+    with pytest.raises(ValueError, match="columns"):
+        read_figures_csv(csv_path)
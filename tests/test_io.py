@@ -0,0 +1,63 @@
+import shutil
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from mutagen.id3 import ID3, TPE1
+
+from openfaba.exceptions import ConversionError, TaggingError
+from openfaba.io import (
+    clear_tags_and_set_title,
+    convert_mki_to_mp3,
+    convert_mp3_to_mki,
+    iter_mki_to_mp3_chunks,
+    stream_mp3_to_mki,
+)
+
+
+def test_clear_tags_raises_tagging_error_on_invalid_mp3(tmp_path: Path) -> None:
+    mp3_file = tmp_path / "broken.mp3"
+    mp3_file.write_bytes(b"not an mp3")
+
+    with pytest.raises(TaggingError, match="K0001CP01"):
+        clear_tags_and_set_title(mp3_file, "K0001CP01")
+
+
+def test_convert_raises_conversion_error_on_io_failure(tmp_path: Path) -> None:
+    with pytest.raises(ConversionError):
+        convert_mki_to_mp3(tmp_path / "missing.MKI", tmp_path / "out.mp3")
+
+
+def test_iter_mki_to_mp3_chunks_matches_whole_file_conversion(
+    mki_library: Path, mp3_library: Path
+) -> None:
+    mki_file = mki_library / "K3001" / "CP01.MKI"
+    chunks = list(iter_mki_to_mp3_chunks(mki_file, chunk_size=1001))
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == (mp3_library / "K3001" / "CP01.mp3").read_bytes()
+
+
+@pytest.mark.parametrize("title", ["K3001CP01", "K0042CP07"])
+def test_stream_mp3_to_mki_matches_in_memory_conversion(
+    mp3_library: Path, tmp_path: Path, title: str
+) -> None:
+    mp3_file = tmp_path / "tagged.mp3"
+    shutil.copy(mp3_library / "K3001" / "CP01.mp3", mp3_file)
+    tags = ID3(mp3_file)
+    tags.add(TPE1(encoding=3, text=["Artist"]))
+    tags.save(mp3_file, v1=2, padding=lambda _: 300)
+    retitled = BytesIO(mp3_file.read_bytes())
+    clear_tags_and_set_title(retitled, title)
+    loaded = convert_mp3_to_mki(retitled, tmp_path / "loaded.MKI", hash_source=True)
+
+    with mp3_file.open("rb") as mp3_stream:
+        streamed = stream_mp3_to_mki(mp3_stream, tmp_path / "streamed.MKI", title, hash_source=True)
+
+    assert streamed == loaded
+    assert (tmp_path / "streamed.MKI").read_bytes() == (tmp_path / "loaded.MKI").read_bytes()
+
+
+def test_stream_mp3_to_mki_raises_tagging_error_on_invalid_mp3(tmp_path: Path) -> None:
+    with pytest.raises(TaggingError, match="K0001CP01"):
+        stream_mp3_to_mki(BytesIO(b"not an mp3"), tmp_path / "out.MKI", "K0001CP01")
@@ -0,0 +1,74 @@
+import filecmp
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from openfaba.exceptions import ConversionError
+from openfaba.iopolicy import DIRECT_ALIGNMENT, DirectFile, IoPolicy, drop_cached_pages
+from openfaba.media import deobfuscate_mki_library, obfuscate_mp3_library
+from openfaba.writer import OutputWriter
+
+
+def test_direct_file_writes_unaligned_tail(tmp_path: Path) -> None:
+    target = tmp_path / "CP01.MKI"
+    data = bytes(range(256)) * (DIRECT_ALIGNMENT // 64 + 3)
+    try:
+        direct_file = DirectFile(target)
+    except OSError:
+        pytest.skip("The temporary filesystem does not support O_DIRECT")
+
+    with direct_file:
+        direct_file.write(data)
+
+    assert target.read_bytes() == data
+
+
+@pytest.mark.parametrize("io_policy", list(IoPolicy))
+def test_output_writer_io_policies_write_same_bytes(tmp_path: Path, io_policy: IoPolicy) -> None:
+    target = tmp_path / "CP01.MKI"
+    data = b"0123456789" * 100_000
+
+    with OutputWriter(io_policy=io_policy, block_size=64 * 1024).open(target, len(data)) as out:
+        out.write(data)
+
+    assert target.read_bytes() == data
+    assert out.digest.size == len(data)
+
+
+@pytest.mark.parametrize("io_policy", [IoPolicy.STREAM, IoPolicy.DIRECT])
+def test_library_round_trip_with_io_policy(
+    mki_library: Path, tmp_path: Path, io_policy: IoPolicy
+) -> None:
+    mp3_library = tmp_path / "mp3"
+    faba_library = tmp_path / "MKI01"
+    mp3_library.mkdir()
+    faba_library.mkdir()
+
+    deobfuscate_mki_library(mki_library, mp3_library, io_policy=io_policy)
+    obfuscate_mp3_library(mp3_library, faba_library, io_policy=io_policy)
+
+    for original in mki_library.rglob("*.MKI"):
+        assert filecmp.cmp(original, faba_library / original.relative_to(mki_library), False)
+
+
+def test_drop_cached_pages_ignores_unsupported_descriptors(tmp_path: Path) -> None:
+    drop_cached_pages(-1)
+
+
+def test_openfaba_imports_without_fcntl(monkeypatch: pytest.MonkeyPatch) -> None:
+    for name in [name for name in sys.modules if name.startswith("openfaba")]:
+        monkeypatch.delitem(sys.modules, name)
+    # As on Windows, where the module doesn't exist
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+
+    importlib.import_module("openfaba.cli")
+
+
+def test_direct_io_policy_fails_clearly_without_o_direct(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delattr(os, "O_DIRECT", raising=False)
+
+    with pytest.raises(ConversionError, match="O_DIRECT"):
+        OutputWriter(io_policy=IoPolicy.DIRECT)
@@ -0,0 +1,115 @@
+import shutil
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from pytest import MonkeyPatch
+
+from openfaba.exceptions import ConversionError
+from openfaba.io import convert_mki_to_mp3
+from openfaba.journal import JOURNAL_NAME, ConversionJournal
+from openfaba.media import deobfuscate_mki_library
+from openfaba.writer import OutputDigest, OutputWriter
+
+
+@pytest.fixture
+def two_figure_library(mki_library: Path, fake_faba_library: Path) -> Path:
+    for figure in ("K0001", "K0002"):
+        (fake_faba_library / figure).mkdir()
+        shutil.copy(mki_library / "K3001" / "CP01.MKI", fake_faba_library / figure / "CP01.MKI")
+    return fake_faba_library
+
+
+def test_journal_records_and_resumes(fake_mp3_library: Path) -> None:
+    source = Path("K0001/CP01.MKI")
+    target = fake_mp3_library / "CP01.mp3"
+    target.write_bytes(b"abcd")
+
+    with pytest.raises(RuntimeError), ConversionJournal(fake_mp3_library) as journal:
+        journal.record(source, target, OutputDigest(4, "00"))
+        raise RuntimeError("interrupted")
+
+    # A truncated trailing line is ignored
+    with (fake_mp3_library / JOURNAL_NAME).open("a") as journal_file:
+        journal_file.write('{"target": "CP0')
+
+    with ConversionJournal(fake_mp3_library, resume=True) as journal:
+        assert journal.is_complete(source, target)
+        assert not journal.is_complete(Path("other.MKI"), target)
+        target.write_bytes(b"abc")
+        assert not journal.is_complete(source, target)
+
+    assert not (fake_mp3_library / JOURNAL_NAME).exists()
+
+
+def test_journal_without_resume_starts_over(fake_mp3_library: Path) -> None:
+    target = fake_mp3_library / "CP01.mp3"
+    target.write_bytes(b"abcd")
+    (fake_mp3_library / JOURNAL_NAME).write_text(
+        '{"target": "CP01.mp3", "source": "a", "size": 4, "sha256": "00"}\n'
+    )
+    (fake_mp3_library / ".CP02.mp3.part").write_bytes(b"half")
+
+    with ConversionJournal(fake_mp3_library) as journal:
+        assert not journal.is_complete(Path("a"), target)
+        assert not (fake_mp3_library / ".CP02.mp3.part").exists()
+
+
+def test_journal_keeps_files_it_did_not_create(fake_mp3_library: Path) -> None:
+    (fake_mp3_library / "K0001").mkdir()
+    (fake_mp3_library / "K0001" / "CP01.mp3").write_bytes(b"abcd")
+    (fake_mp3_library / JOURNAL_NAME).write_text(
+        '{"target": "K0001/CP01.mp3", "source": "a", "size": 4, "sha256": "00"}\n'
+    )
+    user_files = [
+        fake_mp3_library / ".download.mp3.part",
+        fake_mp3_library / "K0001" / ".notes.txt.part",
+    ]
+    for user_file in user_files:
+        user_file.write_bytes(b"mine")
+    (fake_mp3_library / "K0001" / ".CP02.mp3.part").write_bytes(b"half")
+
+    with ConversionJournal(fake_mp3_library, resume=True):
+        assert not (fake_mp3_library / "K0001" / ".CP02.mp3.part").exists()
+
+    assert all(user_file.exists() for user_file in user_files)
+
+
+def test_deobfuscate_library_resumes_after_interruption(
+    monkeypatch: MonkeyPatch, two_figure_library: Path, fake_mp3_library: Path
+) -> None:
+    def convert_then_fail(
+        mki_file: Path, mp3_file: Path, writer: OutputWriter | None = None, device: str = "faba"
+    ) -> OutputDigest:
+        if mki_file.parent.name == "K0002":
+            raise ConversionError("disk full")
+        return convert_mki_to_mp3(mki_file, mp3_file, writer, device)
+
+    monkeypatch.setattr("openfaba.media.convert_mki_to_mp3", convert_then_fail)
+    with pytest.raises(ConversionError):
+        deobfuscate_mki_library(two_figure_library, fake_mp3_library)
+    assert (fake_mp3_library / JOURNAL_NAME).exists()
+
+    converter = Mock(wraps=convert_mki_to_mp3)
+    monkeypatch.setattr("openfaba.media.convert_mki_to_mp3", converter)
+    converted = deobfuscate_mki_library(two_figure_library, fake_mp3_library, resume=True)
+
+    assert converted == 2
+    assert converter.call_count == 1
+    assert converter.call_args.args[0].parent.name == "K0002"
+    assert not (fake_mp3_library / JOURNAL_NAME).exists()
+    assert (fake_mp3_library / "K0001" / "CP01.mp3").read_bytes() == (
+        fake_mp3_library / "K0002" / "CP01.mp3"
+    ).read_bytes()
+
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_deobfuscate_library_creates_the_output_folder(
+    mki_library: Path, tmp_path: Path, resume: bool
+) -> None:
+    output = tmp_path / "new" / "mp3"
+
+    assert deobfuscate_mki_library(mki_library, output, resume=resume) == 1
+
+    assert [path.name for path in output.rglob("*.mp3")] == ["CP01.mp3"]
+    assert not (output / JOURNAL_NAME).exists()
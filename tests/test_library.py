@@ -0,0 +1,86 @@
+import filecmp
+from pathlib import Path
+
+import pytest
+
+from openfaba import Library
+from openfaba.exceptions import FigureExistsError, TrackNotFoundError
+
+
+@pytest.fixture
+def figure_sources(mp3_library: Path) -> Path:
+    return mp3_library / "K3001"
+
+
+def test_figures_are_indexed_lazily(mki_library: Path) -> None:
+    with Library(mki_library) as library:
+        figures = library.figures()
+
+    assert [figure.figure_id for figure in figures] == ["3001"]
+    assert [track.number for track in figures[0].tracks] == [1]
+    assert figures[0].size == (mki_library / "K3001" / "CP01.MKI").stat().st_size
+    assert "3001" in library
+    assert "0001" not in library
+
+
+def test_insert_extend_and_replace_update_the_index(
+    fake_faba_library: Path, figure_sources: Path
+) -> None:
+    with Library(fake_faba_library) as library:
+        assert library.figures() == []
+
+        inserted = library.insert("42", figure_sources)
+        assert inserted.figure_id == "0042"
+        assert [figure.figure_id for figure in library.figures()] == ["0042"]
+
+        extended = library.extend("0042", figure_sources)
+        assert [track.number for track in extended.tracks] == [1, 2]
+        assert library.figure("42") == extended
+
+        replaced = library.replace("0042", figure_sources)
+        assert [track.number for track in replaced.tracks] == [1]
+
+        with pytest.raises(FigureExistsError):
+            library.insert("0042", figure_sources)
+        with pytest.raises(TrackNotFoundError):
+            library.extend("0043", figure_sources)
+        with pytest.raises(ValueError, match="4-digit"):
+            library.insert("12345", figure_sources)
+
+
+def test_batch_defers_flush_until_the_end(fake_faba_library: Path, figure_sources: Path) -> None:
+    with Library(fake_faba_library) as library, library.batch():
+        library.insert("0001", figure_sources)
+        with library.batch():
+            library.insert("0002", figure_sources)
+        assert len(library.figures()) == 2
+
+    assert (fake_faba_library / "K0002" / "CP01.MKI").is_file()
+
+
+def test_extract_restores_tracks(mki_library: Path, mp3_library: Path, tmp_path: Path) -> None:
+    with Library(mki_library, workers=2) as library:
+        extracted = library.extract("3001", tmp_path)
+
+    assert extracted == [tmp_path / "K3001" / "CP01.mp3"]
+    assert filecmp.cmp(extracted[0], mp3_library / "K3001" / "CP01.mp3", shallow=False)
+
+
+def test_verify_reports_gaps_and_wrong_titles(mki_library: Path, tmp_path: Path) -> None:
+    faba_library = tmp_path / "MKI01"
+    figure = faba_library / "K0007"
+    figure.mkdir(parents=True)
+    fixture = mki_library / "K3001" / "CP01.MKI"
+    (figure / "CP01.MKI").write_bytes(fixture.read_bytes())
+    (figure / "CP03.MKI").write_bytes(fixture.read_bytes())
+
+    with Library(mki_library) as library:
+        assert library.verify() == []
+
+    with Library(faba_library) as library:
+        issues = library.verify(["0007"])
+
+    assert [(Path(issue.path).name, issue.problem) for issue in issues] == [
+        ("CP01.MKI", "title is 'K3001CP01', expected 'K0007CP01'"),
+        ("CP03.MKI", "expected CP02.MKI at this position"),
+    ]
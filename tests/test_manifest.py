@@ -0,0 +1,66 @@
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from openfaba.exceptions import VerificationError
+from openfaba.io import iter_mki_to_mp3_chunks
+from openfaba.manifest import MANIFEST_NAME, read_manifest, verify_tracks
+from openfaba.media import obfuscate_figure_mp3_files, obfuscate_mp3_library
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_manifest_holds_digests_of_the_conversion(
+    mp3_library: Path, fake_faba_library: Path
+) -> None:
+    mp3_files = sorted((mp3_library / "K3001").glob("*.mp3"))
+
+    obfuscate_figure_mp3_files("0001", mp3_files, fake_faba_library, checksum=True)
+
+    manifest = read_manifest(fake_faba_library / "K0001")
+    mki_file = fake_faba_library / "K0001" / "CP01.MKI"
+    assert list(manifest) == ["CP01.MKI"]
+    assert manifest["CP01.MKI"]["size"] == mki_file.stat().st_size
+    assert manifest["CP01.MKI"]["sha256"] == sha256(mki_file.read_bytes())
+    assert manifest["CP01.MKI"]["source"] == str(mp3_files[0])
+    # The source digest covers the MP3 as encoded, i.e. once retitled for the box
+    decoded = b"".join(iter_mki_to_mp3_chunks(mki_file))
+    assert manifest["CP01.MKI"]["source_sha256"] == sha256(decoded)
+
+
+def test_extend_adds_to_the_manifest(mp3_library: Path, fake_faba_library: Path) -> None:
+    mp3_files = sorted((mp3_library / "K3001").glob("*.mp3"))
+    obfuscate_figure_mp3_files("0001", mp3_files, fake_faba_library, checksum=True)
+
+    obfuscate_figure_mp3_files("0001", mp3_files, fake_faba_library, append=True, checksum=True)
+
+    assert list(read_manifest(fake_faba_library / "K0001")) == ["CP01.MKI", "CP02.MKI"]
+
+
+def test_library_conversion_verifies_every_figure(
+    mp3_library: Path, fake_faba_library: Path
+) -> None:
+    assert obfuscate_mp3_library(mp3_library, fake_faba_library, verify=True) == 1
+
+    assert (fake_faba_library / "K3001" / MANIFEST_NAME).exists()
+
+
+def test_no_manifest_without_checksum(mp3_library: Path, fake_faba_library: Path) -> None:
+    obfuscate_mp3_library(mp3_library, fake_faba_library)
+
+    assert read_manifest(fake_faba_library / "K3001") == {}
+
+
+def test_verify_detects_corrupted_tracks(mp3_library: Path, fake_faba_library: Path) -> None:
+    mp3_files = sorted((mp3_library / "K3001").glob("*.mp3"))
+    obfuscate_figure_mp3_files("0001", mp3_files, fake_faba_library, checksum=True)
+    figure_path = fake_faba_library / "K0001"
+    with (figure_path / "CP01.MKI").open("r+b") as mki_file:
+        mki_file.seek(1000)
+        mki_file.write(b"\x00")
+
+    with pytest.raises(VerificationError, match=r"CP01\.MKI"):
+        verify_tracks(figure_path, read_manifest(figure_path))
@@ -1,15 +1,27 @@
 import logging
+import os
+import shutil
 import tempfile
 from pathlib import Path
 
 import pytest
 
+from openfaba.exceptions import (
+    BatchConversionError,
+    ConversionError,
+    SourceReadError,
+    TaggingError,
+    TrackNotFoundError,
+)
 from openfaba.media import (
     deobfuscate_figure_mki_files,
+    deobfuscate_figures,
     deobfuscate_mki_library,
     obfuscate_figure_mp3_files,
     obfuscate_mp3_library,
+    stream_figure_mki_files,
 )
+from openfaba.writer import OutputWriter
 
 logger = logging.getLogger(__name__)
 
@@ -91,3 +103,169 @@ def test_insert_and_extend_cycle(mki_library: Path) -> None:
         # Appending to a non-existing figure should raise
         with pytest.raises(ValueError):
             obfuscate_figure_mp3_files("9999", source_mp3, faba_lib, append=True)
+
+
+def test_obfuscate_figure_to_several_libraries(mp3_library: Path, tmp_path: Path) -> None:
+    mp3_files = sorted((mp3_library / "K3001").glob("*.mp3"))
+    libraries = [tmp_path / "card1", tmp_path / "card2", tmp_path / "card3"]
+
+    obfuscate_figure_mp3_files("0001", mp3_files, libraries[0], mirrors=libraries[1:])
+
+    written = [(library / "K0001" / "CP01.MKI").read_bytes() for library in libraries]
+    assert written[0] == written[1] == written[2]
+
+    with pytest.raises(ValueError, match="appended"):
+        obfuscate_figure_mp3_files("0001", mp3_files, libraries[0], True, mirrors=libraries[1:])
+
+
+def test_obfuscate_library_keep_going_quarantines_failures(
+    mp3_library: Path, fake_mp3_library: Path, fake_faba_library: Path, tmp_path: Path
+) -> None:
+    (fake_mp3_library / "K0001").mkdir()
+    shutil.copy(mp3_library / "K3001" / "CP01.mp3", fake_mp3_library / "K0001" / "a.mp3")
+    (fake_mp3_library / "K0001" / "b.mp3").write_bytes(b"not an mp3")
+    quarantine = tmp_path / "quarantine"
+
+    with pytest.raises(BatchConversionError) as exc_info:
+        obfuscate_mp3_library(
+            fake_mp3_library, fake_faba_library, keep_going=True, quarantine=quarantine
+        )
+
+    assert exc_info.value.converted == 1
+    assert [f.source for f in exc_info.value.failures] == [
+        str(fake_mp3_library / "K0001" / "b.mp3")
+    ]
+    assert (fake_faba_library / "K0001" / "CP01.MKI").exists()
+    assert not (fake_faba_library / "K0001" / "CP02.MKI").exists()
+    assert (quarantine / "K0001" / "b.mp3").read_bytes() == b"not an mp3"
+
+
+def _unreadable_source_library(mp3_library: Path, fake_mp3_library: Path) -> Path:
+    (fake_mp3_library / "K0001").mkdir()
+    shutil.copy(mp3_library / "K3001" / "CP01.mp3", fake_mp3_library / "K0001" / "a.mp3")
+    unreadable = fake_mp3_library / "K0001" / "b.mp3"
+    shutil.copy(mp3_library / "K3001" / "CP01.mp3", unreadable)
+    return unreadable
+
+
+@pytest.mark.skipif(os.name != "posix" or os.geteuid() == 0, reason="needs file permissions")
+def test_obfuscate_library_keep_going_skips_unreadable_sources(
+    mp3_library: Path, fake_mp3_library: Path, fake_faba_library: Path, tmp_path: Path
+) -> None:
+    unreadable = _unreadable_source_library(mp3_library, fake_mp3_library)
+    unreadable.chmod(0)
+    try:
+        with pytest.raises(BatchConversionError) as exc_info:
+            obfuscate_mp3_library(fake_mp3_library, fake_faba_library, keep_going=True)
+        with pytest.raises(SourceReadError):
+            obfuscate_mp3_library(fake_mp3_library, tmp_path / "strict")
+    finally:
+        unreadable.chmod(0o644)
+
+    assert exc_info.value.converted == 1
+    assert [f.source for f in exc_info.value.failures] == [str(unreadable)]
+
+
+def test_obfuscate_library_keep_going_skips_vanished_sources(
+    mp3_library: Path,
+    fake_mp3_library: Path,
+    fake_faba_library: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    unreadable = _unreadable_source_library(mp3_library, fake_mp3_library)
+    original_open = Path.open
+
+    def failing_open(self: Path, *args: object, **kwargs: object) -> object:
+        if self == unreadable:
+            raise FileNotFoundError(2, "No such file or directory", str(self))
+        return original_open(self, *args, **kwargs)  # type: ignore[call-overload]
+
+    monkeypatch.setattr(Path, "open", failing_open)
+    quarantine = tmp_path / "quarantine"
+
+    with pytest.raises(BatchConversionError) as exc_info:
+        obfuscate_mp3_library(
+            fake_mp3_library, fake_faba_library, keep_going=True, quarantine=quarantine
+        )
+
+    assert exc_info.value.converted == 1
+    assert [f.source for f in exc_info.value.failures] == [str(unreadable)]
+    assert "No such file or directory" in exc_info.value.failures[0].reason
+    assert (fake_faba_library / "K0001" / "CP01.MKI").exists()
+    assert not quarantine.exists()
+    with pytest.raises(SourceReadError, match="Cannot open the source file"):
+        obfuscate_mp3_library(fake_mp3_library, tmp_path / "strict")
+
+
+def test_obfuscate_library_stops_on_first_failure(
+    fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    (fake_mp3_library / "a.mp3").write_bytes(b"not an mp3")
+
+    with pytest.raises(TaggingError):
+        obfuscate_mp3_library(fake_mp3_library, fake_faba_library)
+
+
+def test_deobfuscate_library_keep_going(
+    monkeypatch: pytest.MonkeyPatch, mki_library: Path, fake_mp3_library: Path, tmp_path: Path
+) -> None:
+    def failing_convert(mki_file: Path, mp3_file: Path, writer: OutputWriter, device: str) -> None:
+        raise ConversionError(f"Error processing {mki_file}")
+
+    monkeypatch.setattr("openfaba.media.convert_mki_to_mp3", failing_convert)
+    quarantine = tmp_path / "quarantine"
+
+    with pytest.raises(BatchConversionError) as exc_info:
+        deobfuscate_mki_library(
+            mki_library, fake_mp3_library, keep_going=True, quarantine=quarantine
+        )
+
+    assert exc_info.value.converted == 0
+    assert len(exc_info.value.failures) == 1
+    assert (quarantine / "K3001" / "CP01.MKI").exists()
+
+
+def test_deobfuscate_figures_counts_each_figure(
+    mki_library: Path, mp3_library: Path, tmp_path: Path
+) -> None:
+    library = tmp_path / "MKI01"
+    shutil.copytree(mki_library, library)
+    shutil.copytree(library / "K3001", library / "K3002")
+    (library / "K0005").mkdir()
+
+    converted = deobfuscate_figures(["3002", "0005", "9999", "3001"], library, tmp_path / "out")
+
+    assert converted == {"3002": 1, "0005": 0, "9999": 0, "3001": 1}
+    expected = (mp3_library / "K3001" / "CP01.mp3").read_bytes()
+    assert (tmp_path / "out" / "K3002" / "CP01.mp3").read_bytes() == expected
+
+
+def test_deobfuscate_figures_reports_failed_figures(
+    monkeypatch: pytest.MonkeyPatch, mki_library: Path, tmp_path: Path
+) -> None:
+    def failing_convert(mki_file: Path, mp3_file: Path, writer: None, device: str) -> None:
+        raise ConversionError(f"Error processing {mki_file.name}")
+
+    monkeypatch.setattr("openfaba.media.convert_mki_to_mp3", failing_convert)
+
+    with pytest.raises(BatchConversionError) as exc_info:
+        deobfuscate_figures(["3001", "0001"], mki_library, tmp_path)
+
+    assert exc_info.value.converted == 0
+    assert [failure.source for failure in exc_info.value.failures] == ["K3001"]
+
+
+def test_stream_figure_mki_files(mki_library: Path, mp3_library: Path) -> None:
+    expected = (mp3_library / "K3001" / "CP01.mp3").read_bytes()
+
+    assert b"".join(stream_figure_mki_files("3001", mki_library)) == expected
+    assert b"".join(stream_figure_mki_files("3001", mki_library, track=1)) == expected
+
+
+@pytest.mark.parametrize("figure_id,track", [("3001", 2), ("9999", None)])
+def test_stream_figure_mki_files_not_found(
+    mki_library: Path, figure_id: str, track: int | None
+) -> None:
+    with pytest.raises(TrackNotFoundError):
+        stream_figure_mki_files(figure_id, mki_library, track)
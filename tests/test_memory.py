@@ -0,0 +1,120 @@
+import shutil
+import tarfile
+import threading
+from pathlib import Path
+
+import pytest
+
+from openfaba import memory
+from openfaba.exceptions import BatchConversionError
+from openfaba.media import obfuscate_mp3_library
+from openfaba.memory import IN_MEMORY_LIMIT, MemoryBudget
+
+
+@pytest.fixture
+def stream_everything(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory, "_budget", MemoryBudget(10 * 1024 * 1024))
+    monkeypatch.setattr(memory, "IN_MEMORY_LIMIT", 0)
+
+
+def test_budget_waits_for_memory_to_be_released() -> None:
+    budget = MemoryBudget(100)
+    admitted = threading.Event()
+
+    def second_job() -> None:
+        with budget.reserve(60):
+            admitted.set()
+
+    with budget.reserve(60):
+        thread = threading.Thread(target=second_job)
+        thread.start()
+        assert not admitted.wait(0.1)
+        assert budget.in_flight == 60
+    thread.join(timeout=5)
+
+    assert admitted.is_set()
+    assert budget.in_flight == 0
+
+
+def test_jobs_larger_than_the_budget_run_alone() -> None:
+    budget = MemoryBudget(100)
+
+    with budget.reserve(500):
+        assert budget.in_flight == 500
+
+
+def test_read_ahead_takes_only_free_memory_and_never_blocks_jobs() -> None:
+    budget = MemoryBudget(100)
+
+    assert budget.try_reserve(60)
+    assert not budget.try_reserve(60)
+    with budget.reserve(80):
+        assert budget.in_flight == 140
+    budget.release(60)
+
+    assert budget.in_flight == budget.read_ahead == 0
+
+
+def test_reservations_can_give_up_waiting() -> None:
+    budget = MemoryBudget(100)
+
+    with budget.reserve(60), pytest.raises(TimeoutError), budget.reserve(60, timeout=0.01):
+        pass
+    assert budget.in_flight == 0
+
+
+def test_without_limit_every_job_is_admitted() -> None:
+    budget = MemoryBudget()
+
+    with budget.reserve(10**12), budget.reserve(10**12):
+        assert budget.in_flight == 2 * 10**12
+    assert budget.in_memory_limit() == IN_MEMORY_LIMIT
+
+
+def test_in_memory_limit_leaves_room_for_several_files() -> None:
+    assert MemoryBudget(120 * 1024 * 1024).in_memory_limit() == 10 * 1024 * 1024
+
+
+def test_large_files_are_streamed_with_identical_output(
+    monkeypatch: pytest.MonkeyPatch, mp3_library: Path, tmp_path: Path
+) -> None:
+    (loaded := tmp_path / "loaded").mkdir()
+    (streamed := tmp_path / "streamed").mkdir()
+    obfuscate_mp3_library(mp3_library, loaded, checksum=True)
+    budget = MemoryBudget(10 * 1024 * 1024)
+    monkeypatch.setattr(memory, "_budget", budget)
+    monkeypatch.setattr(memory, "IN_MEMORY_LIMIT", 0)
+
+    obfuscate_mp3_library(mp3_library, streamed, checksum=True)
+
+    for track in loaded.rglob("*.*"):
+        assert (streamed / track.relative_to(loaded)).read_bytes() == track.read_bytes()
+    assert budget.in_flight == 0
+
+
+@pytest.mark.usefixtures("stream_everything")
+def test_streamed_failures_are_quarantined(
+    mp3_library: Path, fake_mp3_library: Path, fake_faba_library: Path, tmp_path: Path
+) -> None:
+    (fake_mp3_library / "K0001").mkdir()
+    shutil.copy(mp3_library / "K3001" / "CP01.mp3", fake_mp3_library / "K0001" / "a.mp3")
+    (fake_mp3_library / "K0001" / "b.mp3").write_bytes(b"not an mp3")
+    quarantine = tmp_path / "quarantine"
+
+    with pytest.raises(BatchConversionError):
+        obfuscate_mp3_library(
+            fake_mp3_library, fake_faba_library, keep_going=True, quarantine=quarantine
+        )
+
+    assert (fake_faba_library / "K0001" / "CP01.MKI").exists()
+    assert (quarantine / "K0001" / "b.mp3").read_bytes() == b"not an mp3"
+
+
+@pytest.mark.usefixtures("stream_everything")
+def test_tar_members_are_loaded_whole(mp3_library: Path, tmp_path: Path) -> None:
+    with tarfile.open(archive := tmp_path / "mp3.tar.gz", "w:gz") as tf:
+        tf.add(mp3_library / "K3001", arcname="K3001")
+
+    (faba_library := tmp_path / "faba").mkdir()
+
+    assert obfuscate_mp3_library(archive, faba_library) == 1
@@ -0,0 +1,82 @@
+import hashlib
+import io
+import os
+from pathlib import Path
+
+import pytest
+
+from openfaba import parallel
+from openfaba.codec import CodecEngine, get_codec
+from openfaba.exceptions import ConversionError
+from openfaba.io import convert_mki_to_mp3, convert_mp3_to_mki
+from openfaba.parallel import parallel_workers, translate_in_parallel
+
+
+@pytest.fixture
+def small_segments(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(parallel, "SEGMENT_SIZE", 1001)
+    monkeypatch.setattr(parallel, "_worker_count", lambda: 3)
+
+
+@pytest.mark.usefixtures("small_segments")
+@pytest.mark.parametrize("size", [0, 5, 3000, 10_007])
+def test_parallel_translation_matches_serial_codec(size: int) -> None:
+    data = os.urandom(size)
+    encoded = io.BytesIO()
+    decoded = io.BytesIO()
+    source_hash = hashlib.sha256()
+
+    translate_in_parallel(io.BytesIO(data), encoded, size, source_hash=source_hash)
+    translate_in_parallel(io.BytesIO(encoded.getvalue()), decoded, size, decode=True)
+
+    assert encoded.getvalue() == get_codec().encode(data)
+    assert decoded.getvalue() == data
+    assert source_hash.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.usefixtures("small_segments")
+def test_large_files_are_converted_in_parallel(
+    monkeypatch: pytest.MonkeyPatch, mki_library: Path, tmp_path: Path
+) -> None:
+    mki_file = mki_library / "K3001" / "CP01.MKI"
+    convert_mki_to_mp3(mki_file, serial_mp3 := tmp_path / "serial.mp3")
+    monkeypatch.setattr(parallel, "PARALLEL_THRESHOLD", 0)
+
+    convert_mki_to_mp3(mki_file, parallel_mp3 := tmp_path / "parallel.mp3")
+    digest = convert_mp3_to_mki(parallel_mp3, mki_copy := tmp_path / "CP01.MKI", hash_source=True)
+
+    assert parallel_mp3.read_bytes() == serial_mp3.read_bytes()
+    assert mki_copy.read_bytes() == mki_file.read_bytes()
+    assert digest.source_sha256 == hashlib.sha256(serial_mp3.read_bytes()).hexdigest()
+
+
+def test_parallel_translation_fails_on_short_files() -> None:
+    with pytest.raises(ConversionError, match="ended after 3"):
+        translate_in_parallel(io.BytesIO(b"abc"), io.BytesIO(), 10)
+
+
+def test_small_files_stay_serial(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(parallel, "_worker_count", lambda: 8)
+
+    assert parallel_workers(parallel.PARALLEL_THRESHOLD - 1) == 0
+    assert parallel_workers(parallel.PARALLEL_THRESHOLD) == 8
+
+
+@pytest.mark.parametrize(
+    "engine,small,large",
+    [
+        (CodecEngine.AUTO, 0, 8),
+        (CodecEngine.TABLE, 0, 0),
+        (CodecEngine.REFERENCE, 0, 0),
+        (CodecEngine.PARALLEL, 8, 8),
+    ],
+)
+def test_engine_decides_parallel_translation(
+    monkeypatch: pytest.MonkeyPatch, engine: CodecEngine, small: int, large: int
+) -> None:
+    monkeypatch.setattr(parallel, "_worker_count", lambda: 8)
+    monkeypatch.setattr("openfaba.codec._engine", engine)
+
+    assert parallel_workers(1024) == small
+    assert parallel_workers(parallel.PARALLEL_THRESHOLD) == large
+    assert parallel_workers(0) == 0
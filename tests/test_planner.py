@@ -0,0 +1,187 @@
+import shutil
+import tarfile
+from collections import namedtuple
+from pathlib import Path
+
+import pytest
+from mutagen.id3 import ID3, TIT2, TPE1
+from pytest import MonkeyPatch
+
+from openfaba import codec
+from openfaba.codec import DeviceProfile, get_codec, get_device, register_device
+from openfaba.media import obfuscate_mp3_library
+from openfaba.planner import (
+    LibraryPlan,
+    PlannedTrack,
+    Throughput,
+    calibrate_throughput,
+    format_library_plan,
+    plan_obfuscation,
+)
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+@pytest.fixture
+def source_library(mp3_library: Path, tmp_path: Path) -> Path:
+    """Two figures, one of them with tags that the conversion drops"""
+    source = tmp_path / "mp3"
+    shutil.copytree(mp3_library, source)
+    shutil.copytree(source / "K3001", source / "K0001")
+    tagged = source / "K0001" / "CP02.mp3"
+    shutil.copy(source / "K0001" / "CP01.mp3", tagged)
+    tags = ID3(tagged)
+    tags.add(TPE1(encoding=3, text=["Artist"]))
+    tags.save(tagged, v1=2, padding=lambda _: 300)
+    return source
+
+
+def test_plan_predicts_the_output_of_the_conversion(source_library: Path, tmp_path: Path) -> None:
+    faba_library = tmp_path / "faba"
+    faba_library.mkdir()
+
+    plan = plan_obfuscation(source_library, faba_library, calibrate=False)
+
+    # Nothing was written while planning
+    assert not any(faba_library.iterdir())
+    obfuscate_mp3_library(source_library, faba_library)
+    assert {track.target: track.output_size for track in plan.tracks} == {
+        path: path.stat().st_size for path in faba_library.glob("K*/CP*.MKI")
+    }
+    assert plan.figures == ["K0001", "K3001"]
+    assert plan.source_size == sum(path.stat().st_size for path in source_library.rglob("*.mp3"))
+    assert plan.allocated >= plan.output_size
+    assert plan.throughput is None
+    assert plan
+
+
+def test_plan_reads_archive_sizes(source_library: Path, tmp_path: Path) -> None:
+    archive = tmp_path / "mp3.tar"
+    with tarfile.open(archive, "w") as tar:
+        tar.add(source_library / "K3001", arcname="K3001")
+
+    plan = plan_obfuscation(archive, tmp_path, calibrate=False)
+
+    (track,) = plan.tracks
+    assert track.source_size == (source_library / "K3001" / "CP01.mp3").stat().st_size
+    assert track.target == tmp_path / "K3001" / "CP01.MKI"
+
+
+def test_plan_counts_overwritten_tracks_as_freed(source_library: Path, tmp_path: Path) -> None:
+    faba_library = tmp_path / "faba"
+    faba_library.mkdir()
+    empty = plan_obfuscation(source_library, faba_library, calibrate=False)
+    obfuscate_mp3_library(source_library, faba_library)
+
+    again = plan_obfuscation(source_library, faba_library, calibrate=False)
+
+    assert empty.released == 0
+    # The figure folders exist now and every track takes the clusters of its previous version
+    assert again.allocated == again.released
+    assert again.allocated < empty.allocated
+    # Each figure is written next to the tracks it replaces before they are freed
+    assert again.peak > again.allocated - again.released == 0
+
+
+def test_plan_keeps_room_for_each_figure_next_to_the_tracks_it_replaces(
+    monkeypatch: MonkeyPatch, source_library: Path, tmp_path: Path
+) -> None:
+    faba_library = tmp_path / "faba"
+    faba_library.mkdir()
+    obfuscate_mp3_library(source_library, faba_library)
+    monkeypatch.setattr("openfaba.planner._cluster_size", lambda _: 1)
+    figure_sizes = {
+        figure.name: sum(track.stat().st_size for track in figure.iterdir())
+        for figure in faba_library.iterdir()
+    }
+    free_space = max(figure_sizes.values()) - 1
+    monkeypatch.setattr("openfaba.planner.shutil.disk_usage", lambda _: DiskUsage(0, 0, free_space))
+
+    plan = plan_obfuscation(source_library, faba_library, calibrate=False)
+
+    assert plan.free_space_after == free_space
+    assert plan.peak == max(figure_sizes.values())
+    assert plan.lowest_free_space == -1
+    assert not plan
+
+
+def test_plan_keeps_a_source_already_titled(mp3_library: Path, tmp_path: Path) -> None:
+    (source := tmp_path / "mp3" / "K0001").mkdir(parents=True)
+    titled = source / "CP01.mp3"
+    shutil.copy(mp3_library / "K3001" / "CP01.mp3", titled)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text=["K0001CP01"]))
+    tags.save(titled, v2_version=4, padding=lambda _: 300)
+    (faba_library := tmp_path / "faba").mkdir()
+
+    (track,) = plan_obfuscation(source.parent, faba_library, calibrate=False).tracks
+    obfuscate_mp3_library(source.parent, faba_library)
+
+    assert track.output_size == track.source_size == track.target.stat().st_size
+
+
+def test_plan_reports_sources_without_audio(tmp_path: Path) -> None:
+    (source := tmp_path / "mp3" / "K0001").mkdir(parents=True)
+    (source / "CP01.mp3").write_bytes(b"not an mp3")
+
+    plan = plan_obfuscation(source.parent, tmp_path, calibrate=False)
+
+    assert not plan.tracks
+    assert plan.issues == [f"{source / 'CP01.mp3'}: No MPEG audio frame found"]
+
+
+def test_plan_reports_missing_space(
+    monkeypatch: MonkeyPatch, source_library: Path, tmp_path: Path
+) -> None:
+    monkeypatch.setattr("openfaba.planner.shutil.disk_usage", lambda _: DiskUsage(0, 0, 1000))
+
+    plan = plan_obfuscation(source_library, tmp_path, calibrate=False)
+
+    assert not plan.fits
+    assert not plan
+    assert "Not enough space" in format_library_plan(plan)
+
+
+def test_plan_flags_device_and_fat32_limits(
+    monkeypatch: MonkeyPatch, source_library: Path, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(codec, "_DEVICES", dict(codec._DEVICES))
+    register_device(DeviceProfile("tiny", get_device().encode_byte, max_tracks=1))
+    monkeypatch.setattr("openfaba.planner.FAT32_MAX_FILE_SIZE", 1000)
+
+    plan = plan_obfuscation(source_library, tmp_path, device="tiny", calibrate=False)
+    get_codec.cache_clear()
+
+    assert plan.fits
+    assert not plan
+    assert "K0001: 2 tracks, the device plays at most 1" in plan.issues
+    assert sum("over the FAT32 limit" in issue for issue in plan.issues) == 3
+
+
+def test_calibration_leaves_no_file(tmp_path: Path) -> None:
+    throughput = calibrate_throughput(tmp_path, size=1024 * 1024)
+
+    assert throughput.codec > 0
+    assert throughput.write > 0
+    assert not any(tmp_path.iterdir())
+
+
+def test_format_library_plan_estimates_the_runtime() -> None:
+    plan = LibraryPlan(
+        tracks=[PlannedTrack(Path("a.mp3"), Path("K0001/CP01.MKI"), 3_000_000, 3_000_000)],
+        free_space=10_000_000,
+        allocated=3_014_656,
+        peak=3_014_656,
+        throughput=Throughput(codec=1_000_000.0, write=500_000.0),
+    )
+
+    assert format_library_plan(plan).splitlines() == [
+        "Figures: 1, tracks: 1",
+        "Sources: 3.0 MB",
+        "Output: 3.0 MB (3.0 MB on disk)",
+        "Free space: 10.0 MB now, 7.0 MB at the lowest, 7.0 MB after",
+        "Estimated time: 0m 09s (codec 1.0 MB/s, writes 0.5 MB/s)",
+    ]
+    plan.throughput = Throughput(codec=1000.0, write=1000.0)
+    assert plan.estimated_seconds == 6000.0
+    assert "Estimated time: 1h 40m" in format_library_plan(plan)
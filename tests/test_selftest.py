@@ -0,0 +1,35 @@
+import pytest
+
+from openfaba.codec import CodecEngine, translate
+from openfaba.selftest import run_selftest
+
+
+def test_every_engine_matches_the_reference() -> None:
+    reports = run_selftest(seed=7, rounds=20)
+
+    assert [report.engine for report in reports] == [
+        CodecEngine.REFERENCE,
+        CodecEngine.TABLE,
+        CodecEngine.PARALLEL,
+    ]
+    assert all(report.passed for report in reports)
+    # 256 values at 4 offsets and an empty buffer, then the random ones, 3 checks each
+    assert reports[1].checks == (4 + 1 + 20) * 3
+
+
+def test_selftest_detects_a_wrong_engine(monkeypatch: pytest.MonkeyPatch) -> None:
+    def off_by_one(data: bytes, offset: int, tables: list[bytes]) -> bytes:
+        translated = bytearray(translate(data, offset, tables))
+        if len(translated) > 200:
+            translated[200] ^= 1
+        return bytes(translated)
+
+    monkeypatch.setattr("openfaba.selftest.translate", off_by_one)
+
+    reports = run_selftest(seed=7, rounds=0, engines=(CodecEngine.TABLE,))
+
+    assert reports[0].passed
+    assert not reports[1].passed
+    assert reports[1].mismatches[0] == (
+        "all bytes at offset 0: encoding differs from the reference at byte 200"
+    )
@@ -0,0 +1,172 @@
+import http.client
+import io
+import tarfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from openfaba import memory
+from openfaba.memory import MemoryBudget
+from openfaba.server import ConversionServer
+
+
+@pytest.fixture
+def server() -> Iterator[ConversionServer]:
+    server = ConversionServer(("127.0.0.1", 0), workers=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def source_mp3(mp3_library: Path) -> bytes:
+    return (mp3_library / "K3001" / "CP01.mp3").read_bytes()
+
+
+@pytest.fixture
+def expected_mki(mki_library: Path) -> bytes:
+    return (mki_library / "K3001" / "CP01.MKI").read_bytes()
+
+
+def request(
+    server: ConversionServer, method: str, path: str, body: bytes = b"", content_type: str = ""
+) -> tuple[int, bytes]:
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+    headers = {"Content-Type": content_type} if content_type else {}
+    connection.request(method, path, body=body if method == "POST" else None, headers=headers)
+    response = connection.getresponse()
+    result = response.status, response.read()
+    connection.close()
+    return result
+
+
+def test_multipart_upload_returns_zip(
+    server: ConversionServer, source_mp3: bytes, expected_mki: bytes
+) -> None:
+    boundary = "openfaba-boundary"
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="files"; filename="b.mp3"\r\n'
+        "Content-Type: audio/mpeg\r\n\r\n"
+    ).encode() + source_mp3
+    body += (
+        f"\r\n--{boundary}\r\n"
+        'Content-Disposition: form-data; name="files"; filename="a.mp3"\r\n'
+        "Content-Type: audio/mpeg\r\n\r\n"
+    ).encode() + source_mp3
+    body += f"\r\n--{boundary}--\r\n".encode()
+
+    status, data = request(
+        server, "POST", "/figures/3001", body, f"multipart/form-data; boundary={boundary}"
+    )
+
+    assert status == 200
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["K3001/CP01.MKI", "K3001/CP02.MKI"]
+        assert zf.read("K3001/CP01.MKI") == expected_mki
+
+
+def test_tar_upload_returns_tar(
+    server: ConversionServer, source_mp3: bytes, expected_mki: bytes
+) -> None:
+    upload = io.BytesIO()
+    with tarfile.open(fileobj=upload, mode="w") as tf:
+        info = tarfile.TarInfo("songs/01.mp3")
+        info.size = len(source_mp3)
+        tf.addfile(info, io.BytesIO(source_mp3))
+
+    status, data = request(
+        server, "POST", "/figures/3001?format=tar", upload.getvalue(), "application/x-tar"
+    )
+
+    assert status == 200
+    with tarfile.open(fileobj=io.BytesIO(data)) as tf:
+        member = tf.extractfile("K3001/CP01.MKI")
+        assert member is not None
+        assert member.read() == expected_mki
+
+
+def test_invalid_requests_are_rejected(server: ConversionServer) -> None:
+    assert request(server, "POST", "/figures/abc", b"x", "audio/mpeg")[0] == 404
+    assert request(server, "POST", "/figures/1?format=rar", b"x", "audio/mpeg")[0] == 400
+    assert request(server, "POST", "/figures/1", b"x", "text/plain")[0] == 415
+    assert request(server, "POST", "/figures/1", b"not an mp3", "audio/mpeg")[0] == 422
+    assert request(server, "GET", "/nothing")[0] == 404
+
+
+def test_metrics_count_responses(server: ConversionServer, source_mp3: bytes) -> None:
+    assert request(server, "POST", "/figures/1", source_mp3, "audio/mpeg")[0] == 200
+    assert request(server, "GET", "/healthz") == (200, b"ok\n")
+
+    status, metrics = request(server, "GET", "/metrics")
+
+    assert status == 200
+    assert 'openfaba_responses_total{status="200"} 2' in metrics.decode()
+    assert "openfaba_tracks_total 1" in metrics.decode()
+
+
+def test_idle_workers_take_requests_without_a_queue(server: ConversionServer) -> None:
+    server.max_queue = 0
+
+    assert request(server, "GET", "/healthz")[0] == 200
+
+
+def test_full_queue_answers_service_unavailable(
+    monkeypatch: pytest.MonkeyPatch, server: ConversionServer, source_mp3: bytes
+) -> None:
+    server.max_queue = 1
+    release = threading.Event()
+    monkeypatch.setattr(
+        "openfaba.server.tag_figure_tracks", lambda *_, **__: release.wait(10) and []
+    )
+    busy = [
+        threading.Thread(target=request, args=(server, "POST", "/figures/1", b"x", "audio/mpeg"))
+        for _ in range(server.workers + server.max_queue)
+    ]
+    for thread in busy:
+        thread.start()
+    while server.metrics.queued + server.metrics.active < len(busy):
+        time.sleep(0.01)
+
+    # The whole body is read before the answer, so the client gets it instead of a reset
+    status, _ = request(server, "POST", "/figures/1", source_mp3 * 8, "audio/mpeg")
+
+    release.set()
+    for thread in busy:
+        thread.join()
+    assert status == 503
+
+
+def test_uploads_are_reserved_from_the_memory_budget(
+    monkeypatch: pytest.MonkeyPatch, server: ConversionServer, source_mp3: bytes
+) -> None:
+    limit = 4 * len(source_mp3)
+    budget = MemoryBudget(limit)
+    monkeypatch.setattr(memory, "_budget", budget)
+
+    # Rejected before the body is read, which a small body fits in the socket buffers
+    with budget.reserve(limit - 100):
+        assert request(server, "POST", "/figures/1", b"x" * 100, "audio/mpeg")[0] == 503
+    assert request(server, "POST", "/figures/1", source_mp3, "audio/mpeg")[0] == 200
+    assert budget.in_flight == 0
+
+    budget.set_limit(200)
+    assert request(server, "POST", "/figures/1", b"x" * 100, "audio/mpeg")[0] == 413
+
+
+@pytest.mark.usefixtures("box_device")
+def test_logs_name_figures_like_the_device(
+    caplog: pytest.LogCaptureFixture, server: ConversionServer, source_mp3: bytes
+) -> None:
+    server.device = "box"
+
+    with caplog.at_level("INFO", logger="openfaba.server"):
+        assert request(server, "POST", "/figures/1", source_mp3, "audio/mpeg")[0] == 200
+
+    assert "Converted figure F0001 with 1 tracks" in caplog.text
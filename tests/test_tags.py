@@ -0,0 +1,130 @@
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from mutagen.id3 import ID3, TIT2, TPE1
+from mutagen.id3._util import BitPaddedInt
+from mutagen.mp3 import MP3
+from pytest import MonkeyPatch
+
+from openfaba.exceptions import TaggingError
+from openfaba.tags import read_title, retitle_layout, set_title, title_tag
+
+
+@pytest.fixture
+def mp3_data(mp3_library: Path) -> bytes:
+    return (mp3_library / "K3001" / "CP01.mp3").read_bytes()
+
+
+def mutagen_retitle(data: bytes, title: str) -> bytes:
+    """Retitle MP3 bytes the way mutagen does"""
+    stream = BytesIO(data)
+    tags = MP3(stream, ID3=ID3)
+    if "TIT2" in tags and len(tags) == 1 and str(tags["TIT2"].text[0]) == title:
+        return data
+    tags.delete(stream)
+    tags["TIT2"] = TIT2(encoding=1, text=[title])
+    tags.save(stream, v2_version=3, padding=lambda _: 0)
+    return stream.getvalue()
+
+
+def retag(data: bytes, *frames: TIT2 | TPE1, v2_version: int = 4, v1: int = 0) -> bytes:
+    stream = BytesIO(data)
+    tags = ID3()
+    for frame in frames:
+        tags.add(frame)
+    tags.delete(stream)
+    tags.save(stream, v2_version=v2_version, v1=v1, padding=lambda _: 300)
+    return stream.getvalue()
+
+
+def retitle(data: bytes, title: str) -> bytes:
+    stream = BytesIO(data)
+    set_title(stream, title)
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize("title", ["K3001CP01", "K0042CP07", "Été à l'école"])
+def test_title_tag_matches_mutagen(title: str) -> None:
+    expected = BytesIO()
+    tags = ID3()
+    tags["TIT2"] = TIT2(encoding=1, text=[title])
+    tags.save(expected, v2_version=3, padding=lambda _: 0)
+
+    assert title_tag(title) == expected.getvalue()
+    assert read_title(title_tag(title)) == title
+
+
+@pytest.mark.parametrize(
+    "tagging",
+    [
+        lambda data: data,
+        lambda data: retag(data, TPE1(encoding=3, text=["Artist"]), v1=2),
+        lambda data: retag(data, TIT2(encoding=3, text=["Old"]), v2_version=3),
+        lambda data: retag(data, TIT2(encoding=0, text=["K0042CP07"]), v1=2),
+        lambda data: retag(data, TIT2(encoding=3, text=["K0042CP07"])),
+        lambda data: retag(data, TIT2(encoding=1, text=["K0042CP07", "Second"]), v2_version=3),
+        lambda data: retag(data, TIT2(encoding=3, text=["K0042CP07"]), TPE1(text=["Artist"])),
+    ],
+)
+def test_set_title_matches_mutagen(mp3_data: bytes, tagging: Callable[[bytes], bytes]) -> None:
+    data = tagging(mp3_data)
+
+    assert retitle(data, "K0042CP07") == mutagen_retitle(data, "K0042CP07")
+
+
+def test_set_title_keeps_a_file_already_titled(mp3_data: bytes) -> None:
+    titled = retitle(mp3_data, "K0042CP07")
+
+    assert retitle(titled, "K0042CP07") == titled
+    assert retitle_layout(BytesIO(titled), "K0042CP07") == (b"", 0, len(titled))
+
+
+def test_set_title_tolerates_invalid_synchsafe_sizes(
+    monkeypatch: MonkeyPatch, mp3_data: bytes
+) -> None:
+    data = retag(mp3_data, TPE1(encoding=3, text=["Artist"]))
+    # A sloppy tagger set the high bit of the size bytes
+    data = data[:6] + bytes(b | 0x80 for b in data[6:10]) + data[10:]
+    monkeypatch.setattr(BitPaddedInt, "has_valid_padding", lambda *_: True)
+
+    assert retitle(data, "K0042CP07") == mutagen_retitle(data, "K0042CP07")
+
+
+def test_set_title_shifts_audio_both_ways(monkeypatch: MonkeyPatch, mp3_data: bytes) -> None:
+    monkeypatch.setattr("openfaba.tags._MOVE_SIZE", 1001)
+    padded = retag(mp3_data, TPE1(encoding=3, text=["Artist"]))
+    untagged = mp3_data[len(title_tag("K3001CP01")) :]
+
+    for data in (padded, untagged):
+        assert retitle(data, "K0042CP07") == mutagen_retitle(data, "K0042CP07")
+
+
+def test_set_title_is_thread_safe(mp3_data: bytes) -> None:
+    sources = [
+        retag(mp3_data, TPE1(encoding=3, text=[f"Artist {index}"]), v1=2) for index in range(16)
+    ]
+    expected = [mutagen_retitle(data, f"K{index:04d}CP01") for index, data in enumerate(sources)]
+
+    with ThreadPoolExecutor(8) as pool:
+        retitled = list(
+            pool.map(lambda item: retitle(item[1], f"K{item[0]:04d}CP01"), enumerate(sources))
+        )
+
+    assert retitled == expected
+
+
+def test_set_title_rejects_a_file_without_audio() -> None:
+    with pytest.raises(TaggingError, match="No MPEG audio frame"):
+        set_title(BytesIO(title_tag("K0001CP01") + b"not an mp3"), "K0001CP01")
+
+
+def test_read_title_of_an_id3v22_tag() -> None:
+    frame = b"TT2" + (6).to_bytes(3, "big") + b"\x00Title"
+    tag = b"ID3\x02\x00\x00" + (len(frame)).to_bytes(4, "big") + frame
+
+    assert read_title(tag) == "Title"
+    assert read_title(b"ID3\x02\x00\x00\x00\x00\x00\x00") is None
+    assert read_title(b"not a tag") is None
@@ -0,0 +1,186 @@
+import importlib
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from openfaba.exceptions import OpenFabaError
+from openfaba.watch import (
+    InotifyWatcher,
+    PollingWatcher,
+    changed_figures,
+    create_watcher,
+    reconvert_figure,
+    scan_mp3_library,
+    watch_mp3_library,
+)
+
+
+def _wait_for(predicate: Callable[[], bool], timeout: float = 20.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_changed_figures() -> None:
+    previous = {Path("K0001/a.mp3"): (1, 1), Path("K0002/b.mp3"): (1, 1), Path("c.mp3"): (1, 1)}
+    current = {Path("K0001/a.mp3"): (2, 2), Path("c.mp3"): (1, 1), Path("K0003/d.mp3"): (1, 1)}
+
+    assert changed_figures(previous, current, "0000") == {"0001", "0002", "0003"}
+
+
+@pytest.mark.usefixtures("box_device")
+def test_changed_figures_of_another_device() -> None:
+    current = {Path("F0001/a.mp3"): (1, 1), Path("K0002/b.mp3"): (1, 1)}
+
+    assert changed_figures({}, current, "0000", "box") == {"0001", "0000"}
+
+
+def test_scan_mp3_library(fake_mp3_library: Path) -> None:
+    (fake_mp3_library / "K0001").mkdir()
+    (fake_mp3_library / "K0001" / "a.MP3").write_bytes(b"abc")
+    (fake_mp3_library / "K0001" / "cover.jpg").write_bytes(b"abc")
+
+    snapshot, directories = scan_mp3_library(fake_mp3_library)
+
+    assert list(snapshot) == [fake_mp3_library / "K0001" / "a.MP3"]
+    assert snapshot[fake_mp3_library / "K0001" / "a.MP3"][0] == 3
+    assert directories == [fake_mp3_library, fake_mp3_library / "K0001"]
+
+
+def test_create_watcher_polling_fallback() -> None:
+    watcher = create_watcher(0.5, use_inotify=False)
+    assert isinstance(watcher, PollingWatcher)
+
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_watch_reconverts_changed_figures(
+    use_inotify: bool, mp3_library: Path, fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch_mp3_library,
+        args=(fake_mp3_library, fake_faba_library),
+        kwargs={
+            "debounce": 0.2,
+            "poll_interval": 0.05,
+            "use_inotify": use_inotify,
+            "stop_event": stop,
+        },
+    )
+    thread.start()
+    time.sleep(0.5)  # Let the watcher take its initial snapshot
+    try:
+        figure_dir = fake_mp3_library / "K0007"
+        figure_dir.mkdir()
+        shutil.copy(mp3_library / "K3001" / "CP01.mp3", figure_dir / "a.mp3")
+        assert _wait_for(lambda: (fake_faba_library / "K0007" / "CP01.MKI").exists())
+
+        shutil.rmtree(figure_dir)
+        assert _wait_for(lambda: not (fake_faba_library / "K0007").exists())
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_cli_imports_without_unix_only_constants(monkeypatch: pytest.MonkeyPatch) -> None:
+    for name in [name for name in sys.modules if name.startswith("openfaba")]:
+        monkeypatch.delitem(sys.modules, name)
+    # As on Windows
+    monkeypatch.delattr(os, "O_NONBLOCK")
+
+    importlib.import_module("openfaba.cli")
+
+
+def test_inotify_watcher_wakes_up_on_changes(tmp_path: Path) -> None:
+    watcher = create_watcher(0.05)
+    if not isinstance(watcher, InotifyWatcher):
+        pytest.skip("inotify not available")
+    watcher.watch([tmp_path])
+    try:
+        assert not watcher.wait(0.01)
+        (tmp_path / "a.mp3").write_bytes(b"abc")
+        assert watcher.wait(1.0)
+    finally:
+        watcher.close()
+
+
+def test_failed_reconversion_keeps_the_previous_figure(
+    fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    previous = fake_faba_library / "K0001" / "CP01.MKI"
+    previous.parent.mkdir()
+    previous.write_bytes(b"previous")
+    broken = fake_mp3_library / "K0001" / "a.mp3"
+    broken.parent.mkdir()
+    broken.write_bytes(b"half-copied")
+
+    with pytest.raises(OpenFabaError):
+        reconvert_figure("0001", [broken], fake_faba_library)
+
+    assert previous.read_bytes() == b"previous"
+    assert [path.name for path in fake_faba_library.iterdir()] == ["K0001"]
+
+
+def test_reconversion_replaces_the_previous_figure(
+    mp3_library: Path, fake_faba_library: Path
+) -> None:
+    stale = fake_faba_library / "K0001" / "CP02.MKI"
+    stale.parent.mkdir()
+    stale.write_bytes(b"stale")
+
+    reconvert_figure("0001", [mp3_library / "K3001" / "CP01.mp3"], fake_faba_library)
+
+    assert [path.name for path in (fake_faba_library / "K0001").iterdir()] == ["CP01.MKI"]
+    assert [path.name for path in fake_faba_library.iterdir()] == ["K0001"]
+
+
+@pytest.mark.usefixtures("box_device")
+def test_reconversion_logs_name_figures_like_the_device(
+    caplog: pytest.LogCaptureFixture, mp3_library: Path, fake_faba_library: Path
+) -> None:
+    with caplog.at_level("INFO", logger="openfaba.watch"):
+        reconvert_figure("0001", [mp3_library / "K3001" / "CP01.mp3"], fake_faba_library, "box")
+        reconvert_figure("0001", [], fake_faba_library, "box")
+
+    assert "Reconverted figure F0001 with 1 tracks" in caplog.text
+    assert "Removed figure F0001, no sources left" in caplog.text
+
+
+def test_a_busy_figure_does_not_delay_the_others(
+    mp3_library: Path, fake_mp3_library: Path, fake_faba_library: Path
+) -> None:
+    stop = threading.Event()
+    busy = fake_mp3_library / "K0002" / "a.mp3"
+    busy.parent.mkdir()
+    busy.write_bytes(b"")
+    thread = threading.Thread(
+        target=watch_mp3_library,
+        args=(fake_mp3_library, fake_faba_library),
+        kwargs={"debounce": 0.5, "poll_interval": 0.05, "use_inotify": False, "stop_event": stop},
+    )
+    thread.start()
+    time.sleep(0.3)  # Let the watcher take its initial snapshot
+    try:
+        figure_dir = fake_mp3_library / "K0007"
+        figure_dir.mkdir()
+        shutil.copy(mp3_library / "K3001" / "CP01.mp3", figure_dir / "a.mp3")
+
+        def keep_busy() -> bool:
+            # K0002 never stays quiet for the debounce delay
+            busy.write_bytes(busy.read_bytes() + b"x")
+            return (fake_faba_library / "K0007" / "CP01.MKI").exists()
+
+        assert _wait_for(keep_busy, timeout=10.0)
+        assert not (fake_faba_library / "K0002").exists()
+    finally:
+        stop.set()
+        thread.join()
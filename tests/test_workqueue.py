@@ -0,0 +1,216 @@
+import shutil
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from pytest import MonkeyPatch
+
+from openfaba.archive import ArchiveMember
+from openfaba.exceptions import ConversionError, WorkQueueError
+from openfaba.media import obfuscate_mp3_library
+from openfaba.workqueue import (
+    QueueStatus,
+    TaskKind,
+    WorkQueue,
+    _convert,
+    enqueue_deobfuscation,
+    enqueue_obfuscation,
+    run_worker,
+    wait_for_queue,
+)
+from openfaba.writer import OutputDigest, OutputWriter
+
+DIGEST = OutputDigest(size=1, sha256="00")
+
+
+@pytest.fixture
+def queue(tmp_path: Path) -> WorkQueue:
+    return WorkQueue.create(tmp_path / "queue.db", lease=60.0, max_attempts=2)
+
+
+def add_task(queue: WorkQueue, tmp_path: Path) -> None:
+    queue.add_tasks(
+        [(TaskKind.OBFUSCATE, tmp_path / "a.mp3", "K0001CP01", tmp_path / "CP01.MKI")], "faba"
+    )
+
+
+def work(queue_path: Path) -> int:
+    return run_worker(WorkQueue(queue_path), poll_interval=0.05)
+
+
+def test_queue_must_be_created_once(tmp_path: Path, queue: WorkQueue) -> None:
+    with pytest.raises(WorkQueueError, match="already exists"):
+        WorkQueue.create(queue.path)
+    with pytest.raises(WorkQueueError, match="No work queue"):
+        WorkQueue(tmp_path / "missing.db")
+
+
+def test_settings_are_shared_by_every_worker(queue: WorkQueue) -> None:
+    opened = WorkQueue(queue.path)
+
+    assert (opened.lease, opened.max_attempts) == (60.0, 2)
+
+
+def test_a_task_is_leased_to_one_worker(tmp_path: Path, queue: WorkQueue) -> None:
+    add_task(queue, tmp_path)
+
+    task = queue.claim("a")
+
+    assert task is not None
+    assert task.source == tmp_path / "a.mp3"
+    assert task.attempts == 1
+    assert queue.claim("b") is None
+    assert queue.status() == QueueStatus(leased=1)
+    assert queue.complete(task, "a", DIGEST)
+    assert queue.status() == QueueStatus(done=1)
+
+
+def test_expired_leases_are_claimed_again(
+    monkeypatch: MonkeyPatch, tmp_path: Path, queue: WorkQueue
+) -> None:
+    add_task(queue, tmp_path)
+    task = queue.claim("crashed")
+    assert task is not None
+    later = time.time() + 61
+    monkeypatch.setattr("openfaba.workqueue.time.time", lambda: later)
+
+    retried = queue.claim("b")
+
+    assert retried is not None
+    assert (retried.task_id, retried.attempts) == (task.task_id, 2)
+    # The worker that lost its lease can neither renew nor complete the task
+    assert not queue.renew(task, "crashed")
+    assert not queue.complete(task, "crashed", DIGEST)
+    assert queue.complete(retried, "b", DIGEST)
+
+
+def test_tasks_fail_after_max_attempts(tmp_path: Path, queue: WorkQueue) -> None:
+    add_task(queue, tmp_path)
+    for _ in range(2):
+        task = queue.claim("a")
+        assert task is not None
+        queue.fail(task, "a", "Broken file")
+
+    assert queue.claim("a") is None
+    assert queue.status() == QueueStatus(failed=1)
+    assert [failure.reason for failure in queue.failures()] == ["Broken file"]
+
+
+def test_expired_leases_fail_after_max_attempts(
+    monkeypatch: MonkeyPatch, tmp_path: Path, queue: WorkQueue
+) -> None:
+    add_task(queue, tmp_path)
+    now = time.time()
+    for attempt in range(2):
+        monkeypatch.setattr("openfaba.workqueue.time.time", lambda at=now + 61 * attempt: at)
+        assert queue.claim("crashed") is not None
+    monkeypatch.setattr("openfaba.workqueue.time.time", lambda: now + 200)
+
+    assert queue.status() == QueueStatus(failed=1)
+    assert queue.failures()[0].reason == "The worker stopped responding"
+
+
+def test_worker_obfuscates_like_a_local_run(mp3_library: Path, tmp_path: Path) -> None:
+    local, distributed = tmp_path / "local", tmp_path / "distributed"
+    local.mkdir()
+    obfuscate_mp3_library(mp3_library, local)
+    queue = WorkQueue.create(tmp_path / "queue.db")
+
+    assert enqueue_obfuscation(queue, mp3_library, distributed) == 1
+    assert run_worker(queue, "a") == 1
+
+    track = Path("K3001") / "CP01.MKI"
+    assert (distributed / track).read_bytes() == (local / track).read_bytes()
+    assert queue.status() == QueueStatus(done=1)
+
+
+def test_worker_deobfuscates(mki_library: Path, mp3_library: Path, tmp_path: Path) -> None:
+    queue = WorkQueue.create(tmp_path / "queue.db")
+
+    assert enqueue_deobfuscation(queue, mki_library, tmp_path / "mp3") == 1
+    assert run_worker(queue, "a") == 1
+
+    track = Path("K3001") / "CP01.mp3"
+    assert (tmp_path / "mp3" / track).read_bytes() == (mp3_library / track).read_bytes()
+
+
+def test_worker_retries_failed_tasks(
+    monkeypatch: MonkeyPatch, mp3_library: Path, tmp_path: Path
+) -> None:
+    queue = WorkQueue.create(tmp_path / "queue.db")
+    enqueue_obfuscation(queue, mp3_library, tmp_path / "faba")
+    convert = Mock(side_effect=[ConversionError("Disk hiccup"), DIGEST])
+    monkeypatch.setattr("openfaba.workqueue._convert", convert)
+
+    assert run_worker(queue, "a") == 1
+    assert convert.call_count == 2
+    assert queue.status() == QueueStatus(done=1)
+
+
+def test_worker_processes_share_the_queue(mp3_library: Path, tmp_path: Path) -> None:
+    source = mp3_library / "K3001" / "CP01.mp3"
+    for figure in range(1, 9):
+        (tmp_path / "mp3" / f"K{figure:04d}").mkdir(parents=True)
+        shutil.copy(source, tmp_path / "mp3" / f"K{figure:04d}" / "CP01.mp3")
+    queue = WorkQueue.create(tmp_path / "queue.db")
+    enqueue_obfuscation(queue, tmp_path / "mp3", tmp_path / "faba")
+
+    with ProcessPoolExecutor(3) as pool:
+        converted = sum(pool.map(work, [queue.path] * 3))
+
+    # Every task was converted by exactly one worker
+    assert converted == 8
+    assert queue.status() == QueueStatus(done=8)
+    assert len(list((tmp_path / "faba").glob("K*/CP01.MKI"))) == 8
+
+
+def test_wait_for_queue_reports_until_finished(tmp_path: Path, queue: WorkQueue) -> None:
+    add_task(queue, tmp_path)
+    task = queue.claim("a")
+    assert task is not None
+    waiting = wait_for_queue(queue, poll_interval=0)
+
+    assert next(waiting) == QueueStatus(leased=1)
+    queue.complete(task, "a", DIGEST)
+    assert list(waiting) == [QueueStatus(done=1)]
+
+
+def test_paths_are_stored_resolved(
+    monkeypatch: MonkeyPatch, mp3_library: Path, tmp_path: Path
+) -> None:
+    shutil.copytree(mp3_library, tmp_path / "mp3")
+    monkeypatch.chdir(tmp_path)
+    queue = WorkQueue.create(Path("queue.db"))
+    enqueue_obfuscation(queue, Path("mp3"), Path("faba"))
+    # The worker runs from another directory
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+
+    assert run_worker(WorkQueue(tmp_path / "queue.db"), "a") == 1
+    assert (tmp_path / "faba" / "K3001" / "CP01.MKI").is_file()
+    assert not any(elsewhere.iterdir())
+
+
+def test_tar_members_are_read_from_their_offset(
+    monkeypatch: MonkeyPatch, mp3_library: Path, tmp_path: Path
+) -> None:
+    archive = tmp_path / "mp3.tar"
+    with tarfile.open(archive, "w") as tar:
+        tar.add(mp3_library / "K3001", arcname="K3001")
+    queue = WorkQueue.create(tmp_path / "queue.db")
+    enqueue_obfuscation(queue, archive, tmp_path / "faba")
+    # Reading a member must not scan the archive
+    monkeypatch.setattr(
+        "openfaba.archive.tarfile.TarFile.__iter__", Mock(side_effect=AssertionError)
+    )
+
+    task = queue.claim("a")
+
+    assert task is not None
+    assert isinstance(task.source, ArchiveMember)
+    assert task.source.offset is not None
+    assert _convert(task, OutputWriter()).size > 0
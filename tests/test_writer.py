@@ -0,0 +1,174 @@
+import hashlib
+import os
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+from openfaba.exceptions import TargetWriteError
+from openfaba.writer import (
+    FanOutWriter,
+    HashingWriter,
+    OutputWriter,
+    SyncPolicy,
+    atomic_writer,
+    preallocate,
+)
+
+
+def test_atomic_writer_renames_complete_file(tmp_path: Path) -> None:
+    target = tmp_path / "CP01.MKI"
+
+    with atomic_writer(target) as outfile:
+        outfile.write(b"ab")
+        outfile.write(b"cd")
+        assert not target.exists()
+
+    assert target.read_bytes() == b"abcd"
+    assert outfile.digest.size == 4
+    assert outfile.digest.sha256 == hashlib.sha256(b"abcd").hexdigest()
+    assert list(tmp_path.iterdir()) == [target]
+
+
+def test_atomic_writer_keeps_previous_file_on_failure(tmp_path: Path) -> None:
+    target = tmp_path / "CP01.MKI"
+    target.write_bytes(b"old")
+
+    with pytest.raises(RuntimeError), atomic_writer(target) as outfile:
+        outfile.write(b"new")
+        raise RuntimeError("interrupted")
+
+    assert target.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [target]
+
+
+def test_hashing_writer_writes_whole_blocks(tmp_path: Path) -> None:
+    writes: list[int] = []
+
+    class RecordingFile:
+        def write(self, data: bytes) -> int:
+            writes.append(len(data))
+            return len(data)
+
+        def flush(self) -> None:
+            pass
+
+    writer = HashingWriter(RecordingFile(), block_size=8)  # type: ignore[arg-type]
+    for _ in range(5):
+        writer.write(b"abc")
+    writer.flush()
+
+    assert writes == [8, 7]
+    assert writer.digest.size == 15
+
+
+def test_output_writer_preallocates_known_size(tmp_path: Path) -> None:
+    target = tmp_path / "CP01.MKI"
+
+    with OutputWriter().open(target, size=3) as outfile:
+        outfile.write(b"abc")
+
+    assert target.read_bytes() == b"abc"
+
+
+def test_preallocate_ignores_unsupported_descriptors() -> None:
+    read_end, write_end = os.pipe()
+    try:
+        preallocate(write_end, 1024)
+    finally:
+        os.close(read_end)
+        os.close(write_end)
+
+
+def test_figure_sync_policy_renames_on_sync(tmp_path: Path) -> None:
+    durable: list[str] = []
+    writer = OutputWriter(SyncPolicy.FIGURE)
+
+    for name in ("CP01.MKI", "CP02.MKI"):
+        with writer.open(tmp_path / name) as outfile:
+            outfile.write(name.encode())
+        writer.when_durable(partial(durable.append, name))
+
+    assert not (tmp_path / "CP01.MKI").exists()
+    assert durable == []
+
+    writer.sync()
+
+    assert (tmp_path / "CP02.MKI").read_bytes() == b"CP02.MKI"
+    assert durable == ["CP01.MKI", "CP02.MKI"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["CP01.MKI", "CP02.MKI"]
+
+
+def test_output_writer_syncs_pending_files_on_exit(tmp_path: Path) -> None:
+    target = tmp_path / "CP01.MKI"
+
+    with pytest.raises(RuntimeError), OutputWriter(SyncPolicy.FIGURE) as writer:
+        with writer.open(target) as outfile:
+            outfile.write(b"done")
+        raise RuntimeError("interrupted")
+
+    assert target.read_bytes() == b"done"
+
+
+def test_never_sync_policy_renames_immediately(tmp_path: Path) -> None:
+    target = tmp_path / "CP01.MKI"
+    durable: list[bool] = []
+    writer = OutputWriter(SyncPolicy.NEVER)
+
+    with writer.open(target) as outfile:
+        outfile.write(b"abc")
+    writer.when_durable(lambda: durable.append(True))
+
+    assert target.read_bytes() == b"abc"
+    assert durable == [True]
+
+
+def test_fan_out_writer_writes_every_library(tmp_path: Path) -> None:
+    libraries = [tmp_path / name for name in ("a", "b", "c")]
+    durable: list[str] = []
+
+    with FanOutWriter(libraries, SyncPolicy.FIGURE, block_size=4, max_lag=8) as writer:
+        with writer.open(libraries[0] / "K0001" / "CP01.MKI", size=10) as outfile:
+            outfile.write(b"0123456789")
+        writer.when_durable(partial(durable.append, "CP01"))
+        assert durable == []
+        writer.sync()
+        assert durable == ["CP01"]
+
+    assert outfile.digest.sha256 == hashlib.sha256(b"0123456789").hexdigest()
+    for library in libraries:
+        assert (library / "K0001" / "CP01.MKI").read_bytes() == b"0123456789"
+    assert (
+        writer.outputs(libraries[0] / "K0001" / "CP01.MKI")[2]
+        == libraries[2] / "K0001" / "CP01.MKI"
+    )
+    writer.raise_failures()
+
+
+def test_fan_out_writer_keeps_going_when_a_library_fails(tmp_path: Path) -> None:
+    broken, healthy = tmp_path / "broken", tmp_path / "healthy"
+    broken.write_bytes(b"not a folder")
+
+    with FanOutWriter([healthy, broken]) as writer:
+        for name in ("CP01.MKI", "CP02.MKI"):
+            with writer.open(healthy / "K0001" / name) as outfile:
+                outfile.write(b"data")
+
+    assert sorted(p.name for p in (healthy / "K0001").iterdir()) == ["CP01.MKI", "CP02.MKI"]
+    assert writer.outputs(healthy / "K0001" / "CP01.MKI") == [healthy / "K0001" / "CP01.MKI"]
+    with pytest.raises(TargetWriteError, match="1 of 2 libraries") as exc_info:
+        writer.raise_failures()
+    assert exc_info.value.failures[0].source == str(broken)
+
+
+def test_fan_out_writer_discards_aborted_files(tmp_path: Path) -> None:
+    libraries = [tmp_path / "a", tmp_path / "b"]
+
+    with FanOutWriter(libraries) as writer:
+        with pytest.raises(RuntimeError), writer.open(libraries[0] / "CP01.MKI") as outfile:
+            outfile.write(b"partial")
+            raise RuntimeError("encoding failed")
+
+    for library in libraries:
+        assert list(library.iterdir()) == []
+    writer.raise_failures()